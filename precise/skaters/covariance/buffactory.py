@@ -1,6 +1,7 @@
 import numpy as np
 from precise.skaters.covarianceutil.conventions import X_TYPE, X_DATA_TYPE, is_data
 from precise.skaters.covarianceutil.datafunctions import data_population_covariance, data_population_correlation
+from precise.skaters.covarianceutil.ringbuffer import ring_init, ring_append, ring_view, ring_oldest
 
 # State machines that track stats for finite buffers of vectors
 
@@ -53,8 +54,19 @@ def buf_mean_and_median(s:dict=None, x:X_TYPE=None, n_buffer:int=100, e=1)->dict
     return _buf(funcs=[np.nanmean, np.nanmedian], func_names=['mean','median'], func_kwargs=[{'axis':0},{'axis':0}], s=s, x=x, n_buffer=n_buffer, e=e)
 
 
-def buf_mean_and_pcov(s:dict=None, x:X_TYPE=None, n_buffer:int=100, e=1)->dict:
+def buf_mean_and_pcov(s:dict=None, x:X_TYPE=None, n_buffer:int=100, e=1, n_anchor:int=None)->dict:
     # Equivalent to np.cov(xs[max(0, k - n_buffer + 1):k + 1], axis=0)
+    # but maintained by a rank-1 update as x enters and a rank-1 downdate as the oldest vector leaves
+    if not s:
+        s = _buf_init(s=s, n_buffer=n_buffer)
+        s = _roll_init(s=s, n_anchor=n_anchor)
+    if is_data(x):
+        s = _roll_update(s=s, x=x, e=e)
+    return s
+
+
+def buf_mean_and_pcov_long_form(s:dict=None, x:X_TYPE=None, n_buffer:int=100, e=1)->dict:
+    # Recomputes from the full buffer every time. Here mostly as a check
     return _buf(funcs=[np.nanmean, data_population_covariance], func_names=['mean', 'pcov'], func_kwargs=[{'axis':0}, {}], s=s, x=x, e=e, n_buffer=n_buffer)
 
 
@@ -78,18 +90,15 @@ def _buf(funcs, func_names:[str], func_kwargs:[dict], s:dict=None, x:X_TYPE=None
 def _buf_init(s:dict=None, n_buffer:int=None)->dict:
     if not s:
         s = dict()
-    s.update( {'buffer':list(), 'n_buffer':n_buffer} )
+    s = ring_init(s=s, n_buffer=n_buffer)
+    s['buffer'] = ring_view(s)
     return s
 
 
 def _buf_update(funcs, func_names, func_kwargs, s:dict, x:X_DATA_TYPE, n_buffer:int=None, e=1)->dict:
-    if n_buffer is None:
-        n_buffer = s['n_buffer']
-    if len(s['buffer']):
-        assert len(s['buffer'][0])==len(x), 'dimension mismatch'
-    s['buffer'].append(np.atleast_1d(x))
-    if len(s['buffer'])>n_buffer:
-        _ = s['buffer'].pop(0)
+    # s['buffer'] is a zero-copy (n_samples, n_dim) view of the circular buffer, oldest first
+    s = ring_append(s=s, x=x)
+    s['buffer'] = ring_view(s)
     for func, func_name, func_kwargs in zip(funcs, func_names, func_kwargs):
         if e>0:
             s[func_name] = func(s['buffer'],**func_kwargs)
@@ -97,6 +106,79 @@ def _buf_update(funcs, func_names, func_kwargs, s:dict, x:X_DATA_TYPE, n_buffer:
 
 
 
+def _roll_init(s:dict, n_anchor:int=None)->dict:
+    """
+    :param n_anchor:  Number of updates after which mean and scatter are recomputed from the buffer,
+                      to stop floating point drift. Defaults to n_buffer, so the amortized cost is still O(n_dim^2)
+    """
+    s.update({'roll_n':0,
+              'roll_mean':None,            # Running mean of finite buffer
+              'roll_m2':None,              # Sum of outer products of deviations from roll_mean
+              'n_anchor':n_anchor or s['n_buffer'],
+              'n_since_anchor':0,
+              'n_nonfinite':0})            # Number of vectors in buffer with nan or inf
+    return s
+
+
+def _roll_update(s:dict, x:X_DATA_TYPE, e=1)->dict:
+    x = np.atleast_1d(np.asarray(x, dtype=float))
+    leaving = ring_oldest(s)
+    if leaving is not None:
+        leaving = np.copy(leaving)
+    s = ring_append(s=s, x=x)
+    s['buffer'] = ring_view(s)
+
+    if leaving is not None and not np.isfinite(leaving).all():
+        s['n_nonfinite'] -= 1
+    if not np.isfinite(x).all():
+        s['n_nonfinite'] += 1
+
+    if s['n_nonfinite']>0:
+        s['roll_mean'] = None    # Re-anchor once the bad data has left the buffer
+    elif s['roll_mean'] is None or s['n_since_anchor']+1>=s['n_anchor']:
+        s = _roll_anchor(s)
+    else:
+        s = _roll_add(s=s, x=x)
+        if leaving is not None:
+            s = _roll_remove(s=s, x=leaving)
+        s['n_since_anchor'] += 1
+
+    if e>0:
+        if s['roll_mean'] is None or s['ring_len']<2:
+            s['mean'] = np.nanmean(s['buffer'], axis=0)
+            s['pcov'] = data_population_covariance(s['buffer'])
+        else:
+            s['mean'] = np.copy(s['roll_mean'])
+            s['pcov'] = s['roll_m2'] / s['ring_len']
+    return s
+
+
+def _roll_anchor(s:dict)->dict:
+    """ Recompute running mean and scatter from scratch """
+    xs = s['buffer']
+    s['roll_mean'] = np.mean(xs, axis=0)
+    dxs = xs - s['roll_mean']
+    s['roll_m2'] = np.dot(dxs.T, dxs)
+    s['roll_n'] = len(xs)
+    s['n_since_anchor'] = 0
+    return s
+
+
+def _roll_add(s:dict, x)->dict:
+    s['roll_n'] += 1
+    delta_prev = x - s['roll_mean']
+    s['roll_mean'] = s['roll_mean'] + delta_prev / s['roll_n']
+    s['roll_m2'] += np.outer(delta_prev, x - s['roll_mean'])
+    return s
+
+
+def _roll_remove(s:dict, x)->dict:
+    s['roll_n'] -= 1
+    delta_prev = x - s['roll_mean']
+    s['roll_mean'] = s['roll_mean'] - delta_prev / s['roll_n']
+    s['roll_m2'] -= np.outer(delta_prev, x - s['roll_mean'])
+    return s
+
 
 if __name__=='__main__':
     import random
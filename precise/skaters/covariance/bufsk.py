@@ -117,6 +117,39 @@ def buf_sk_glcv_pcov_lars_d0_n300(y: X_TYPE = None, s: dict = None, k=1, e=1):
     return buf_sk_factory(cls=GraphicalLassoCV, y=y, s=s, n_buffer=300, n_emp=30, cls_kwargs=cls_kwargs, e=e)
 
 
+# Persistent versions: refit every j observations, warm start, and re-use cross-validated alpha
+
+
+def buf_sk_gl_pcov_d0_n100_j5(y: X_TYPE = None, s: dict = None, k=1, e=1):
+    """ Graphical Lasso refit every 5 observations, warm started """
+    assert k == 1
+    cls_kwargs = {'tol': 1e-4, 'max_iter': 200}
+    return buf_sk_factory(cls=GraphicalLasso, y=y, s=s, n_buffer=100, n_emp=50, cls_kwargs=cls_kwargs, e=e,
+                          j=5, warm_start=True)
+
+
+def buf_sk_glcv_pcov_d0_n100_j5(y: X_TYPE = None, s: dict = None, k=1, e=1):
+    """ Graphical Lasso CV refit every 5 observations, warm started, cross-validating every 50 """
+    assert k == 1
+    cls_kwargs = {'tol': 1e-4, 'max_iter': 200}
+    return buf_sk_factory(cls=GraphicalLassoCV, y=y, s=s, n_buffer=100, n_emp=30, cls_kwargs=cls_kwargs, e=e,
+                          j=5, warm_start=True, n_alpha=50)
+
+
+def buf_sk_glcv_pcov_d0_n100_t0_j5(y: X_TYPE = None, s: dict = None, k=1, e=1):
+    """ Graphical Lasso CV refit every 5 observations, warm started, cross-validating every 50 """
+    assert k == 1
+    cls_kwargs = {'tol': 1e-4, 'max_iter': 200, 'assume_centered':True}
+    return buf_sk_factory(cls=GraphicalLassoCV, y=y, s=s, n_buffer=100, n_emp=30, cls_kwargs=cls_kwargs, e=e,
+                          j=5, warm_start=True, n_alpha=50)
+
+
+def buf_sk_mcd_pcov_d0_n100_j5(y: X_TYPE = None, s: dict = None, k=1, e=1):
+    """ Minimum covariance determinant refit every 5 observations """
+    assert k == 1
+    return buf_sk_factory(cls=MinCovDet, y=y, s=s, n_buffer=100, n_emp=10, e=e, j=5)
+
+
 # Minimum Cov Det
 
 
@@ -211,6 +244,12 @@ BUF_SK_D0_SKATERS = [buf_sk_emp_pcov_d0_n100, buf_sk_emp_pcov_d0_n100,
                      buf_sk_mcd_pcov_d0_n100,
                      buf_sk_oas_pcov_d0_n100, buf_sk_oas_pcov_d0_n200, buf_sk_oas_pcov_d0_n300]
 
+# Pairs of (fresh fit every observation, persistent estimator) used to report wall-clock savings
+BUF_SK_PERSISTENT_PAIRS = [(buf_sk_gl_pcov_d0_n100, buf_sk_gl_pcov_d0_n100_j5),
+                           (buf_sk_glcv_pcov_d0_n100, buf_sk_glcv_pcov_d0_n100_j5),
+                           (buf_sk_glcv_pcov_d0_n100_t0, buf_sk_glcv_pcov_d0_n100_t0_j5),
+                           (buf_sk_mcd_pcov_d0_n100, buf_sk_mcd_pcov_d0_n100_j5)]
+
 BUF_SK_D1_SKATERS = [buf_sk_ec_pcov_d1_n100, buf_sk_lw_pcov_d1_n100, buf_sk_gl_pcov_d1_n100, buf_sk_glcv_pcov_d1_n100,
                      buf_sk_mcd_pcov_d1_n100,
                      buf_sk_oas_pcov_d1_n100]
@@ -1,14 +1,41 @@
 import numpy as np
+import time
+import inspect
 from precise.skaters.covarianceutil.conventions import X_TYPE, X_DATA_TYPE, is_data
-from precise.skaters.covariance.buffactory import buf_pcov_factory
+from precise.skaters.covariance.buffactory import buf_pcov_factory, _buf_init
 from precise.skaters.covarianceutil.datafunctions import data_population_covariance
+from precise.skaters.covarianceutil.cholesky import try_cholesky
+from sklearn.covariance import GraphicalLasso, GraphicalLassoCV
+from sklearn.covariance import empirical_covariance, graphical_lasso
 import warnings
 
+# Warm starting needs cov_init, which was dropped from the public graphical_lasso in sklearn 1.5 but is still accepted
+# by the private solver behind it. That is used where it exists, otherwise the public function.
+try:
+    from sklearn.covariance._graph_lasso import _graphical_lasso
+except ImportError:
+    _graphical_lasso = None
+GL_ACCEPTS_COV_INIT = (_graphical_lasso is not None) or ('cov_init' in inspect.signature(graphical_lasso).parameters)
 
-def buf_sk_factory(cls, y:X_TYPE=None, s:dict=None,  n_buffer:int=100, n_emp=5, cls_kwargs:dict=None, fit_kwargs:dict=None, e=1):
+
+GL_SOLVER_KWARGS = ['mode', 'tol', 'enet_tol', 'max_iter', 'eps']
+
+
+def buf_sk_factory(cls, y:X_TYPE=None, s:dict=None,  n_buffer:int=100, n_emp=5, cls_kwargs:dict=None, fit_kwargs:dict=None, e=1,
+                   j:int=1, warm_start:bool=False, n_alpha:int=None):
     """
         :param cls  an sklearn covariancecomparisonutil estimating class
         :param n_emp:   If we don't yet have n_emp data points, will revert to empirical
+
+        Persistent estimator mode (defaults reproduce a fresh fit on every observation):
+
+        :param j:           Refit only every j observations, serving the cached estimate in between
+        :param warm_start:  For GraphicalLasso(CV), start the solver from the previous covariance estimate
+                            (where sklearn supports it, see GL_ACCEPTS_COV_INIT)
+        :param n_alpha:     For GraphicalLassoCV, reuse the cross-validated alpha for n_alpha observations
+                            (fitting GraphicalLasso with that alpha) before cross-validating again
+
+        Fitting statistics are kept in s['sk'], e.g. s['sk']['fit_time']
     """
 
     if cls_kwargs is None:
@@ -17,6 +44,11 @@ def buf_sk_factory(cls, y:X_TYPE=None, s:dict=None,  n_buffer:int=100, n_emp=5,
     if fit_kwargs is None:
         fit_kwargs = {}
 
+    if not s:
+        s = _buf_init(n_buffer=n_buffer)
+        s['sk'] = {'n_fit':0, 'fit_time':0., 'n_since_fit':0, 'alpha':None, 'n_since_cv':0, 'pcov':None, 'n_iter':0}
+    sk = s['sk']
+
     def sk_apply_cov(cls, xs, cls_kwargs:dict, fit_kwargs:dict, n_emp:int):
 
         if len(xs) < n_emp:
@@ -30,16 +62,74 @@ def buf_sk_factory(cls, y:X_TYPE=None, s:dict=None,  n_buffer:int=100, n_emp=5,
                 _location = np.zeros(len(xs))
             outputs = {'loc':_location,'pcov':_pcov}
         else:
-            obj = cls(**cls_kwargs)
-            with warnings.catch_warnings():
-                warnings.simplefilter("ignore")
-                obj.fit(np.array(xs),**fit_kwargs)
-            try:
-                outputs = {'loc': obj.location_, 'pcov': obj.covariance_}
-            except AttributeError:
-                print('obj lacks ._location or ._covariance')
-                raise
+            fit_start_time = time.time()
+            outputs = None
+            frozen_alpha = (cls is GraphicalLassoCV) and (n_alpha is not None) and (sk['alpha'] is not None) and (sk['n_since_cv'] < n_alpha)
+            if frozen_alpha or (warm_start and cls is GraphicalLasso):
+                alpha = sk['alpha'] if frozen_alpha else cls_kwargs.get('alpha', 0.01)
+                cov_init = sk['pcov'] if warm_start else None
+                outputs = _gl_fit(xs=np.asarray(xs), alpha=alpha, cov_init=cov_init, cls_kwargs=cls_kwargs)
+                if outputs is not None:
+                    sk['n_iter'] = sk.get('n_iter', 0) + outputs['n_iter']
+            if outputs is None:
+                obj = cls(**cls_kwargs)
+                with warnings.catch_warnings():
+                    warnings.simplefilter("ignore")
+                    obj.fit(np.asarray(xs),**fit_kwargs)
+                try:
+                    outputs = {'loc': obj.location_, 'pcov': obj.covariance_}
+                except AttributeError:
+                    print('obj lacks ._location or ._covariance')
+                    raise
+                if cls is GraphicalLassoCV:
+                    sk['alpha'] = obj.alpha_
+                    sk['n_since_cv'] = 0
+            sk['pcov'] = outputs['pcov']
+            sk['n_fit'] += 1
+            sk['fit_time'] += time.time() - fit_start_time
         return outputs
 
+    # Decide whether this observation triggers a refit. The empirical estimate used for the first n_emp is refreshed every time.
+    warming_up = s['ring_len'] + 1 <= n_emp
+    refit = (e>0) and ((s.get('mav') is None) or warming_up or (sk['n_since_fit'] + 1 >= j))
+    if is_data(y) and e>0:
+        sk['n_since_fit'] = 0 if refit else sk['n_since_fit'] + 1
+        if sk['alpha'] is not None:
+            sk['n_since_cv'] += 1
+
     func = lambda xs: sk_apply_cov(cls=cls, xs=xs, fit_kwargs=fit_kwargs, n_emp=n_emp, cls_kwargs=cls_kwargs)
-    return buf_pcov_factory( func=func, y=y, s=s, n_buffer=n_buffer, e=e)
\ No newline at end of file
+    return buf_pcov_factory( func=func, y=y, s=s, n_buffer=n_buffer, e=e if refit else 0)
+
+
+def _gl_fit(xs, alpha:float, cov_init=None, cls_kwargs:dict=None):
+    """ Graphical lasso with fixed alpha, warm started from cov_init if supported. Returns None on failure. """
+    assume_centered = cls_kwargs.get('assume_centered', False)
+    solver_kwargs = dict([(k, v) for k, v in cls_kwargs.items() if k in GL_SOLVER_KWARGS])
+    emp_cov = empirical_covariance(xs, assume_centered=assume_centered)
+    location = np.zeros(np.shape(xs)[1]) if assume_centered else np.mean(xs, axis=0)
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            pcov, n_iter = gl_solve(emp_cov=emp_cov, alpha=alpha, cov_init=cov_init, **solver_kwargs)
+    except (FloatingPointError, ValueError, np.linalg.LinAlgError):
+        return None
+    return {'loc':location, 'pcov':pcov, 'n_iter':n_iter}
+
+
+def gl_solve(emp_cov, alpha:float, cov_init=None, **solver_kwargs):
+    """ Graphical lasso covariance for emp_cov, starting from cov_init where sklearn allows
+    :returns pcov, n_iter
+    """
+    if cov_init is not None:
+        # The solver scales down the off-diagonal entries of cov_init by 0.95, so undo that if it keeps it positive definite
+        inflated = np.asarray(cov_init) / 0.95
+        np.fill_diagonal(inflated, np.diag(cov_init))
+        if try_cholesky(inflated) is not None:
+            cov_init = inflated
+    if _graphical_lasso is not None:
+        pcov, _, _, n_iter = _graphical_lasso(emp_cov, alpha=alpha, cov_init=cov_init, **solver_kwargs)
+        return pcov, n_iter
+    if (cov_init is not None) and GL_ACCEPTS_COV_INIT:
+        solver_kwargs['cov_init'] = cov_init
+    pcov, _, n_iter = graphical_lasso(emp_cov, alpha=alpha, return_n_iter=True, **solver_kwargs)
+    return pcov, n_iter
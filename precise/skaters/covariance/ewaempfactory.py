@@ -1,26 +1,28 @@
 import numpy as np
-from precise.skaters.covariance.runempfactory import _emp_pcov_init, _emp_pcov_update
+from precise.skaters.covariance.runempfactory import _emp_pcov_init, _emp_pcov_update, _pcov_chol_update
 import math
 from typing import Union, List
 
 # Exponential weighted sample covariancecomparisonutil
 
 
-def ewa_emp_pcov_factory(y, s:dict, k=1, r=0.025, n_emp=None, e=1):
+def ewa_emp_pcov_factory(y, s:dict, k=1, r=0.025, n_emp=None, e=1, with_chol=False):
     assert k==1
-    s = ema_scov(s=s,x=y,r=r, n_emp=n_emp)
+    s = ema_scov(s=s,x=y,r=r, n_emp=n_emp, with_chol=with_chol)
     x = s['mean']
     x_cov = s['pcov']
     return x, x_cov, s
 
 
-def ema_scov(s:dict, x:Union[List[float], int]=None, r:float=0.025, n_emp=None):
-    """ Maintain running population covariancecomparisonutil """
+def ema_scov(s:dict, x:Union[List[float], int]=None, r:float=0.025, n_emp=None, with_chol=False):
+    """ Maintain running population covariancecomparisonutil
+        If with_chol, also track s['pcov_chol'], the lower Cholesky factor of s['pcov']
+    """
     if s.get('n_samples') is None:
         if isinstance(x,int):
-            return _ema_scov_init(n_dim=x,r=r, n_emp=n_emp)
+            return _ema_scov_init(n_dim=x,r=r, n_emp=n_emp, with_chol=with_chol)
         elif isinstance(x,(List,np.ndarray)):
-            s = _ema_scov_init(n_dim=len(x),r=r, n_emp=n_emp)
+            s = _ema_scov_init(n_dim=len(x),r=r, n_emp=n_emp, with_chol=with_chol)
         else:
             raise ValueError('Not sure how to initialize EWA COV tracker. Supply x=5 say, for 5 dim')
     if x is not None:
@@ -28,7 +30,7 @@ def ema_scov(s:dict, x:Union[List[float], int]=None, r:float=0.025, n_emp=None):
     return s
 
 
-def _ema_scov_init(n_dim=None, r:float=0.025, n_emp=None ):
+def _ema_scov_init(n_dim=None, r:float=0.025, n_emp=None, with_chol=False):
     """ Initialize object to track exp moving avg cov for zero mean
 
        r:       Importance of current data point
@@ -39,7 +41,7 @@ def _ema_scov_init(n_dim=None, r:float=0.025, n_emp=None ):
     """
     if n_emp is None:
         n_emp = int(min(250, max(5, math.ceil(1 / r))))
-    s = _emp_pcov_init(n_dim=n_dim)
+    s = _emp_pcov_init(n_dim=n_dim, with_chol=with_chol)
     s.update({'rho':r, 'n_emp':n_emp})
     return s
 
@@ -82,6 +84,13 @@ def _ema_scov_update(s:dict, x:[float], r:float=None, target=None, y=None):
         s['scov'] = (1 - r) * s['scov'] + r * yyt
         s['mean'] = (1 - r) * s['mean'] + r * x
         s['pcov']= s['scov']*(s['n_samples']-1)/s['n_samples']
+        if s.get('with_chol'):
+            if y is None:
+                # pcov = (n-1)/n * ( (1-r) (n-1)/(n-2) prev pcov + r d d^T )
+                n = s['n_samples']
+                s = _pcov_chol_update(s=s, decay=(1 - r) * (n - 1) ** 2 / (n * (n - 2)), v=math.sqrt(r * (n - 1) / n) * xcol[:, 0])
+            else:
+                s['pcov_chol'] = None    # A cross term isn't a rank-1 update, so the factor no longer matches pcov
     return s
 
 
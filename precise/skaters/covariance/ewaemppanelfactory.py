@@ -0,0 +1,102 @@
+import numpy as np
+import math
+
+# Exponential weighted sample covariance for a panel of independent streams
+#
+# Equivalent to running ewa_emp_pcov_factory separately on each of n_streams streams, but the state
+# is held as stacked arrays and all streams are advanced with one batched rank-1 update:
+#
+#     s['mean']  (n_streams, n_dim)
+#     s['pcov']  (n_streams, n_dim, n_dim)
+#     s['scov']  (n_streams, n_dim, n_dim)
+
+
+def ewa_emp_pcov_panel_factory(ys, s:dict, k=1, r=0.025, n_emp=None, e=1):
+    """ Panel skater
+
+    :param ys:   (n_streams, n_dim)  One incoming observation per stream
+    :return:     (n_streams, n_dim), (n_streams, n_dim, n_dim), dict
+    """
+    assert k==1
+    s = ema_scov_panel(s=s, xs=ys, r=r, n_emp=n_emp)
+    x = s['mean']
+    x_cov = s['pcov']
+    return x, x_cov, s
+
+
+def ema_scov_panel(s:dict, xs=None, r:float=0.025, n_emp=None):
+    """ Maintain running population covariances for a panel of streams """
+    if s.get('n_samples') is None:
+        if isinstance(xs,tuple):
+            n_streams, n_dim = xs
+            return _ema_scov_panel_init(n_streams=n_streams, n_dim=n_dim, r=r, n_emp=n_emp)
+        elif isinstance(xs,(list,np.ndarray)) and np.ndim(xs)==2:
+            n_streams, n_dim = np.shape(xs)
+            s = _ema_scov_panel_init(n_streams=n_streams, n_dim=n_dim, r=r, n_emp=n_emp)
+        else:
+            raise ValueError('Not sure how to initialize EWA COV panel. Supply xs=(3,5) say, for 3 streams of 5 dim')
+    if xs is not None:
+        s = _ema_scov_panel_update(s=s, xs=xs, r=r)
+    return s
+
+
+def _ema_scov_panel_init(n_streams:int, n_dim:int, r:float=0.025, n_emp=None)->dict:
+    """ Initialize object to track exp moving avg cov for n_streams independent streams
+
+       n_emp:   Number of samples for which empirical is used. By default n_emp ~ 1/r, as with _ema_scov_init
+
+    """
+    if n_emp is None:
+        n_emp = int(min(250, max(5, math.ceil(1 / r))))
+    s = {'n_streams':n_streams,
+         'n_dim':n_dim,
+         'shape':(n_streams, n_dim, n_dim),
+         'n_samples':0,
+         'rho':r,
+         'n_emp':n_emp,
+         'mean':np.zeros((n_streams, n_dim)),
+         'pcov':np.tile(np.eye(n_dim), (n_streams, 1, 1)),
+         'scov':np.tile(np.eye(n_dim), (n_streams, 1, 1))}
+    return s
+
+
+def _ema_scov_panel_update(s:dict, xs, r:float=None, target=None, ys=None):
+    """ Update all streams at once
+
+          xs     - (n_streams, n_dim)
+          target - If not None, used in place of the mean for every stream (scalar, (n_dim,) or (n_streams, n_dim))
+          ys     - If not None, the cross scatter (x-target)(y-target)^T is tracked instead
+
+       Matches _ema_scov_update stream by stream
+    """
+    xs = np.asarray(xs, dtype=float)
+    assert np.shape(xs) == (s['n_streams'], s['n_dim']), 'dimension mismatch'
+    if s['n_samples'] < s['n_emp']:
+        # Empirical burn-in, as per _emp_pcov_update
+        prev_mean = s['mean']
+        s['n_samples'] += 1
+        n = s['n_samples']
+        s['mean'] = prev_mean + (xs - prev_mean) / n
+        if target is None:
+            delta_prev = xs - prev_mean
+            delta_current = xs - s['mean']
+        else:
+            delta_prev = xs - target
+            delta_current = xs - target
+        s['pcov'] = s['pcov'] + (np.einsum('ki,kj->kij', delta_current, delta_prev) - s['pcov']) / n
+        if n > 1:
+            s['scov'] = s['pcov'] * n / (n - 1)
+    else:
+        s['n_samples'] += 1
+        n = s['n_samples']
+        r = s['rho'] if r is None else r
+        xcol = xs - (s['mean'] if target is None else target)
+        if ys is None:
+            ycol = xcol
+        else:
+            ycol = np.asarray(ys, dtype=float) - (s['mean'] if target is None else target)
+        yyt = np.einsum('ki,kj->kij', xcol, ycol)
+        s['scov'] = (1 - r) * s['scov'] + r * yyt
+        s['mean'] = (1 - r) * s['mean'] + r * xs
+        s['pcov'] = s['scov'] * (n - 1) / n
+    return s
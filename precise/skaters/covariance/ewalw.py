@@ -3,10 +3,8 @@ from precise.skaters.covarianceutil.differencing import d1_factory
 
 # EWALD short for "Exp Weight Avg" Ledoit-Wolf
 
-# Experimental estimator inspired by Ledoit-Wolf
-# Keeps a buffer of last n_buffer observations
-# Tracks quantities akin to a^2, d^2 used by LW to
-# estimate a "reasonable" linear shrinkage
+# Online estimator inspired by Ledoit-Wolf
+# Tracks weighted moments from which the LW linear shrinkage is computed, without a buffer
 
 
 def ewa_lw_scov_d0_r01(y, s, k=1, e=1):
@@ -1,15 +1,22 @@
 from precise.skaters.covariance.ewaempfactory import ema_scov
-from precise.skaters.covarianceutil.covfunctions import grand_mean, grand_shrink
-from sklearn.covariance._shrunk_covariance import ledoit_wolf_shrinkage
+from precise.skaters.covarianceutil.covfunctions import grand_shrink
 import numpy as np
 
 
-# EWALD short for "Exp Weight Avg" Ledoit-Wolf 
+# EWALD short for "Exp Weight Avg" Ledoit-Wolf
 # ---------------------------------------------
-# Experimental online estimator inspired by Ledoit-Wolf
-# Keeps a buffer of last n_buffer observations
-# Tracks quantities somewhat akin to a^2, d^2 used by LW to
-# estimate a "reasonable" linear shrinkage
+# Online estimator inspired by Ledoit-Wolf
+# The LW shrinkage intensity is computed from weighted moment statistics, without a buffer of observations.
+# Observations are weighted as per ema_scov: equally during the burn-in, then exponentially.
+# With equal weights the shrinkage is exactly sklearn's ledoit_wolf_shrinkage applied to all data so far.
+#
+# For X centered by its mean, LW needs
+#       delta_ = sum(S**2)                  where S = X^T X / n
+#       beta_  = sum(X2^T X2) / n           where X2 = X**2
+#              = E[q^2]                     where q = |x - mean|^2
+# The latter is maintained using raw moments of z = x - c, where c is the first observation:
+#       E[q^2] = E|z|^4 - 4 m.E[|z|^2 z] + 2|m|^2 E|z|^2 + 4 m^T E[z z^T] m - 3|m|^4,      m = E[z]
+# so memory is O(n_dim^2) and per tick cost O(n_dim^2). The number of samples is the effective sample size 1/sum(w^2).
 
 
 def ewa_lw_scov_factory(s, y, r, k=1, e=1):
@@ -33,57 +40,22 @@ def lw_ema_scov(s:dict, x=None, r=0.025)->dict:
 def _lw_ema_scov_init(n_dim, r):
     sc = ema_scov({}, n_dim, r=r)
     return {'ema_scov':sc,
-            'bn_bar':None,
-            'a2':0,
-            'mn':0,
-            'n_new':0,
-            'buffer':[]}
+            'lw':_lw_moments_init(n_dim=n_dim),
+            'lmbd':0.}
 
 
 def _lw_ema_scov_update(s, x, r):
     """
-        Attempts to track quantities similar to those used to estimate LD shrinkage
+        Maintains weighted moments sufficient for the LW shrinkage intensity
     """
-    # Uses buffered LD up to 2*n_emp observations, then switches to an updating scheme
-    x = np.asarray(x)
-    s['ema_scov']  = ema_scov(s=s['ema_scov'], x=x, r=r)
-    s['buffer'].append(x)
-    if len(s['buffer'])>s['ema_scov']['n_emp']:
-        # Update running estimate of the LD shrinkage parameter
-        s['n_new'] = s['n_new']+1
-        xl = s['buffer'].pop(0)
-        xc = np.atleast_2d(xl-s['ema_scov']['mean'])  # <--- Do we need this?
-        scov = s['ema_scov']['scov']
+    x = np.asarray(x, dtype=float)
+    n_emp = s['ema_scov']['n_emp']
+    n_samples = s['ema_scov']['n_samples'] + 1
+    s['ema_scov'] = ema_scov(s=s['ema_scov'], x=x, r=r)
+    s['lw'] = _lw_moments_update(m=s['lw'], x=x, alpha=1/n_samples if n_samples<=n_emp else r)
 
-        # Compute d^2
-        mn = grand_mean(scov)
-        s['mn'] = mn
-        n_dim = np.shape(scov)[0]
-        s['dn'] = np.linalg.norm((scov - mn * np.eye(n_dim))**2)
-
-        # Update b^2
-        xc2 = xc**2
-        xl2 = np.dot(xc2.T,xc2) - scov
-        if s.get('bn_bar') is None:
-            s['bn_bar'] = s['lmbd']*s['dn']
-            s['lmbd_lw'] = 1.0 * s['lmbd']
-        r_shrink = r/2 # <--- Heuristic
-        bk = np.linalg.norm( xl2 )
-        s['bn_bar'] = (1-r_shrink)*s['bn_bar'] + r_shrink*bk    # b^2
-        ratio = bk/s['dn']
-
-        # Imply new shrinkage
-        bn = min( s['bn_bar'], s['dn'] )
-        lmbd = bn/s['dn']
-        s['lmbd'] = lmbd
-
-    # If still warming up, override lmbd with traditional Ledoit-Shrinkage
-    if 2 < s['ema_scov']['n_samples'] < 2*s['ema_scov']['n_emp']:
-        X = np.asarray(s['buffer'])
-        s['lmbd'] = ledoit_wolf_shrinkage(X=X)
-
-    # Create shrunk version of moving avg sample covariancecomparisonutil
     if s['ema_scov']['n_samples']>2:
+        s['lmbd'] = lw_shrinkage_from_moments(s['lw'])
         scov = s['ema_scov']['scov']
         s['scov'] = grand_shrink(a=scov, lmbd=s['lmbd'], copy=True)
     else:
@@ -92,18 +64,46 @@ def _lw_ema_scov_update(s, x, r):
     return s
 
 
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+def _lw_moments_init(n_dim:int)->dict:
+    return {'c':None,                        # Shift, to reduce cancellation
+            'w2':0.,                         # Sum of squared weights
+            'z':np.zeros(n_dim),             # E[z]
+            'zz':np.zeros((n_dim, n_dim)),   # E[z z^T]
+            'z2z':np.zeros(n_dim),           # E[|z|^2 z]
+            'z2':0.,                         # E[|z|^2]
+            'z4':0.}                         # E[|z|^4]
+
+
+def _lw_moments_update(m:dict, x, alpha:float)->dict:
+    """ Weighted averages, giving weight alpha to x """
+    if m['c'] is None:
+        m['c'] = np.copy(x)
+    z = x - m['c']
+    z2 = float(np.dot(z, z))
+    m['w2'] = (1 - alpha) ** 2 * m['w2'] + alpha ** 2
+    m['z'] = (1 - alpha) * m['z'] + alpha * z
+    m['zz'] = (1 - alpha) * m['zz'] + alpha * np.outer(z, z)
+    m['z2z'] = (1 - alpha) * m['z2z'] + alpha * z2 * z
+    m['z2'] = (1 - alpha) * m['z2'] + alpha * z2
+    m['z4'] = (1 - alpha) * m['z4'] + alpha * z2 ** 2
+    return m
+
+
+def lw_shrinkage_from_moments(m:dict)->float:
+    """ Ledoit-Wolf shrinkage intensity, as per sklearn's ledoit_wolf_shrinkage, from weighted moments """
+    n_dim = len(m['z'])
+    if n_dim == 1 or m['w2'] <= 0:
+        return 0.
+    n_samples = 1 / m['w2']
+    mean = m['z']
+    mean2 = float(np.dot(mean, mean))
+    emp_cov = m['zz'] - np.outer(mean, mean)
+    trace = float(np.trace(emp_cov))
+    mu = trace / n_dim
+    delta_ = float(np.sum(emp_cov ** 2))
+    beta_ = m['z4'] - 4 * float(np.dot(mean, m['z2z'])) + 2 * mean2 * m['z2'] \
+            + 4 * float(np.dot(mean, np.dot(m['zz'], mean))) - 3 * mean2 ** 2
+    beta = max(0., (beta_ - delta_) / (n_dim * n_samples))
+    delta = (delta_ - 2. * mu * trace + n_dim * mu ** 2) / n_dim
+    beta = min(beta, delta)
+    return 0. if beta == 0 else beta / delta
@@ -1,4 +1,7 @@
 import numpy as np
+import math
+import atexit
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from precise.skaters.covarianceutil.adjacency import centroid_precision_adjacency
 from precise.skaters.covarianceutil.covfunctions import affine_inversion
 from precise.skaters.covariance.ewaemp import ewa_emp_pcov_factory
@@ -35,6 +38,9 @@ def default_adjacency_func(cov, phi=1.01, lmbd=0.01):
 DEFAULT_ADJ_FUNC_KWARGS = {'phi':1.01,'lmbd':0.01}
 
 
+# A cap on neighbourhood size that can be passed to the sparse engine as max_nbrs, for large n_dim
+DEFAULT_MAX_NBRS = 50
+
 # Step 4
 default_f_local = ewa_emp_pcov_factory
 DEFAULT_F_LOCAL_KWARGS = {'r':0.01}
@@ -51,7 +57,7 @@ default_global_cov_func = default_local_pre_func
 DEFAULT_GLOBAL_COV_FUNC_KWARGS = {'phi':1.01,'lmbd':0.1}
 
 
-def ewa_emp_lz_pcov_factory_rg_rl_n(y, s, rg, rl, n, e):
+def ewa_emp_lz_pcov_factory_rg_rl_n(y, s, rg, rl, n, e, max_nbrs:int=None):
     """
     :param y:
     :param s:
@@ -59,16 +65,17 @@ def ewa_emp_lz_pcov_factory_rg_rl_n(y, s, rg, rl, n, e):
     :param rg:
     :param rl:
     :param e:
+    :param max_nbrs:    Opt in to trimming neighbourhoods (e.g. DEFAULT_MAX_NBRS), which changes the output
+                        once a variable has more neighbours than that
     :return:
     """
     f_global_kwargs = {'r':rg}
-    f_local_kwargs = {'r':rl}
-    return lz_factory(y=y,s=s,n_epoch=n,
-                      f_local =  ewa_emp_pcov_factory,
-                      f_global = ewa_emp_pcov_factory,
-                      f_global_kwargs=f_global_kwargs,
-                      f_local_kwargs=f_local_kwargs,
-                      e=e)
+    return sparse_lz_factory(y=y,s=s,n_epoch=n,
+                             f_global = ewa_emp_pcov_factory,
+                             f_global_kwargs=f_global_kwargs,
+                             rl=rl,
+                             max_nbrs=max_nbrs,
+                             e=e)
 
 
 def lz_factory(y, s:dict, n_epoch=DEFAULT_N_EPOCH,
@@ -201,14 +208,249 @@ def lz_factory(y, s:dict, n_epoch=DEFAULT_N_EPOCH,
         return x_gl, s['cov'], s
 
 
+# Sparse Lee-Zhong engine
+# -----------------------
+# Same algorithm as lz_factory with f_local = ewa_emp_pcov_factory, but scalable to n_dim in the thousands:
+#
+#   - All local models are rebooted at the same time, so they share n_samples and agree on the mean of
+#     any variable they have in common. A single mean vector is kept, together with the local covariance
+#     entries for the union of all neighbourhood pairs, stored as flat vectors and updated in one operation.
+#   - Neighbourhoods of equal size are grouped, so local precision matrices are inverted in batches.
+#   - Optionally (background='thread' or 'process') the adjacency estimate and the reboot of local models
+#     are computed in a pool, off the tick path. The result is swapped in at the next epoch boundary,
+#     so the structure lags by one epoch but results remain deterministic.
+#
+# While a job is in flight s['pending'] holds its Future, which can't be pickled or checkpointed. Call
+# lz_resolve(s) first: it waits for the job and stores the local models it produced in s['pending'] instead,
+# without changing subsequent output. Call lz_shutdown() to release the pools.
+
+LZ_EXECUTORS = dict()   # Shared pools, by kind
+
+
+def sparse_lz_factory(y, s:dict, n_epoch=DEFAULT_N_EPOCH,
+                      f_global=None, f_global_kwargs=None,
+                      rl:float=0.01,
+                      e=1,
+                      adj_func=None, adj_func_kwargs:dict=None,
+                      local_pre_func=None, local_pre_func_kwargs:dict=None,
+                      global_cov_func=None, global_cov_func_kwargs:dict=None,
+                      max_nbrs:int=None,
+                      background:str=None):
+    """
 
+      Lee and Zhong factory with sparse local models
 
+    :param rl:           Importance of current data point for the local models (ewa_emp_pcov_factory)
+    :param max_nbrs:     If supplied, neighbourhoods are trimmed to the max_nbrs variables most correlated with
+                         the one in question. Keeps memory at O(n_dim max_nbrs^2) when adjacency is poorly determined
+    :param background:   None to estimate adjacency synchronously, reproducing lz_factory
+                         'thread' or 'process' to estimate adjacency in a pool and swap it in one epoch later
+    :return: x, x_cov, s
 
+    Other parameters as for lz_factory
+    """
+    if adj_func is None:
+        adj_func = default_adjacency_func
+    if global_cov_func is None:
+        global_cov_func = default_global_cov_func
+    if adj_func_kwargs is None:
+        adj_func_kwargs = DEFAULT_ADJ_FUNC_KWARGS
+    if local_pre_func_kwargs is None:
+        local_pre_func_kwargs = DEFAULT_LOCAL_PRE_FUNC_KWARGS
+    if global_cov_func_kwargs is None:
+        global_cov_func_kwargs = DEFAULT_GLOBAL_COV_FUNC_KWARGS
+    if f_global is None:
+        f_global = default_f_global
+    if f_global_kwargs is None:
+        f_global_kwargs = {}
 
+    y = np.asarray(y, dtype=float)
+    n_dim = len(y)
+    if not s:
+        s = {'g':{},          # Global state
+             'l':None,        # Local structure and moments
+             'buffer':[],     # Observation buffer
+             'count':0,
+             'pending':None,  # Epoch job in flight, or its result
+             'warm':0,
+             'stale':0}
 
+    s['count'] += 1
+    x_gl, gl_cov, s['g'] = f_global(s=s['g'], y=y, **f_global_kwargs)
+    if s['count'] % n_epoch == 0:
+        # Swap in the previous epoch's job, catching up on observations that arrived since
+        if s['pending'] is not None:
+            s = _lz_swap(s=s, rl=rl)
+        job_args = (np.copy(gl_cov), np.array(s['buffer']), adj_func, adj_func_kwargs, rl, max_nbrs)
+        if background is None:
+            s['l'] = _lz_epoch(*job_args)
+            s['warm'] = 1
+        else:
+            s['pending'] = _lz_executor(background).submit(_lz_epoch, *job_args)
+        s['buffer'] = []
 
+    s['buffer'].append(y)
+    if len(s['buffer'])>n_epoch:
+        s['buffer'].pop(0)
 
+    if s['warm']:
+        s['l'] = _lz_local_update(l=s['l'], y=y, r=rl)
+        if (e>=0):
+            s['pre'] = _lz_global_pre(l=s['l'], n_dim=n_dim, local_pre_func=local_pre_func, local_pre_func_kwargs=local_pre_func_kwargs)
+            s['cov'] = global_cov_func(s['pre'], **global_cov_func_kwargs)
+            s['stale'] = 0
+        else:
+            s['stale'] = 1
 
+    if (not s['warm']) or s['stale']:
+        return x_gl, gl_cov, s
+    else:
+        return x_gl, s['cov'], s
 
 
+def _lz_executor(background:str):
+    if background not in LZ_EXECUTORS:
+        if background == 'thread':
+            LZ_EXECUTORS[background] = ThreadPoolExecutor()
+        elif background == 'process':
+            LZ_EXECUTORS[background] = ProcessPoolExecutor()
+        else:
+            raise ValueError('background should be None, thread or process')
+    return LZ_EXECUTORS[background]
+
+
+def lz_resolve(s:dict)->dict:
+    """ Wait for any epoch job in flight and keep its result in the state, so the state is plain data again """
+    if s and (s.get('pending') is not None) and not isinstance(s['pending'], dict):
+        s['pending'] = s['pending'].result()
+    return s
+
+
+def lz_shutdown(wait:bool=True):
+    """ Shut down the background pools. They are recreated if needed, and shut down at exit in any case. """
+    while LZ_EXECUTORS:
+        _, executor = LZ_EXECUTORS.popitem()
+        executor.shutdown(wait=wait)
+
+
+atexit.register(lz_shutdown)
+
+
+def _lz_swap(s:dict, rl:float)->dict:
+    """ Wait for the pending epoch job, replay the buffer through its local models and swap them in """
+    l = lz_resolve(s)['pending']
+    for yt in s['buffer']:
+        l = _lz_local_update(l=l, y=yt, r=rl)
+    s['l'] = l
+    s['pending'] = None
+    s['warm'] = 1
+    return s
+
+
+def _lz_epoch(gl_cov, buffer, adj_func, adj_func_kwargs:dict, rl:float, max_nbrs:int=None)->dict:
+    """ Estimate adjacency from the global cov and reboot local models on the buffer """
+    adj = adj_func(gl_cov, **adj_func_kwargs)
+    if max_nbrs is not None:
+        adj = _trim_adjacency(adj=adj, cov=gl_cov, max_nbrs=max_nbrs)
+    l = _lz_local_init(adj=adj, r=rl)
+    for yt in buffer:
+        l = _lz_local_update(l=l, y=yt, r=rl)
+    return l
+
+
+def _trim_adjacency(adj, cov, max_nbrs:int):
+    """ Keep at most max_nbrs entries in each column of adj, preferring large absolute correlation """
+    adj = np.array(adj, dtype=bool)
+    n_dim = len(adj)
+    too_big = np.flatnonzero(np.sum(adj, axis=0) > max_nbrs)
+    if len(too_big):
+        std = np.sqrt(np.maximum(np.diag(cov), 1e-300))
+        scores = np.where(adj[:, too_big], np.abs(cov[:, too_big]) / np.outer(std, std[too_big]), -np.inf)
+        scores[too_big, np.arange(len(too_big))] = np.inf    # Always keep the variable itself
+        keep = np.argpartition(-scores, max_nbrs - 1, axis=0)[:max_nbrs]
+        adj[:, too_big] = False
+        adj[keep, too_big[np.newaxis, :]] = True
+    return adj
+
+
+def _lz_local_init(adj, r:float)->dict:
+    """ Sparse representation of local models, where variable i has neighbourhood np.flatnonzero(adj[:,i])
+
+       rows, cols:    The union of all pairs (j,k) with j,k in the same neighbourhood
+       groups:        Neighbourhoods of equal size m, as
+                         members  (n_g,)        variables
+                         nbr      (n_g, m)      their neighbourhoods
+                         pair_ndx (n_g, m, m)   location of local cov entries in rows, cols
+                         self_pos (n_g,)        position of the variable in its neighbourhood
+    """
+    adj = np.asarray(adj, dtype=bool)
+    n_dim = len(adj)
+    nbrs = [np.flatnonzero(adj[:, i]) for i in range(n_dim)]
+    keys = np.unique(np.concatenate([(nb[:, np.newaxis] * n_dim + nb[np.newaxis, :]).ravel() for nb in nbrs]))
+    sizes = np.array([len(nb) for nb in nbrs])
+    groups = list()
+    for m in np.unique(sizes):
+        members = np.flatnonzero(sizes == m)
+        nbr = np.array([nbrs[i] for i in members])
+        pair_ndx = np.searchsorted(keys, nbr[:, :, np.newaxis] * n_dim + nbr[:, np.newaxis, :])
+        self_pos = np.argmax(nbr == members[:, np.newaxis], axis=1)
+        groups.append({'members':members, 'nbr':nbr, 'pair_ndx':pair_ndx, 'self_pos':self_pos})
+    rows, cols = keys // n_dim, keys % n_dim
+    n_emp = int(min(250, max(5, math.ceil(1 / r))))   # As per _ema_scov_init
+    return {'rows':rows, 'cols':cols, 'groups':groups,
+            'n_samples':0, 'n_emp':n_emp,
+            'mean':np.zeros(n_dim),
+            'pcov':(rows == cols).astype(float),
+            'scov':None}
+
+
+def _lz_local_update(l:dict, y, r:float)->dict:
+    """ Elementwise version of _ema_scov_update, applied to all local models at once """
+    rows, cols = l['rows'], l['cols']
+    if l['n_samples'] < l['n_emp']:
+        prev_mean = l['mean']
+        l['n_samples'] += 1
+        n = l['n_samples']
+        l['mean'] = prev_mean + (y - prev_mean) / n
+        d_prev = y - prev_mean
+        d_current = y - l['mean']
+        l['pcov'] = l['pcov'] + (d_current[rows] * d_prev[cols] - l['pcov']) / n
+        if n > 1:
+            l['scov'] = l['pcov'] * n / (n - 1)
+    else:
+        l['n_samples'] += 1
+        n = l['n_samples']
+        d = y - l['mean']
+        l['scov'] = (1 - r) * l['scov'] + r * d[rows] * d[cols]
+        l['mean'] = (1 - r) * l['mean'] + r * y
+        l['pcov'] = l['scov'] * (n - 1) / n
+    return l
+
+
+def _lz_global_pre(l:dict, n_dim:int, local_pre_func=None, local_pre_func_kwargs:dict=None):
+    """ Assemble global precision, column i taken from the local precision of variable i """
+    omega = np.zeros(shape=(n_dim, n_dim))
+    for g in l['groups']:
+        covs = l['pcov'][g['pair_ndx']]
+        if local_pre_func is None or local_pre_func is default_local_pre_func:
+            pres = _batch_affine_inversion(covs, **local_pre_func_kwargs)
+        else:
+            pres = np.array([local_pre_func(cov, **local_pre_func_kwargs) for cov in covs])
+        omega[g['nbr'], g['members'][:, np.newaxis]] = pres[np.arange(len(pres)), :, g['self_pos']]
+    return omega
+
+
+def _batch_affine_inversion(covs, phi, lmbd):
+    """ affine_inversion applied to each of (n_batch, m, m) """
+    m = np.shape(covs)[1]
+    diag = np.arange(m)
+    a = np.copy(covs)
+    a[:, diag, diag] *= phi
+    mu = np.mean(a[:, diag, diag], axis=1)
+    a = (1 - lmbd) * a
+    a[:, diag, diag] += lmbd * mu[:, np.newaxis]
+    try:
+        return np.linalg.inv(a)
+    except np.linalg.LinAlgError:
+        return np.array([affine_inversion(cov, phi=phi, lmbd=lmbd) for cov in covs])
 
@@ -1,5 +1,5 @@
 import numpy as np
-from precise.skaters.covariance.ewaempfactory import _ema_scov_update, _ema_scov_init
+from precise.skaters.covariance.ewaempfactory import _ema_scov_init
 from typing import Union, List
 from precise.skaters.location.averagingpre import sma
 
@@ -13,16 +13,16 @@ QUADRANTS = {'cu':(1.0,1,1),    # x*1 > 0  y*1 > 0
              'cl':(1.0,-1,-1)}
 
 
-def ewa_pm_factory(s, y, k, r, target=0, n_emp=None, e=1):
+def ewa_pm_factory(s, y, k, r, target=0, n_emp=None, e=1, in_place=False):
     """ Skater """
     assert k==1
-    s = partial_ema_scov(s=s,x=y,r=r,target=target)
+    s = partial_ema_scov(s=s,x=y,r=r,target=target, in_place=in_place)
     x = s['sma']['mean']
     x_cov = s['scov']
     return x, x_cov, s
 
 
-def partial_ema_scov(s:dict, x:Union[List[float], int]=None, r:float=0.025, target=None, n_emp=None):
+def partial_ema_scov(s:dict, x:Union[List[float], int]=None, r:float=0.025, target=None, n_emp=None, in_place=False):
     """ Maintain running population covariancecomparisonutil """
     if s.get('n_samples') is None:
         if isinstance(x,(int,float)):
@@ -32,7 +32,7 @@ def partial_ema_scov(s:dict, x:Union[List[float], int]=None, r:float=0.025, targ
         else:
             raise ValueError('Not sure how to initialize EWA COV tracker. Supply x=5 say, for 5 dim')
     if x is not None:
-        s = _partial_ema_scov_update(s=s, x=x, r=r)
+        s = _partial_ema_scov_update(s=s, x=x, r=r, in_place=in_place)
     return s
 
 
@@ -44,21 +44,34 @@ def _partial_ema_scov_init(n_dim=None, r:float=0.025, n_emp=None, target:float=N
                 This is the number of samples for which empirical is used, rather
                 than running updates. By default n_emp ~ 1/r
 
+       The four quadrant matrices are held in one stacked array, in the order of QUADRANTS:
+          s['qpcov']   (4, n_dim, n_dim)  used during the empirical burn-in
+          s['qscov']   (4, n_dim, n_dim)
     """
-    s = dict([ (q,_ema_scov_init(n_dim=n_dim,r=r,n_emp=n_emp)) for q in QUADRANTS ])
-    q = next(iter(s.keys())) # Choose any
-    s['n_dim'] = s[q]['n_dim']
-    s['n_emp'] = s[q]['n_emp']
-    s['rho'] = s[q]['rho']
-    s['target'] = target
-    s['sma'] = sma({},n_dim,r=r)
+    s = _ema_scov_init(n_dim=n_dim,r=r,n_emp=n_emp)
+    s = {'n_dim':s['n_dim'],
+         'n_emp':s['n_emp'],
+         'rho':s['rho'],
+         'target':target,
+         'n_quadrant_samples':0,
+         'qpcov':np.tile(np.eye(n_dim), (len(QUADRANTS), 1, 1)),
+         'qscov':None,
+         'sma':sma({},n_dim,r=r)}
     return s
 
 
-def _partial_ema_scov_update(s:dict, x:[float], r:float=None, target=None):
-    """ Update recency weighted estimate of scov-like matrix by treating quadrants individually """
+QUADRANT_SIGNS = np.array([ (sgn1, sgn2) for (w, sgn1, sgn2) in QUADRANTS.values() ])   # (4, 2)
+
+
+def _partial_ema_scov_update(s:dict, x:[float], r:float=None, target=None, in_place=False):
+    """ Update recency weighted estimate of scov-like matrix by treating quadrants individually
+
+        All four quadrants are updated in one stacked operation
+        If in_place, quadrant matrices are overwritten rather than reallocated
+    """
 
     assert len(x)==s['n_dim']
+    r = s['rho'] if r is None else r
 
     # If target is not supplied we maintain a mean that switches from emp to ema
     if target is None:
@@ -66,37 +79,45 @@ def _partial_ema_scov_update(s:dict, x:[float], r:float=None, target=None):
     if target is None:
         target = s['sma']['mean']
 
+    # Signed, masked deviations
+    # Morally, for each quadrant:
+    #    x1 = max(0, (x-target)*sgn1) * sgn1
+    #    x2 = max(0, (x-target)*sgn2) * sgn2
+    dx = np.asarray(x, dtype=float) - target
+    dx_by_sign = {1: np.maximum(dx, 0), -1: np.minimum(dx, 0)}
+    x1 = np.array([ dx_by_sign[sgn1] for sgn1 in QUADRANT_SIGNS[:, 0] ])   # (4, n_dim)
+    x2 = np.array([ dx_by_sign[sgn2] for sgn2 in QUADRANT_SIGNS[:, 1] ])
+
     # Update running partial scatter estimates
-    for q,(w,sgn1,sgn2) in QUADRANTS.items():
-        # Morally:
-        #    x1 = max(0, (x-target)*sgn1) * sgn1
-        #    x2 = (np.max(0, (x-target)*sgn2) * sgn2) if sgn1!=sgn2 else x1
-        x1 = (x-target)*sgn1
-        x2 = (x-target)*sgn2
-        x1[x1<0]=0
-        x2[x2<0]=0
-        x1 = sgn1*x1
-        x2 = sgn2*x2
-        s[q] = _ema_scov_update(s[q],x=x1,r=r,target=0, y=x2)
+    s['n_quadrant_samples'] += 1
+    n = s['n_quadrant_samples']
+    if n <= s['n_emp']:
+        # Empirical burn-in, as per _emp_pcov_update with target, which uses x1 only
+        x1x1t = np.einsum('qi,qj->qij', x1, x1)
+        if in_place:
+            x1x1t -= s['qpcov']
+            x1x1t /= n
+            s['qpcov'] += x1x1t
+        else:
+            s['qpcov'] = s['qpcov'] + (x1x1t - s['qpcov']) / n
+        if n > 1:
+            s['qscov'] = s['qpcov'] * n / (n - 1)
+    else:
+        x1x2t = np.einsum('qi,qj->qij', x1, x2)
+        if in_place:
+            s['qscov'] *= (1 - r)
+            x1x2t *= r
+            s['qscov'] += x1x2t
+        else:
+            s['qscov'] = (1 - r) * s['qscov'] + r * x1x2t
 
     s['mean'] = np.copy( s['sma']['mean'] )
     s['n_samples'] = s['sma']['n_samples']
 
     if s['n_samples']>=2:
-        s['scov'] = np.zeros(shape=((s['n_dim'],s['n_dim'])))
-        for q in QUADRANTS:
-            try:
-                s['scov'] += s[q]['scov']
-            except:
-                pass
+        s['scov'] = np.sum(s['qscov'], axis=0)
     else:
         s['scov'] = np.eye(s['n_dim'])
 
     s['sma'] = sma(s=s['sma'], x=x, r=r)
     return s
-
-
-
-
-
-
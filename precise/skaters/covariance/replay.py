@@ -0,0 +1,221 @@
+import numpy as np
+import math
+from precise.skaters.covariance.runemp import run_emp_pcov_d0
+from precise.skaters.covariance.ewaemp import ewa_emp_pcov_d0_r01, ewa_emp_pcov_d0_r02, ewa_emp_pcov_d0_r05, ewa_emp_pcov_d0_r10
+from precise.skaters.covariance.ewapm import ewa_pm_emp_scov_r005_n100, ewa_pm_emp_scov_r005_n100_t0, \
+    ewa_pm_emp_scov_r005_n200, ewa_pm_emp_scov_r005_n200_t0, ewa_pm_emp_scov_r01_n100, ewa_pm_emp_scov_r01_n100_t0, \
+    ewa_pm_emp_scov_r01_n200, ewa_pm_emp_scov_r01_n200_t0, ewa_pm_emp_scov_r01_n300, ewa_pm_emp_scov_r01_n300_t0, \
+    ewa_pm_emp_scov_r02_n50, ewa_pm_emp_scov_r02_n50_t0, ewa_pm_emp_scov_r02_n100, ewa_pm_emp_scov_r02_n100_t0, \
+    ewa_pm_emp_scov_r05_n50, ewa_pm_emp_scov_r05_n50_t0, ewa_pm_emp_scov_r05_n25, ewa_pm_emp_scov_r05_n25_t0
+
+# Compute the full forecast path of a cov skater over xs in one go
+#
+#    x, x_cov = replay(f, xs)
+#
+# Row t of x, x_cov is what f would return after being fed xs[0],...,xs[t] one at a time.
+# For the linear recursions (running empirical, EWA, partial moment EWA) the path is computed with blocked
+# cumulative sums instead of n_obs interpreted steps. Other skaters are stepped.
+
+REPLAY_EMP_BLOCK = 256          # Rows per block for empirical scans
+REPLAY_MAX_LOG10_SCALE = 100    # EWA blocks are kept short enough that (1-r)^(-block) < 10^100
+
+
+def replay(f, xs, filename:str=None):
+    """ Forecast path of cov skater f applied to xs
+
+    :param f:         cov skater
+    :param xs:        (n_obs, n_dim)
+    :param filename:  If supplied, x_cov is written to a memory-mapped .npy file of this name
+    :return:  (n_obs, n_dim), (n_obs, n_dim, n_dim)
+    """
+    xs = np.asarray(xs, dtype=float)
+    n_obs, n_dim = np.shape(xs)
+    x = np.empty(shape=(n_obs, n_dim))
+    if filename is None:
+        x_cov = np.empty(shape=(n_obs, n_dim, n_dim))
+    else:
+        x_cov = np.lib.format.open_memmap(filename, mode='w+', dtype=float, shape=(n_obs, n_dim, n_dim))
+
+    replay_func, replay_kwargs = REPLAYABLE.get(f, (None, None))
+    if replay_func is None:
+        x, x_cov = replay_by_stepping(f=f, xs=xs, x=x, x_cov=x_cov)
+    else:
+        x, x_cov = replay_func(xs=xs, x=x, x_cov=x_cov, **replay_kwargs)
+
+    if filename is not None:
+        x_cov.flush()
+    return x, x_cov
+
+
+def is_replayable(f)->bool:
+    """ True if f has a closed form replay, as opposed to being stepped """
+    return f in REPLAYABLE
+
+
+def replay_by_stepping(f, xs, x, x_cov):
+    """ Fallback for skaters without a closed form """
+    s = {}
+    for t, y in enumerate(xs):
+        x[t], x_cov[t], s = f(s=s, y=y, k=1, e=1)
+    return x, x_cov
+
+
+def replay_emp(xs, x, x_cov):
+    """ Path of run_emp_pcov_d0 """
+    x, x_cov, _ = _emp_scan(xs=xs, x=x, x_cov=x_cov)
+    return x, x_cov
+
+
+def replay_ewa_emp(xs, x, x_cov, r:float, n_emp:int=None):
+    """ Path of ewa_emp_pcov_factory: empirical for n_emp observations, then exponentially weighted """
+    n_emp = _default_n_emp(r=r, n_emp=n_emp)
+    n_obs = len(xs)
+    n_burn = min(n_emp, n_obs)
+    x[:n_burn], x_cov[:n_burn], m2 = _emp_scan(xs=xs[:n_burn], x=x[:n_burn], x_cov=x_cov[:n_burn])
+    if n_obs > n_emp:
+        scov = m2 / (n_emp - 1)
+        x[n_emp:] = _ewa_scan(prev=x[n_emp - 1], zs=xs[n_emp:], r=r)
+        ds = xs[n_emp:] - x[n_emp - 1:-1]
+        for start, end, scov_block in _ewa_outer_scan(prev=scov, ds=ds, r=r):
+            n = np.arange(n_emp + start + 1, n_emp + end + 1)
+            x_cov[n_emp + start:n_emp + end] = scov_block * ((n - 1) / n)[:, np.newaxis, np.newaxis]
+    return x, x_cov
+
+
+def replay_ewa_pm(xs, x, x_cov, r:float, target=0):
+    """ Path of ewa_pm_factory
+
+       The four quadrant recursions are linear, so their sum is tracked directly. As per _partial_ema_scov_update:
+         - while the quadrants are in their empirical phase, each accumulates the outer product of its first argument
+         - thereafter the quadrant cross products sum to d d^T where d = x - target
+    """
+    n_obs, n_dim = np.shape(xs)
+    n_emp = _default_n_emp(r=r)
+
+    # Switching moving average, as per sma()
+    n = np.arange(1, n_obs + 1)
+    n_switch = int(np.sum(n < 1 / r))
+    x[:n_switch] = np.cumsum(xs[:n_switch] / n[:n_switch, np.newaxis], axis=0)
+    if n_switch == 0:
+        x[0] = xs[0]
+        x[1:] = _ewa_scan(prev=x[0], zs=xs[1:], r=r)
+    elif n_switch < n_obs:
+        x[n_switch:] = _ewa_scan(prev=x[n_switch - 1], zs=xs[n_switch:], r=r)
+
+    if target is None:
+        targets = np.vstack([np.zeros((1, n_dim)), x[:-1]])
+    else:
+        targets = target
+    ds = xs - targets
+
+    # Empirical phase of the quadrants
+    n_burn = min(n_emp, n_obs)
+    d_plus = np.maximum(ds[:n_burn], 0)
+    d_minus = np.minimum(ds[:n_burn], 0)
+    scov = None
+    for start in range(0, n_burn, REPLAY_EMP_BLOCK):
+        end = min(n_burn, start + REPLAY_EMP_BLOCK)
+        p = 2 * (np.einsum('ti,tj->tij', d_plus[start:end], d_plus[start:end]) +
+                 np.einsum('ti,tj->tij', d_minus[start:end], d_minus[start:end]))
+        p = np.cumsum(p, axis=0) + (0 if scov is None else scov)
+        scov = p[-1]
+        nb = n[start:end]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x_cov[start:end] = p / (nb - 1)[:, np.newaxis, np.newaxis]
+
+    # Exponentially weighted phase of the quadrants
+    if n_obs > n_emp:
+        for start, end, scov_block in _ewa_outer_scan(prev=scov / (n_emp - 1), ds=ds[n_emp:], r=r):
+            x_cov[n_emp + start:n_emp + end] = scov_block
+
+    x_cov[:min(2, n_obs)] = np.eye(n_dim)
+    return x, x_cov
+
+
+def _default_n_emp(r:float, n_emp:int=None)->int:
+    # As per _ema_scov_init
+    if n_emp is None:
+        n_emp = int(min(250, max(5, math.ceil(1 / r))))
+    return n_emp
+
+
+def _emp_scan(xs, x, x_cov):
+    """ Running mean and population covariance of xs[:t+1] for every t
+    :returns  x, x_cov and the final sum of squared deviations
+    """
+    n_obs, n_dim = np.shape(xs)
+    if n_obs == 0:
+        return x, x_cov, np.zeros((n_dim, n_dim))
+    c = np.mean(xs[:REPLAY_EMP_BLOCK], axis=0)  # Shift to reduce cancellation
+    dxs = xs - c
+    sum_dx = np.zeros(n_dim)
+    sum_dx2 = np.zeros((n_dim, n_dim))
+    for start in range(0, n_obs, REPLAY_EMP_BLOCK):
+        end = min(n_obs, start + REPLAY_EMP_BLOCK)
+        n = np.arange(start + 1, end + 1)[:, np.newaxis]
+        cum_dx = sum_dx + np.cumsum(dxs[start:end], axis=0)
+        cum_dx2 = sum_dx2 + np.cumsum(np.einsum('ti,tj->tij', dxs[start:end], dxs[start:end]), axis=0)
+        mean_dx = cum_dx / n
+        x[start:end] = c + mean_dx
+        x_cov[start:end] = cum_dx2 / n[:, :, np.newaxis] - np.einsum('ti,tj->tij', mean_dx, mean_dx)
+        sum_dx = cum_dx[-1]
+        sum_dx2 = cum_dx2[-1]
+    m2 = x_cov[n_obs - 1] * n_obs
+    return x, x_cov, m2
+
+
+def _ewa_block_length(r:float, n_obs:int)->int:
+    if r >= 1:
+        return 1
+    return int(max(1, min(n_obs, REPLAY_MAX_LOG10_SCALE // max(-math.log10(1 - r), 1e-12))))
+
+
+def _ewa_block(prev, zs, r:float):
+    """ out[j] = (1-r)*out[j-1] + r*zs[j] where out[-1] = prev """
+    if r >= 1:
+        return np.copy(zs)
+    a = 1 - r
+    powers = a ** np.arange(1, len(zs) + 1)
+    powers = powers.reshape((len(zs),) + (1,) * (np.ndim(zs) - 1))
+    return powers * (prev + r * np.cumsum(zs / powers, axis=0))
+
+
+def _ewa_scan(prev, zs, r:float):
+    """ Exponentially weighted average path, computed in blocks """
+    out = np.empty(shape=np.shape(zs))
+    block = _ewa_block_length(r=r, n_obs=len(zs))
+    for start in range(0, len(zs), block):
+        end = min(len(zs), start + block)
+        out[start:end] = _ewa_block(prev=prev, zs=zs[start:end], r=r)
+        prev = out[end - 1]
+    return out
+
+
+def _ewa_outer_scan(prev, ds, r:float):
+    """ Yields blocks of S_t = (1-r) S_{t-1} + r d_t d_t^T, without materializing all outer products at once """
+    block = min(_ewa_block_length(r=r, n_obs=len(ds)), REPLAY_EMP_BLOCK)
+    for start in range(0, len(ds), block):
+        end = min(len(ds), start + block)
+        zs = np.einsum('ti,tj->tij', ds[start:end], ds[start:end])
+        out = _ewa_block(prev=prev, zs=zs, r=r)
+        prev = out[-1]
+        yield start, end, out
+
+
+REPLAYABLE = {run_emp_pcov_d0: (replay_emp, {}),
+              ewa_emp_pcov_d0_r01: (replay_ewa_emp, {'r':0.01}),
+              ewa_emp_pcov_d0_r02: (replay_ewa_emp, {'r':0.02}),
+              ewa_emp_pcov_d0_r05: (replay_ewa_emp, {'r':0.05}),
+              ewa_emp_pcov_d0_r10: (replay_ewa_emp, {'r':0.10})}
+
+# ewa_pm_factory uses target=0 by default and does not pass n_emp through, so only r matters
+REPLAYABLE.update({f: (replay_ewa_pm, {'r':r, 'target':0}) for f, r in
+                   [(ewa_pm_emp_scov_r005_n100, 0.005), (ewa_pm_emp_scov_r005_n100_t0, 0.005),
+                    (ewa_pm_emp_scov_r005_n200, 0.005), (ewa_pm_emp_scov_r005_n200_t0, 0.005),
+                    (ewa_pm_emp_scov_r01_n100, 0.01), (ewa_pm_emp_scov_r01_n100_t0, 0.01),
+                    (ewa_pm_emp_scov_r01_n200, 0.01), (ewa_pm_emp_scov_r01_n200_t0, 0.01),
+                    (ewa_pm_emp_scov_r01_n300, 0.01), (ewa_pm_emp_scov_r01_n300_t0, 0.01),
+                    (ewa_pm_emp_scov_r02_n50, 0.02), (ewa_pm_emp_scov_r02_n50_t0, 0.02),
+                    (ewa_pm_emp_scov_r02_n100, 0.02), (ewa_pm_emp_scov_r02_n100_t0, 0.02),
+                    (ewa_pm_emp_scov_r05_n50, 0.05), (ewa_pm_emp_scov_r05_n50_t0, 0.05),
+                    (ewa_pm_emp_scov_r05_n25, 0.02), (ewa_pm_emp_scov_r05_n25_t0, 0.02)]})
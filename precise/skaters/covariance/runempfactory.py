@@ -1,20 +1,23 @@
 import numpy as np
+import math
 from precise.skaters.covarianceutil.conventions import infer_dimension, X_DATA_TYPE, is_data
+from precise.skaters.covarianceutil.cholesky import cholesky_rank_one_update, try_cholesky
 
 
-def emp_pcov(s:dict, x:[float]=None, n_dim=None, k=1)->dict:
+def emp_pcov(s:dict, x:[float]=None, n_dim=None, k=1, with_chol=False)->dict:
     """
         Track empirical sample covariancecomparisonutil
+        If with_chol, also track s['pcov_chol'], the lower Cholesky factor of s['pcov'] (once it is positive definite)
     """
     assert k==1
     if not s:
-        s = _emp_pcov_init(x=x,n_dim=n_dim)
+        s = _emp_pcov_init(x=x,n_dim=n_dim, with_chol=with_chol)
     if is_data(x):
         s = _emp_pcov_update(s=s, x=x)
     return s
 
 
-def _emp_pcov_init(s:dict=None, x:X_DATA_TYPE=None, n_dim=None):
+def _emp_pcov_init(s:dict=None, x:X_DATA_TYPE=None, n_dim=None, with_chol=False):
     """ Empirical population covariancecomparisonutil"""
     n_dim = infer_dimension(x=x,n_dim=n_dim)
     if s is None:
@@ -25,6 +28,9 @@ def _emp_pcov_init(s:dict=None, x:X_DATA_TYPE=None, n_dim=None):
     s['n_samples'] = 0
     s['mean'] = np.zeros(n_dim)
     s['pcov'] = np.eye(n_dim)
+    s['with_chol'] = with_chol
+    if with_chol:
+        s['pcov_chol'] = None
     return s
 
 
@@ -42,6 +48,24 @@ def _emp_pcov_update(s:dict, x:X_DATA_TYPE, target=None):
         delta_x_current = np.atleast_2d(x - target)
     s['pcov'] = prev_cov + ( np.matmul( delta_x_current.transpose(),delta_x_prev) - prev_cov ) / s['n_samples']
 
+    if s.get('with_chol'):
+        # pcov = (1-1/n) prev_cov + w d d^T
+        n = s['n_samples']
+        w = (n - 1) / n ** 2 if target is None else 1 / n
+        s = _pcov_chol_update(s=s, decay=(n - 1) / n, v=math.sqrt(w) * delta_x_prev[0])
+    return s
+
+
+def _pcov_chol_update(s:dict, decay:float, v)->dict:
+    """ Track lower Cholesky factor of s['pcov'] = decay * prev pcov + v v^T by rank-1 update
+        Factorization from scratch happens only when no factor is held, once n_samples > n_dim
+    """
+    if s.get('pcov_chol') is not None:
+        s['pcov_chol'] = cholesky_rank_one_update(L=math.sqrt(decay) * s['pcov_chol'], v=v, copy=False)
+    elif s['n_samples'] > s['n_dim'] and s['n_samples'] >= s.get('chol_retry', 0):
+        s['pcov_chol'] = try_cholesky(s['pcov'])
+        if s['pcov_chol'] is None:
+            s['chol_retry'] = s['n_samples'] + s['n_dim']
     return s
 
 
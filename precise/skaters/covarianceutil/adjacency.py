@@ -12,18 +12,14 @@ def centroid_precision_adjacency(pre:np.ndarray)->np.ndarray:
     """
     # A rather speculative approach, this using 1-dim version of k-means clustering to establish a
     # minimum absolute precision value. Any entry above this threshold is considered 'real'.
-    a = np.copy(pre)
     n = np.shape(pre)[0]
-    off_diag_values = sorted(np.abs(multiply_diag(a, phi=0, copy=True).ravel()))
+    off_diag_values = np.sort(np.abs(multiply_diag(pre, phi=0, copy=True)).ravel())
     clusters, centroids = cluster(array=off_diag_values, k=3)
     assert clusters[1]>=clusters[0]
     cutoff_value = min( centroids[1]*2.0, centroids[2]/2.0 )
-    abs_pre = np.abs(pre)
-    for i in range(n):
-        a[:,i] = np.vectorize(int)(abs_pre[:,i] > cutoff_value)
-    for i in range(n):
-        a[i,i]=1
-    return a.astype(bool)
+    a = np.abs(pre) > cutoff_value
+    a[np.arange(n), np.arange(n)] = True
+    return a
 
 
 
@@ -0,0 +1,85 @@
+import numpy as np
+import math
+from scipy.linalg import solve_triangular
+
+# Functions acting on lower triangular Cholesky factors L, where cov = L L^T
+# Rank-1 modifications are O(n_dim^2), versus O(n_dim^3) to refactorize
+
+
+def cholesky_rank_one_update(L, v, copy=True):
+    """ Factor of L L^T + v v^T """
+    L = np.array(L, dtype=float) if copy else L
+    v = np.array(v, dtype=float)
+    n = len(v)
+    for k in range(n):
+        r = math.sqrt(L[k, k] ** 2 + v[k] ** 2)
+        c = r / L[k, k]
+        s = v[k] / L[k, k]
+        L[k, k] = r
+        if k < n - 1:
+            L[k + 1:, k] = (L[k + 1:, k] + s * v[k + 1:]) / c
+            v[k + 1:] = c * v[k + 1:] - s * L[k + 1:, k]
+    return L
+
+
+def cholesky_rank_one_downdate(L, v, copy=True):
+    """ Factor of L L^T - v v^T
+        Raises np.linalg.LinAlgError if the result would not be positive definite
+    """
+    L = np.array(L, dtype=float) if copy else L
+    v = np.array(v, dtype=float)
+    n = len(v)
+    for k in range(n):
+        r2 = L[k, k] ** 2 - v[k] ** 2
+        if r2 <= 0:
+            raise np.linalg.LinAlgError('Downdate would leave matrix that is not positive definite')
+        r = math.sqrt(r2)
+        c = r / L[k, k]
+        s = v[k] / L[k, k]
+        L[k, k] = r
+        if k < n - 1:
+            L[k + 1:, k] = (L[k + 1:, k] - s * v[k + 1:]) / c
+            v[k + 1:] = c * v[k + 1:] - s * L[k + 1:, k]
+    return L
+
+
+def try_cholesky(a):
+    """ Lower factor of a, or None if a is not numerically positive definite """
+    try:
+        return np.linalg.cholesky(a)
+    except np.linalg.LinAlgError:
+        return None
+
+
+def cholesky_logdet(L)->float:
+    """ log det (L L^T) """
+    return 2.0 * float(np.sum(np.log(np.diag(L))))
+
+
+def cholesky_solve(L, b):
+    """ Solve L L^T x = b """
+    z = solve_triangular(L, b, lower=True, check_finite=False)
+    return solve_triangular(L.T, z, lower=False, check_finite=False)
+
+
+def cholesky_mahalanobis(L, y)->float:
+    """ y^T (L L^T)^{-1} y """
+    z = solve_triangular(L, np.asarray(y, dtype=float), lower=True, check_finite=False)
+    return float(np.dot(z, z))
+
+
+def batch_forward_substitution(L, b):
+    """ Solve L[t] z[t] = b[t] for a (T, n, n) stack of lower triangular L and (T, n) b, in O(T n^2) """
+    L = np.asarray(L, dtype=float)
+    z = np.array(b, dtype=float)
+    for k in range(np.shape(z)[1]):
+        if k:
+            z[:, k] -= np.einsum('ij,ij->i', L[:, k, :k], z[:, :k])
+        z[:, k] /= L[:, k, k]
+    return z
+
+
+def cholesky_to_precision(L):
+    """ (L L^T)^{-1} """
+    L_inv = solve_triangular(L, np.eye(len(L)), lower=True, check_finite=False)
+    return np.dot(L_inv.T, L_inv)
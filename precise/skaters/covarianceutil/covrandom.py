@@ -29,6 +29,13 @@ def jiggle_cov(cov, noise=DEFAULT_COV_NOISE):
     return jiggled_cov
 
 
+def jiggle_covs(cov, l:int, noise=DEFAULT_COV_NOISE):
+    """ (l, n, n) stack of jiggled covs, with the same random draws as l calls to jiggle_cov """
+    cov = np.asarray(cov)
+    x_rand = np.random.randn(l, np.shape(cov)[0]) * np.sqrt(np.diag(cov) + 0.000001)
+    return cov + noise * (x_rand[:, :, np.newaxis] * x_rand[:, np.newaxis, :])
+
+
 def rnd_symm_cov(rho, severity, n_dim):
     """ Approximately symmetric """
     # Make a symmetric cov matrix somehow
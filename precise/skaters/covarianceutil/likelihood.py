@@ -2,6 +2,10 @@
 import numpy as np
 import math
 import time
+from precise.skaters.covarianceutil.cholesky import cholesky_logdet, cholesky_mahalanobis, batch_forward_substitution
+from precise.skaters.covarianceutil.warmstart import warm_start
+
+LIKELIHOOD_BATCH = 256   # Predictions held before scoring in cov_skater_loglikelihood
 
 
 def historical_log_likelihood(pre, xs, lb, mu=None):
@@ -46,20 +50,96 @@ def vector_log_likelihood(pre, y, lb):
     return ll
 
 
+def vector_log_likelihood_chol(chol, y, lb):
+    """ Log likelihood of y, given the lower Cholesky factor of the predicted cov
+    :param chol:   L where cov = L L^T
+    :param lb:     lower bound, returned if cov is degen
+    """
+    p = len(y)
+    logdet = -cholesky_logdet(chol)   # of the precision, as in vector_log_likelihood
+    if logdet < lb:
+        return lb
+    else:
+        ll_term_1 = - (p / 2) * math.log(2 * math.pi)
+        ll_term_2 = (1 / 2) * logdet
+        ll_term_3 = - 1 / 2 * cholesky_mahalanobis(chol, y)
+        ll = ll_term_1 + ll_term_2 + ll_term_3
+    return ll
+
+
+def batch_log_likelihood(covs, ys, lb, ub=None, chols=None):
+    """ Log likelihoods of ys[t] under N(0, covs[t]), as per vector_log_likelihood applied to the inverse of each cov
+    :param covs:    (T, n_dim, n_dim) predicted covariances
+    :param ys:      (T, n_dim) innovations
+    :param lb:      lower bound, returned for any cov that is degenerate
+    :param ub:      upper bound applied to each log likelihood
+    :param chols:   Optional list of known lower Cholesky factors, or None, for each t
+    :return: (T,) array
+
+    One batched Cholesky gives both log det and Mahalanobis terms. Slices that are not numerically positive
+    definite fall back, one at a time, to inversion as in cov_skater_loglikelihood.
+    """
+    covs = np.asarray(covs, dtype=float)
+    ys = np.asarray(ys, dtype=float)
+    n_obs, n_dim = np.shape(ys)
+    lls = np.empty(n_obs)
+    if n_obs == 0:
+        return lls
+
+    L = np.zeros_like(covs)
+    ok = np.ones(n_obs, dtype=bool)
+    known = np.array([ (chols is not None) and (chols[t] is not None) for t in range(n_obs) ])
+    if known.any():
+        L[known] = np.array([chols[t] for t in np.flatnonzero(known)])
+    todo = np.flatnonzero(~known)
+    try:
+        L[todo] = np.linalg.cholesky(covs[todo])
+    except np.linalg.LinAlgError:
+        for t in todo:
+            try:
+                L[t] = np.linalg.cholesky(covs[t])
+            except np.linalg.LinAlgError:
+                ok[t] = False
+
+    good = np.flatnonzero(ok)
+    if len(good):
+        diag = np.diagonal(L[good], axis1=1, axis2=2)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            logdet = -2.0 * np.sum(np.log(diag), axis=1)     # of the precision
+            z = batch_forward_substitution(L[good], ys[good])
+        lls[good] = - (n_dim / 2) * math.log(2 * math.pi) + 0.5 * logdet - 0.5 * np.sum(z ** 2, axis=1)
+        lls[good[~(logdet >= lb)]] = lb
+    for t in np.flatnonzero(~ok):
+        try:
+            pre = np.linalg.inv(covs[t])
+        except np.linalg.LinAlgError:
+            pre = np.linalg.pinv(covs[t])
+        lls[t] = vector_log_likelihood(pre=pre, y=ys[t], lb=lb)
+    if ub is not None:
+        lls = np.minimum(lls, ub)
+    return lls
+
+
 def cov_likelihood(contestant, xs, n_burn=10, lb=-1000, ub=1000):
     # Used as evaluator
     return cov_skater_loglikelihood(f=contestant, xs=xs, with_metrics=True, n_burn=n_burn, lb=lb, ub=ub)
 
 
-def cov_skater_loglikelihood(f, xs, n_burn=10, with_metrics=True, lb=-1000, ub=1000, verbose=True):
+def cov_skater_loglikelihood(f, xs, n_burn=10, with_metrics=True, lb=-1000, ub=1000, verbose=True, warm=True, bulk=True):
     """
         Gaussian likelihood of a cov skater applied to data xs
 
     :param f:  cov skater
+    :param warm:   Fast-forward the burn-in with warm_start, rather than stepping
+    :param bulk:   If f is replayable (see replay.py), compute its forecast path in one go rather than stepping
     :param lb, ub  lower and upper bounds for ll of individual point
     :param xs:
     :return:
     """
+    from precise.skaters.covariance.replay import is_replayable
+    if bulk and is_replayable(f):
+        return _replayed_loglikelihood(f=f, xs=xs, n_burn=n_burn, with_metrics=with_metrics, lb=lb, ub=ub)
+
     start_time = time.time()
     inv_time = 0
 
@@ -69,43 +149,89 @@ def cov_skater_loglikelihood(f, xs, n_burn=10, with_metrics=True, lb=-1000, ub=1
 
     if verbose:
         print('   burn in for '+str(n_burn))
-    for y in xs[:n_burn]:
-        y_hat, y_cov, s = f(s=s, y=y, k=1, e=-1)
+    if warm:
+        y_hat, y_cov, s = warm_start(f=f, xs=xs[:n_burn], e=-1)
+    else:
+        for y in xs[:n_burn]:
+            y_hat, y_cov, s = f(s=s, y=y, k=1, e=-1)
 
     if verbose:
         print('   evaluating  '+str(n_obs-n_burn))
 
+    # Predictions are scored in batches of n_batch, after the skater has moved on
+    n_batch = min(n_obs - n_burn, LIKELIHOOD_BATCH)
+    covs = np.empty(shape=(n_batch, n_dim, n_dim))
+    dys = np.empty(shape=(n_batch, n_dim))
+    chols = [None for _ in range(n_batch)]
+    n_pending = 0
+
     ll = 0
     y_hat_prev = None
     y_cov_prev = None
+    y_chol_prev = None
+    y_chol = _maintained_chol(s=s, y_cov=y_cov)
     for m,y in enumerate( xs[n_burn:]):
         if y_hat_prev is not None:
-            # Evaluate last prediction
-            inv_start_time = time.time()
-            try:
-                y_inv_prev = np.linalg.inv(y_cov_prev)
-            except np.linalg.LinAlgError:
-                y_inv_prev = np.linalg.pinv(y_cov_prev)
-            inv_time += time.time()-inv_start_time
-
-            dy = np.array(y) - np.array(y_hat_prev)
-            ll_delta = vector_log_likelihood(pre=y_inv_prev, y=dy, lb=lb)
-            if ll_delta>ub:
-                ll_delta = ub
-            ll += ll_delta
-
-        # Store predictions for assessment against next data point
-        y_hat_prev = y_hat
-        y_cov_prev = y_cov
+            # Queue last prediction for evaluation
+            dys[n_pending] = np.array(y) - np.array(y_hat_prev)
+            covs[n_pending] = y_cov_prev
+            chols[n_pending] = None if y_chol_prev is None else np.copy(y_chol_prev)
+            n_pending += 1
+            if n_pending == n_batch:
+                inv_start_time = time.time()
+                ll += float(np.sum(batch_log_likelihood(covs=covs, ys=dys, lb=lb, ub=ub, chols=chols)))
+                inv_time += time.time() - inv_start_time
+                n_pending = 0
+
+        # Store predictions for assessment against next data point. Copied, as some skaters update them in place
+        y_hat_prev = np.array(y_hat, dtype=float)
+        y_cov_prev = np.array(y_cov, dtype=float)
+        y_chol_prev = y_chol
 
         # Make next prediction
         y_hat, y_cov, s = f(s=s, y=y, k=1, e=1)
+        y_chol = _maintained_chol(s=s, y_cov=y_cov)
+
+    if n_pending:
+        inv_start_time = time.time()
+        ll += float(np.sum(batch_log_likelihood(covs=covs[:n_pending], ys=dys[:n_pending], lb=lb, ub=ub, chols=chols[:n_pending])))
+        inv_time += time.time() - inv_start_time
 
     total_time = time.time()-start_time
     metrics = {'total time':total_time,'inversion time':inv_time,'time':total_time-inv_time}
     return ll, metrics if with_metrics else ll
 
 
+def _replayed_loglikelihood(f, xs, n_burn=10, with_metrics=True, lb=-1000, ub=1000):
+    """ As per cov_skater_loglikelihood, scoring the replayed forecast path
+
+        Stepping scores xs[t] against the prediction made after xs[t-2], for t > n_burn, so the same rows are used here
+    """
+    from precise.skaters.covariance.replay import replay
+    start_time = time.time()
+    xs = np.asarray(xs, dtype=float)
+    n_obs, n_dim = np.shape(xs)
+    assert n_obs>n_burn
+    x, x_cov = replay(f=f, xs=xs)
+    replay_time = time.time() - start_time
+
+    ll = 0
+    for start in range(n_burn + 1, n_obs, LIKELIHOOD_BATCH):
+        end = min(n_obs, start + LIKELIHOOD_BATCH)
+        lls = batch_log_likelihood(covs=x_cov[start - 2:end - 2], ys=xs[start:end] - x[start - 2:end - 2], lb=lb, ub=ub)
+        ll += float(np.sum(lls))
+
+    total_time = time.time()-start_time
+    metrics = {'total time':total_time,'inversion time':total_time-replay_time,'time':replay_time}
+    return ll, metrics if with_metrics else ll
+
+
+def _maintained_chol(s, y_cov):
+    """ Cholesky factor carried by the skater state, if it is the factor of y_cov """
+    if isinstance(s, dict) and (s.get('pcov_chol') is not None) and (s.get('pcov') is y_cov):
+        return s['pcov_chol']
+
+
 def pre_skater_loglikelihood(f, xs, n_burn=10, with_metrics=True, lb=-1000, ub=1000):
     """
         Gaussian likelihood of a precision skater applied to data xs
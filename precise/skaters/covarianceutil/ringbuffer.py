@@ -0,0 +1,53 @@
+import numpy as np
+from precise.skaters.covarianceutil.conventions import X_DATA_TYPE
+
+# Preallocated circular buffer of vectors, with O(1) append and a zero-copy chronological window
+#
+# Every row is written twice, at position p and p+n_buffer, so that the last n_buffer rows are
+# always available as one contiguous slice of s['ring'] (oldest first). This lets functions
+# acting on the buffer receive an ndarray view rather than a list that must be re-materialized.
+
+
+def ring_init(s:dict=None, n_buffer:int=100, n_dim:int=None)->dict:
+    """ Allocation is deferred until the first vector arrives, unless n_dim is supplied """
+    if s is None:
+        s = dict()
+    s.update({'n_buffer':n_buffer, 'ring':None, 'ring_pos':-1, 'ring_len':0})
+    if n_dim is not None:
+        s = _ring_alloc(s=s, n_dim=n_dim)
+    return s
+
+
+def _ring_alloc(s:dict, n_dim:int)->dict:
+    s['ring'] = np.empty(shape=(2 * s['n_buffer'], n_dim))
+    return s
+
+
+def ring_append(s:dict, x:X_DATA_TYPE)->dict:
+    """ Add x, dropping the oldest vector if the buffer is full """
+    x = np.atleast_1d(x)
+    if s['ring'] is None:
+        s = _ring_alloc(s=s, n_dim=len(x))
+    assert np.shape(s['ring'])[1] == len(x), 'dimension mismatch'
+    n_buffer = s['n_buffer']
+    p = (s['ring_pos'] + 1) % n_buffer
+    s['ring'][p] = x
+    s['ring'][p + n_buffer] = x
+    s['ring_pos'] = p
+    s['ring_len'] = min(s['ring_len'] + 1, n_buffer)
+    return s
+
+
+def ring_oldest(s:dict):
+    """ Vector that will be dropped by the next append, if the buffer is full, else None """
+    if s['ring_len'] < s['n_buffer']:
+        return None
+    return s['ring'][(s['ring_pos'] + 1) % s['n_buffer']]
+
+
+def ring_view(s:dict):
+    """ (ring_len, n_dim) view of the buffer contents, oldest first. Do not mutate. """
+    if s['ring'] is None:
+        return np.empty(shape=(0, 0))
+    end = s['ring_pos'] + s['n_buffer'] + 1
+    return s['ring'][end - s['ring_len']:end]
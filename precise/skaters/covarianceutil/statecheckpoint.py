@@ -0,0 +1,185 @@
+import numpy as np
+import json
+import os
+import numbers
+
+# Checkpoint and restore skater and manager states
+#
+# States remain the usual nested dicts (s['f_state'], s['account_state'] ...). For storage each state is split into
+#     - a schema:  JSON-able description of the nesting, key types, scalar types, shapes and dtypes
+#     - arrays:    the numerical leaves, in order
+# States sharing a schema (e.g. the same skater run on many streams of the same dimension) are packed together,
+# one contiguous (n_states, ...) array per leaf, so thousands of states are written and read with a few array copies.
+#
+#     save_states(filename, states)      # .npz file, or a directory of .npy files if no .npz suffix
+#     states = load_states(filename)     # directory form can be memory-mapped with mmap=True
+#
+# Restored states are plain dicts again, and can be passed straight back to the skater.
+
+CHECKPOINT_VERSION = 1
+CHECKPOINT_META = '__meta__'
+
+
+def state_to_arrays(s)->(dict, list):
+    """ Split a state into a schema and a list of arrays """
+    arrays = list()
+    schema = _encode(s, arrays)
+    return schema, arrays
+
+
+def arrays_to_state(schema:dict, arrays:list):
+    """ Inverse of state_to_arrays """
+    return _decode(schema, arrays)
+
+
+def pack_states(states:list)->(dict, dict):
+    """ Group states with identical schema and stack their arrays
+    :returns  meta, arrays    where arrays is a dict of name -> (n_states_in_group, ...) arrays
+    """
+    groups = dict()
+    for ndx, s in enumerate(states):
+        schema, arrays = state_to_arrays(s)
+        key = json.dumps(schema, sort_keys=True)
+        if key not in groups:
+            groups[key] = {'schema':schema, 'ndx':list(), 'arrays':list()}
+        groups[key]['ndx'].append(ndx)
+        groups[key]['arrays'].append(arrays)
+
+    meta = {'version':CHECKPOINT_VERSION, 'n_states':len(states), 'groups':list()}
+    packed = dict()
+    for g, group in enumerate(groups.values()):
+        n_arrays = len(group['arrays'][0])
+        for a in range(n_arrays):
+            packed[_array_name(g, a)] = np.stack([arrays[a] for arrays in group['arrays']])
+        meta['groups'].append({'schema':group['schema'], 'ndx':group['ndx'], 'n_arrays':n_arrays})
+    return meta, packed
+
+
+def unpack_states(meta:dict, packed:dict)->list:
+    """ Inverse of pack_states """
+    if meta['version'] > CHECKPOINT_VERSION:
+        raise ValueError('Checkpoint version ' + str(meta['version']) + ' is newer than this code understands')
+    states = [None for _ in range(meta['n_states'])]
+    for g, group in enumerate(meta['groups']):
+        stacked = [packed[_array_name(g, a)] for a in range(group['n_arrays'])]
+        for k, ndx in enumerate(group['ndx']):
+            states[ndx] = arrays_to_state(group['schema'], [a[k] for a in stacked])
+    return states
+
+
+def save_states(filename:str, states:list):
+    """ Write states to filename.npz, or to a directory of .npy files if filename does not end in .npz """
+    meta, packed = pack_states(states)
+    if filename.endswith('.npz'):
+        np.savez(filename, **packed, **{CHECKPOINT_META:np.array(json.dumps(meta))})
+    else:
+        os.makedirs(filename, exist_ok=True)
+        for name, a in packed.items():
+            np.save(os.path.join(filename, name + '.npy'), a)
+        with open(os.path.join(filename, CHECKPOINT_META + '.json'), 'wt') as fh:
+            json.dump(meta, fh)
+
+
+def load_states(filename:str, mmap:bool=False)->list:
+    """ Restore states written by save_states
+    :param mmap:  For the directory form, memory-map arrays copy-on-write so states are usable without reading everything
+    """
+    if filename.endswith('.npz'):
+        with np.load(filename, allow_pickle=False) as data:
+            meta = json.loads(str(data[CHECKPOINT_META]))
+            packed = dict([(name, data[name]) for name in data.files if name != CHECKPOINT_META])
+    else:
+        with open(os.path.join(filename, CHECKPOINT_META + '.json'), 'rt') as fh:
+            meta = json.load(fh)
+        mmap_mode = 'c' if mmap else None
+        packed = dict()
+        for g, group in enumerate(meta['groups']):
+            for a in range(group['n_arrays']):
+                name = _array_name(g, a)
+                packed[name] = np.load(os.path.join(filename, name + '.npy'), mmap_mode=mmap_mode, allow_pickle=False)
+    return unpack_states(meta=meta, packed=packed)
+
+
+def _array_name(g:int, a:int)->str:
+    return 'g' + str(g) + '_a' + str(a)
+
+
+def _scalar_type(x)->str:
+    if isinstance(x, (bool, np.bool_)):
+        return 'bool'
+    elif isinstance(x, numbers.Integral):
+        return 'int'
+    elif isinstance(x, numbers.Real):
+        return 'float'
+    elif isinstance(x, numbers.Complex):
+        return 'complex'
+    return None
+
+
+SCALAR_CASTS = {'bool':bool, 'int':int, 'float':float, 'complex':complex}
+KEY_CASTS = {'str':str, 'bool':lambda k: k == 'True', 'int':int, 'float':float, 'complex':complex}
+
+
+def _encode(x, arrays:list)->dict:
+    if x is None:
+        return {'t':'none'}
+    elif isinstance(x, str):
+        return {'t':'str', 'v':x}
+    elif isinstance(x, dict):
+        items = list()
+        for k, v in x.items():
+            key_type = _scalar_type(k) if not isinstance(k, str) else 'str'
+            if key_type is None:
+                raise ValueError('Cannot checkpoint dict key ' + str(k))
+            items.append([str(k), key_type, _encode(v, arrays)])
+        return {'t':'dict', 'items':items}
+    elif isinstance(x, np.ndarray):
+        if x.dtype == object:
+            raise ValueError('Cannot checkpoint object arrays')
+        arrays.append(np.ascontiguousarray(x))
+        return {'t':'array', 'a':len(arrays) - 1, 'shape':list(x.shape), 'dtype':x.dtype.str}
+    elif _scalar_type(x) is not None:
+        arrays.append(np.array(x))
+        return {'t':'scalar', 'a':len(arrays) - 1, 'type':_scalar_type(x)}
+    elif isinstance(x, (list, tuple)):
+        seq_type = 'list' if isinstance(x, list) else 'tuple'
+        if len(x) and all(_scalar_type(xi) in ('int', 'float') for xi in x):
+            # Lists of numbers, such as portfolio weights, are stored as one vector
+            element_type = 'int' if all(_scalar_type(xi) == 'int' for xi in x) else 'float'
+            arrays.append(np.array(x, dtype=int if element_type == 'int' else float))
+            return {'t':'numbers', 'seq':seq_type, 'type':element_type, 'a':len(arrays) - 1, 'n':len(x)}
+        if len(x) and all(isinstance(xi, np.ndarray) and xi.dtype != object for xi in x) \
+                and len(set((xi.shape, xi.dtype.str) for xi in x)) == 1:
+            # Buffers of equally shaped vectors are stored as one matrix
+            arrays.append(np.stack(x))
+            return {'t':'arrays', 'seq':seq_type, 'a':len(arrays) - 1, 'shape':list(np.shape(arrays[-1])), 'dtype':x[0].dtype.str}
+        return {'t':'seq', 'seq':seq_type, 'items':[_encode(xi, arrays) for xi in x]}
+    else:
+        raise ValueError('Cannot checkpoint object of type ' + str(type(x)))
+
+
+def _decode(schema:dict, arrays:list):
+    t = schema['t']
+    if t == 'none':
+        return None
+    elif t == 'str':
+        return schema['v']
+    elif t == 'dict':
+        return dict([(KEY_CASTS[key_type](k), _decode(v, arrays))
+                     for k, key_type, v in schema['items']])
+    elif t == 'array':
+        return arrays[schema['a']]
+    elif t == 'scalar':
+        return SCALAR_CASTS[schema['type']](arrays[schema['a']])
+    elif t == 'numbers':
+        cast = SCALAR_CASTS[schema['type']]
+        x = [cast(xi) for xi in arrays[schema['a']]]
+        return x if schema['seq'] == 'list' else tuple(x)
+    elif t == 'arrays':
+        x = list(arrays[schema['a']])
+        return x if schema['seq'] == 'list' else tuple(x)
+    elif t == 'seq':
+        x = [_decode(xi, arrays) for xi in schema['items']]
+        return x if schema['seq'] == 'list' else tuple(x)
+    else:
+        raise ValueError('Unknown schema type ' + str(t))
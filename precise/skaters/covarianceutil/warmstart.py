@@ -0,0 +1,181 @@
+import numpy as np
+from scipy.signal import lfilter
+from precise.skaters.covariance.runempfactory import _emp_pcov_init
+from precise.skaters.covariance.ewaempfactory import _ema_scov_init
+from precise.skaters.covariance.ewapmfactory import _partial_ema_scov_init, QUADRANT_SIGNS
+from precise.skaters.covariance.buffactory import _roll_init, _roll_anchor
+from precise.skaters.covarianceutil.ringbuffer import ring_init, ring_view
+from precise.skaters.covarianceutil.cholesky import try_cholesky
+
+# Fast-forward a skater through a history block, rather than feeding it one observation at a time
+#
+#     x, x_cov, s = warm_start(f, xs)     # As if  for y in xs: x, x_cov, s = f(y=y, s=s, k=1, e=-1)
+#
+# The skater is stepped once, and the state it returns identifies the underlying factory and its parameters
+# (e.g. s['rho'], s['n_emp'], s['n_buffer']). For the empirical, EWA, partial moment and buffer families the state
+# after all but the last observation is then computed in closed form, as weighted covariances of the block.
+# The last observation is stepped as usual, so outputs are those of the skater itself. Anything else is
+# stepped throughout.
+
+EMP_KEYS = {'n_dim', 'shape', 'ones', 'n_samples', 'mean', 'pcov', 'with_chol'}
+EWA_KEYS = EMP_KEYS | {'rho', 'n_emp'}
+PM_KEYS = {'n_dim', 'n_emp', 'rho', 'target', 'n_quadrant_samples', 'qpcov', 'qscov', 'sma', 'mean', 'n_samples', 'scov'}
+RING_KEYS = {'n_buffer', 'ring', 'ring_pos', 'ring_len', 'buffer'}
+ROLL_KEYS = RING_KEYS | {'roll_n', 'roll_mean', 'roll_m2', 'n_anchor', 'n_since_anchor', 'n_nonfinite'}
+OPTIONAL_KEYS = {'pcov_chol', 'chol_retry', 'scov'}
+
+
+def warm_start(f, xs, k=1, e=-1, **f_kwargs):
+    """ Output and state of skater f after xs
+    :param xs:  (n_obs, n_dim) history, n_obs>=1
+    :param e:   Passed to f, as if for each observation. Burn-in uses e=-1
+    :returns x, x_cov, s
+    """
+    xs = np.asarray(xs, dtype=float)
+    x, x_cov, s = f(y=xs[0], s={}, k=k, e=e, **f_kwargs)
+    n_stepped = 1
+    if len(xs) > 2:
+        s_block = block_state(s=s, xs=xs[:-1])
+        if s_block is not None:
+            s = s_block
+            n_stepped = len(xs) - 1
+    for y in xs[n_stepped:]:
+        x, x_cov, s = f(y=y, s=s, k=k, e=e, **f_kwargs)
+    return x, x_cov, s
+
+
+def block_state(s:dict, xs):
+    """ State after xs in closed form, or None if the factory isn't recognized
+    :param s:   State returned by the skater after the first observation, xs[0]
+    :param xs:  All observations, including xs[0]
+    """
+    if not isinstance(s, dict):
+        return None
+    keys = set(s) - OPTIONAL_KEYS
+    if keys == EMP_KEYS:
+        return _emp_block(s=s, xs=xs)
+    elif keys == EWA_KEYS:
+        return _ewa_block(s=s, xs=xs)
+    elif keys == PM_KEYS:
+        return _pm_block(s=s, xs=xs)
+    elif keys - {'mean', 'pcov'} == ROLL_KEYS and np.isfinite(xs).all():
+        return _roll_block(s=s, xs=xs)
+    elif keys - {'sk'} == RING_KEYS and not s.get('sk', {}).get('n_fit'):
+        return _ring_block(s=s, xs=xs)
+    return None
+
+
+def _emp_block(s:dict, xs, s_new:dict=None)->dict:
+    """ Empirical mean and population covariance of xs, as per _emp_pcov_update """
+    n, n_dim = np.shape(xs)
+    s_new = s_new if s_new is not None else _emp_pcov_init(n_dim=n_dim, with_chol=s.get('with_chol'))
+    s_new['n_samples'] = n
+    s_new['mean'] = np.mean(xs, axis=0)
+    dxs = xs - s_new['mean']
+    s_new['pcov'] = np.dot(dxs.T, dxs) / n
+    return s_new
+
+
+def _ewa_block(s:dict, xs)->dict:
+    """ As per _ema_scov_update: empirical for n_emp observations, then exponentially weighted """
+    n, n_dim = np.shape(xs)
+    r = s['rho']
+    s_new = _ema_scov_init(n_dim=n_dim, r=r, n_emp=s['n_emp'], with_chol=s.get('with_chol'))
+    n_emp = min(n, s['n_emp'])
+    s_new = _emp_block(s=s, xs=xs[:n_emp], s_new=s_new)
+    if n_emp > 1:
+        s_new['scov'] = s_new['pcov'] * n_emp / (n_emp - 1)
+    rest = xs[n_emp:]
+    if len(rest):
+        means = ewa_path(mean=s_new['mean'], xs=rest, r=r)
+        dxs = rest - np.vstack([s_new['mean'], means[:-1]])
+        s_new['scov'] = (1 - r) ** len(rest) * s_new['scov'] + np.dot(dxs.T * ewa_weights(n=len(rest), r=r), dxs)
+        s_new['mean'] = means[-1]
+        s_new['n_samples'] = n
+        s_new['pcov'] = s_new['scov'] * (n - 1) / n
+    if s.get('with_chol') and n > n_dim:
+        s_new['pcov_chol'] = try_cholesky(s_new['pcov'])
+    return s_new
+
+
+def _pm_block(s:dict, xs)->dict:
+    """ As per _partial_ema_scov_update: quadrant scatter, empirical for n_emp observations, then exponentially weighted """
+    n, n_dim = np.shape(xs)
+    r = s['rho']
+    s_new = _partial_ema_scov_init(n_dim=n_dim, r=r, n_emp=s['n_emp'], target=s['target'])
+    sma_means = sma_path(xs=xs, r=r)
+    prev_means = np.vstack([np.zeros(n_dim), sma_means[:-1]])
+    dxs = xs - (prev_means if s['target'] is None else s['target'])
+    by_sign = {1:np.maximum(dxs, 0), -1:np.minimum(dxs, 0)}
+    x1s = [by_sign[sgn1] for sgn1 in QUADRANT_SIGNS[:, 0]]
+    x2s = [by_sign[sgn2] for sgn2 in QUADRANT_SIGNS[:, 1]]
+
+    n_emp = min(n, s['n_emp'])
+    s_new['qpcov'] = np.array([np.dot(x1[:n_emp].T, x1[:n_emp]) / n_emp for x1 in x1s])
+    if n_emp > 1:
+        s_new['qscov'] = s_new['qpcov'] * n_emp / (n_emp - 1)
+    n_rest = n - n_emp
+    if n_rest:
+        decay, weights = (1 - r) ** n_rest, ewa_weights(n=n_rest, r=r)
+        s_new['qscov'] = np.array([decay * qscov + np.dot(x1[n_emp:].T * weights, x2[n_emp:])
+                                   for qscov, x1, x2 in zip(s_new['qscov'], x1s, x2s)])
+    s_new['n_quadrant_samples'] = n
+    s_new['mean'] = np.copy(prev_means[-1])
+    s_new['n_samples'] = n - 1
+    s_new['scov'] = np.sum(s_new['qscov'], axis=0) if n - 1 >= 2 else np.eye(n_dim)
+    s_new['sma'].update({'n_samples':n, 'mean':np.copy(sma_means[-1])})
+    return s_new
+
+
+def _roll_block(s:dict, xs)->dict:
+    """ As per _roll_update: the buffer holds the last n_buffer observations, anchored every n_anchor """
+    s_new = _ring_block(s=s, xs=xs)
+    s_new = _roll_init(s=s_new, n_anchor=s['n_anchor'])
+    s_new = _roll_anchor(s_new)
+    s_new['n_since_anchor'] = (len(xs) - 1) % s['n_anchor']
+    if 'mean' in s:
+        s_new['mean'] = np.copy(s_new['roll_mean'])
+        s_new['pcov'] = s_new['roll_m2'] / s_new['ring_len']
+    return s_new
+
+
+def _ring_block(s:dict, xs)->dict:
+    """ Ring buffer as if each of xs were appended """
+    n, n_dim = np.shape(xs)
+    n_buffer = s['n_buffer']
+    s_new = dict([(key, value) for key, value in s.items() if key not in RING_KEYS])
+    if 'sk' in s:
+        s_new['sk'] = dict(s['sk'])
+    s_new = ring_init(s=s_new, n_buffer=n_buffer, n_dim=n_dim)
+    kept = np.arange(max(0, n - n_buffer), n)
+    s_new['ring'][kept % n_buffer] = xs[kept]
+    s_new['ring'][kept % n_buffer + n_buffer] = xs[kept]
+    s_new['ring_pos'] = (n - 1) % n_buffer
+    s_new['ring_len'] = len(kept)
+    s_new['buffer'] = ring_view(s_new)
+    return s_new
+
+
+def ewa_weights(n:int, r:float):
+    """ Weight of each of n observations in an exponentially weighted sum, most recent last """
+    return r * (1 - r) ** np.arange(n - 1, -1, -1)
+
+
+def ewa_path(mean, xs, r:float):
+    """ Means after each observation, for the recursion mean = (1-r) mean + r x """
+    return lfilter([r], [1, -(1 - r)], xs, axis=0, zi=(1 - r) * np.atleast_2d(mean))[0]
+
+
+def sma_path(xs, r:float):
+    """ Means after each observation, as per the 'switch' averager in precise.skaters.location.averagingpre """
+    n, n_dim = np.shape(xs)
+    counts = np.arange(1, n + 1)
+    n_switch = int(np.sum(counts < 1 / r))
+    means = np.empty((n, n_dim))
+    means[:n_switch] = np.cumsum(xs[:n_switch] / counts[:n_switch, np.newaxis], axis=0)
+    if n_switch < n:
+        if n_switch == 0:
+            means[0] = xs[0]
+            n_switch = 1
+        means[n_switch:] = ewa_path(mean=means[n_switch - 1], xs=xs[n_switch:], r=r)
+    return means
@@ -1,5 +1,6 @@
 import numpy as np
 from precise.skaters.covarianceutil.conventions import X_TYPE, X_DATA_TYPE, is_data
+from precise.skaters.covarianceutil.ringbuffer import ring_init, ring_append, ring_view
 
 
 # Vectorized median for finite buffer
@@ -17,19 +18,13 @@ def med(s:dict=None, x:X_TYPE=None, n_buffer:int=100 ):
 def _med_init(s:dict=None, n_buffer:int=None):
     if not s:
         s = dict()
-    s.update( {'buffer':list(), 'n_buffer':n_buffer} )
+    s = ring_init(s=s, n_buffer=n_buffer)
     return s
 
 
 def _med_update(s:dict, x:X_DATA_TYPE, n_buffer:int=None):
-    if n_buffer is None:
-        n_buffer = s['n_buffer']
-    if len(s['buffer']):
-        assert len(s['buffer'][0])==len(x), 'dimension mismatch'
-    s['buffer'].append(np.atleast_1d(x))
-    if len(s['buffer'])>n_buffer:
-        _ = s['buffer'].pop(0)
-    s['median'] = np.nanmedian(s['buffer'],axis=0)
+    s = ring_append(s=s, x=x)
+    s['median'] = np.nanmedian(ring_view(s),axis=0)
     return s
 
 
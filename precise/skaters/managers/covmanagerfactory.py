@@ -3,6 +3,14 @@ import math
 from precise.skaters.locationutil.vectorfunctions import normalize
 from precise.skaters.portfolioutil.zetaport import zeta_port
 from precise.skaters.portfolioutil.portgeometry import closest_weak_l1, closest_point_l1
+from precise.skatertools.profiling import profile_section
+from precise.skaters.covarianceutil.covrandom import jiggle_covs
+from precise.skaters.portfoliostatic.unitportfactory import unit_portfolio_factory, unitary_from_covs
+from precise.skaters.portfoliostatic.diagportfactory import diagonal_portfolio_factory, diagonal_from_covs
+from precise.skaters.portfoliostatic.unitport import unit_port, unit_port_p100
+from precise.skaters.portfoliostatic.diagport import diag_long_port
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import numpy as np
 
 
 # A family of managers characterized as follows:
@@ -18,7 +26,7 @@ from precise.skaters.portfolioutil.portgeometry import closest_weak_l1, closest_
 # See examples in precise.managers.ppomanagers, rpmanagers, weakmanagers etc
 
 
-def closest_random_nudge(port, cov, q, l, w, port_kwargs, zeta=None):
+def closest_random_nudge(port, cov, q, l, w, port_kwargs, zeta=None, jiggle:float=0.0, n_workers:int=None, executor=None):
     """ Apply portfolio method l times, then choose the closest to w or some convex combo
 
         :param l:      Number of times to apply port, (presumably port is stochastic)
@@ -33,28 +41,85 @@ def closest_random_nudge(port, cov, q, l, w, port_kwargs, zeta=None):
         :param port:   Function taking cov, ***port_kwargs -> w
         :param port_kwargs: Additional params to port
         :param w:      Previous portfolio
+        :param jiggle: If positive, l jiggled versions of cov are drawn here (see jiggle_covs), so that deterministic
+                       ports can be used. Ports in BATCHED_PORTS then solve the whole stack at once.
+        :param executor:   Make the l calls to port concurrently, using 'thread', 'process' or an existing Executor.
+                       A string creates a pool for this call only, so managers that nudge often should pass a
+                       long-lived Executor via nudger_kwargs instead. Process pool tasks are seeded from the global
+                       random state.
+        :param n_workers:  Pool size when executor is 'thread' or 'process'. Supplied alone, implies 'process'.
 
     """
 
     if l is None:
-        w_target = zeta_port(port=port, cov=cov, zeta=zeta, **port_kwargs)  # <-- just port(cov,**port_kwargs) usually
+        with profile_section('port'):
+            w_target = zeta_port(port=port, cov=cov, zeta=zeta, **port_kwargs)  # <-- just port(cov,**port_kwargs) usually
     else:
         # Run port several times
-        w_ports = list()
-        for _ in range(l):
-            w_ = zeta_port(port=port, cov=cov, zeta=zeta, **port_kwargs)
-            w_ports.append(w_)
+        with profile_section('port'):
+            w_ports = repeated_ports(port=port, cov=cov, l=l, port_kwargs=port_kwargs, zeta=zeta, jiggle=jiggle,
+                                     n_workers=n_workers, executor=executor)
 
         # Find a portfolio near to w
-        if (l is not None) and (l >= 3) and is_odd(l):
-            w_target = closest_weak_l1(origin=w, xs=w_ports, verbose=False)
-        else:
-            w_target = closest_point_l1(origin=w, xs=w_ports)
+        with profile_section('nudge'):
+            if (l is not None) and (l >= 3) and is_odd(l):
+                w_target = closest_weak_l1(origin=w, xs=w_ports, verbose=False)
+            else:
+                w_target = closest_point_l1(origin=w, xs=w_ports)
 
-    w = [q * wi + (1 - q) * wpi for wi, wpi in zip(w_target, w)]
+    w = list(q * np.asarray(w_target, dtype=float) + (1 - q) * np.asarray(w, dtype=float))
     return w
 
 
+# Ports that can solve a (l, n, n) stack of cov matrices at once, returning (l, n) weights.
+# Lookup is by identity, so named wrappers are listed alongside the factories they call with default arguments.
+# Others (e.g. unit_port_p090, which shrinks off-diagonal entries) are called once per matrix.
+BATCHED_PORTS = {unit_portfolio_factory: unitary_from_covs,
+                 unit_port: unitary_from_covs,
+                 unit_port_p100: unitary_from_covs,
+                 diagonal_portfolio_factory: diagonal_from_covs,
+                 diag_long_port: diagonal_from_covs}
+
+
+def repeated_ports(port, cov, l:int, port_kwargs:dict=None, zeta=None, jiggle:float=0.0, n_workers:int=None,
+                   executor=None)->np.ndarray:
+    """ l portfolios from a stochastic port, or from port applied to l jiggled versions of cov
+    :param executor:  'thread', 'process' or an Executor, as per closest_random_nudge
+    :returns (l, n) array
+    """
+    if executor is None and n_workers is not None:
+        executor = 'process'
+    if executor in ['thread', 'process']:
+        pool_cls = ThreadPoolExecutor if executor == 'thread' else ProcessPoolExecutor
+        with pool_cls(max_workers=n_workers) as pool:
+            return repeated_ports(port=port, cov=cov, l=l, port_kwargs=port_kwargs, zeta=zeta, jiggle=jiggle,
+                                  executor=pool)
+    port_kwargs = port_kwargs or {}
+    if jiggle > 0:
+        covs = jiggle_covs(cov=cov, l=l, noise=jiggle)
+        batched = BATCHED_PORTS.get(port)
+        if batched is not None and not port_kwargs and not zeta:
+            try:
+                return batched(covs)
+            except np.linalg.LinAlgError:
+                pass
+    else:
+        covs = [cov] * l
+    if executor is not None:
+        # Processes don't share the random state, so each task gets a seed drawn here
+        seeds = list(np.random.randint(0, 2 ** 31 - 1, size=l)) if isinstance(executor, ProcessPoolExecutor) else [None] * l
+        w_ports = list(executor.map(_seeded_zeta_port, seeds, [port] * l, covs, [zeta] * l, [port_kwargs] * l))
+    else:
+        w_ports = [zeta_port(port=port, cov=cov_, zeta=zeta, **port_kwargs) for cov_ in covs]
+    return np.array([np.asarray(w_, dtype=float) for w_ in w_ports])
+
+
+def _seeded_zeta_port(seed, port, cov, zeta, port_kwargs):
+    if seed is not None:
+        np.random.seed(seed)
+    return zeta_port(port=port, cov=cov, zeta=zeta, **port_kwargs)
+
+
 def is_odd(l):
     return (l % 2) == 1
 
@@ -74,7 +139,8 @@ def _periodic_nudge(port, j: int, y, s: dict, cov, port_kwargs, nudger, **nudger
     if s.get('w') is None:
         s['multiplier'] = [1 for _ in range(n_dim)]
         s['count'] = 0
-        w = port(cov=cov, **port_kwargs)
+        with profile_section('port'):
+            w = port(cov=cov, **port_kwargs)
         s['w'] = [wi for wi in w]
         return w, s
     else:
@@ -152,7 +218,8 @@ def static_cov_manager_factory_d0(y, s, f, port, e=1, f_kwargs: dict = None, por
              'count': 0,
              'account_state': {}}
 
-    x_mean, x_cov, s['f_state'] = f(y=y, s=s['f_state'], k=1, e=e, **f_kwargs)
+    with profile_section('cov_update'):
+        x_mean, x_cov, s['f_state'] = f(y=y, s=s['f_state'], k=1, e=e, **f_kwargs)
     s['count'] += 1
     if s['count'] >= n_cold and (e > 0):
         s_account = s['account_state']
@@ -0,0 +1,36 @@
+from precise.skaters.covarianceutil.warmstart import block_state
+import numpy as np
+
+# Fast-forward a manager through a history block, as per warm_start for cov skaters
+#
+#     w, s = warm_start_manager(mgr, xs)    # As if  for y in xs: w, s = mgr(y=y, s=s, k=1, e=-1)
+#
+# Managers built with static_cov_manager_factory_d0 only update their cov skater when e<=0, so the skater state
+# is fast-forwarded in closed form where possible. Other managers are stepped.
+
+COV_MANAGER_KEYS = {'f_state', 'port_state', 'count', 'account_state'}
+
+
+def warm_start_manager(mgr, xs, e=-1, **mgr_kwargs):
+    """ Weights and state of manager mgr after xs
+    :param e:   Passed to mgr, as if for each observation. Only e<=0 is fast-forwarded.
+    :param mgr_kwargs:  e.g. j, q
+    :returns w, s
+    """
+    xs = np.asarray(xs, dtype=float)
+    w, s = mgr(y=xs[0], s={}, k=1, e=e, **mgr_kwargs)
+    n_stepped = 1
+    if len(xs) > 2 and e <= 0 and _is_cold_cov_manager_state(s):
+        f_state = block_state(s=s['f_state'], xs=xs[:-1])
+        if f_state is not None:
+            s['f_state'] = f_state
+            s['count'] = len(xs) - 1
+            n_stepped = len(xs) - 1
+    for y in xs[n_stepped:]:
+        w, s = mgr(y=y, s=s, k=1, e=e, **mgr_kwargs)
+    return w, s
+
+
+def _is_cold_cov_manager_state(s)->bool:
+    """ State of static_cov_manager_factory_d0 that has not yet run a portfolio """
+    return isinstance(s, dict) and set(s) == COV_MANAGER_KEYS and not s['account_state'] and not s['port_state']
@@ -29,6 +29,17 @@ def diagonal_from_pre(pre, sparse_approx=False, ridge=0.1):
     return diagonal_from_cov(cov=cov, ridge=ridge)
 
 
+def diagonal_from_covs(covs, ridge=0.1)->np.ndarray:
+    """ As per diagonal_from_cov, for a (l, n, n) stack of cov matrices
+    :returns (l, n) weights
+    """
+    d = np.diagonal(np.asarray(covs), axis1=1, axis2=2)
+    u = 1 / (d + ridge * np.mean(d, axis=1, keepdims=True))
+    ws = u / np.sum(u, axis=1, keepdims=True)
+    ws[np.any(d < 1e-6, axis=1)] = 1 / np.shape(d)[1]
+    return ws
+
+
 def diagonal_from_cov(cov, ridge=0.1):
     d = np.diag(cov)
     if any([di<1e-6 for di in d]):
@@ -29,12 +29,19 @@ VAR_NOISE = 0.0
 PPO_METHODS = ['max_sharpe','min_volatility','max_quadratic_utility']
 PPO_LONG_BOUNDS = (0, 1)
 PPO_UNIT_BOUNDS = (-1, 1)
+PPO_COMPILE_MAX_DIM = 40     # Above this, solving dominates and the factored problem is no faster
 
 
 if using_pyportfolioopt:
     from pypfopt.exceptions import OptimizationError
     from cvxpy.error import SolverError
     from pypfopt import EfficientFrontier
+    import cvxpy as cp
+    import threading
+    from collections import OrderedDict
+
+    # Problems compiled in this thread, keyed by (method, weight_bounds, n_dim). See ppo_compiled_problem
+    PPO_COMPILED = threading.local()
 
 
     def ppo_sharpe_port(cov=None, pre=None, as_dense=True):
@@ -68,13 +75,17 @@ if using_pyportfolioopt:
 
 
     def ppo_portfolio_factory(method:str, cov=None, pre=None, as_dense=False, weight_bounds=None,
-                              risk_free_rate:float=0.02, mu:float=0.04, n_attempts=5, warn=False, throw=False, noise=0.0):
+                              risk_free_rate:float=0.02, mu:float=0.04, n_attempts=5, warn=False, throw=False, noise=0.0,
+                              compiled=True):
         """
         :param method:
         :param cov:
         :param pre:
         :param as_dense:         If set to True, will force return of np.array even if supplied dataframe
         :param weight_bounds:
+        :param compiled:         Re-use a cvxpy problem compiled for this method, bounds and dimension, rather than
+                                 constructing an EfficientFrontier each call, for up to PPO_COMPILE_MAX_DIM assets.
+                                 See ppo_compiled_problem
         :return:  Can return a dictionary of variable names and weights
         """
 
@@ -101,14 +112,9 @@ if using_pyportfolioopt:
         warned = False
         for attempt_no in range(n_attempts):
             n_dim = np.shape(cov)[0]
-            ef = EfficientFrontier(expected_returns=expected_returns, cov_matrix=shrunk_cov,
-                                   weight_bounds=weight_bounds)
-            port_method = getattr(ef, method)
             try:
-                if method=='max_sharpe':
-                    port_method(risk_free_rate=risk_free_rate)
-                else:
-                    port_method()
+                weights = _ppo_clean_weights(method=method, cov=shrunk_cov, expected_returns=expected_returns,
+                                             weight_bounds=weight_bounds, risk_free_rate=risk_free_rate, compiled=compiled)
                 converged = True
             except (OptimizationError, SolverError, ArpackNoConvergence, UserWarning):
                 converged = False
@@ -132,7 +138,6 @@ if using_pyportfolioopt:
             if warn:
                 print('       ... but with shrinkage it converges okay.')
 
-        weights = ef.clean_weights()
         weights = normalize_dict_values(weights)
 
         if as_series:
@@ -141,6 +146,99 @@ if using_pyportfolioopt:
             return dense_weights_from_dict(weights, n_dim=n_dim)
 
 
+    def _ppo_clean_weights(method:str, cov, expected_returns, weight_bounds, risk_free_rate:float, compiled=True)->dict:
+        """ Weights as per EfficientFrontier(...).method() followed by clean_weights() """
+        n_dim = np.shape(cov)[0]
+        if not (compiled and _is_scalar_bounds(weight_bounds) and n_dim <= PPO_COMPILE_MAX_DIM):
+            ef = EfficientFrontier(expected_returns=expected_returns, cov_matrix=cov, weight_bounds=weight_bounds)
+            port_method = getattr(ef, method)
+            if method=='max_sharpe':
+                port_method(risk_free_rate=risk_free_rate)
+            else:
+                port_method()
+            return ef.clean_weights()
+
+        tickers = list(cov.columns) if isinstance(cov, pd.DataFrame) else list(range(n_dim))
+        expected_returns = np.asarray(expected_returns, dtype=float).ravel()
+        compiled_problem = ppo_compiled_problem(method=method, weight_bounds=weight_bounds, n_dim=n_dim)
+        if method=='max_sharpe':
+            if max(expected_returns) <= risk_free_rate:
+                raise ValueError("at least one of the assets must have an expected return exceeding the risk-free rate")
+            compiled_problem['mu'].value = expected_returns - risk_free_rate
+        elif method=='max_quadratic_utility':
+            compiled_problem['mu'].value = expected_returns
+        compiled_problem['factor'].value = _cov_factor(np.asarray(cov, dtype=float))
+
+        problem = compiled_problem['problem']
+        try:
+            problem.solve(warm_start=True)
+        except (TypeError, cp.DCPError) as e:
+            raise OptimizationError from e
+        if problem.status not in {"optimal", "optimal_inaccurate"}:
+            raise OptimizationError("Solver status: {}".format(problem.status))
+
+        if method=='max_sharpe':
+            w = (compiled_problem['w'].value / compiled_problem['k'].value).round(16) + 0.0
+        else:
+            w = compiled_problem['w'].value.round(16) + 0.0
+        w[np.abs(w) < 1e-4] = 0
+        return OrderedDict(zip(tickers, np.round(w, 5)))
+
+
+    def ppo_compiled_problem(method:str, weight_bounds, n_dim:int)->dict:
+        """ The EfficientFrontier problem for method, with cvxpy Parameters for the data, compiled once per thread
+
+            The covariance enters via a factor F with cov = F^T F, so the variance is sum_squares(F w) and the problem
+            is DPP: later solves only update parameter values, skipping canonicalization, and warm start.
+
+        :returns dict with problem, w, factor, mu (None for min_volatility), k (max_sharpe only)
+        """
+        problems = PPO_COMPILED.__dict__.setdefault('problems', dict())
+        key = (method, tuple(weight_bounds), n_dim)
+        if key not in problems:
+            problems[key] = _ppo_parameterized_problem(method=method, weight_bounds=weight_bounds, n_dim=n_dim)
+        return problems[key]
+
+
+    def _ppo_parameterized_problem(method:str, weight_bounds, n_dim:int)->dict:
+        # Mirrors EfficientFrontier.min_volatility, max_quadratic_utility (risk_aversion=1) and max_sharpe
+        lower, upper = weight_bounds
+        w = cp.Variable(n_dim)
+        factor = cp.Parameter((n_dim, n_dim))
+        variance = cp.sum_squares(factor @ w)
+        mu = None if method=='min_volatility' else cp.Parameter(n_dim)
+        k = None
+        if method=='min_volatility':
+            objective = variance
+            constraints = [w >= lower, w <= upper, cp.sum(w) == 1]
+        elif method=='max_quadratic_utility':
+            objective = 0.5 * variance - mu @ w
+            constraints = [w >= lower, w <= upper, cp.sum(w) == 1]
+        elif method=='max_sharpe':
+            # Variable transformation, with mu holding returns in excess of the risk free rate
+            k = cp.Variable()
+            objective = variance
+            constraints = [mu @ w == 1, cp.sum(w) == k, k >= 0, w >= lower * k, w <= upper * k]
+        else:
+            raise ValueError('method should be one of ' + str(PPO_METHODS))
+        problem = cp.Problem(cp.Minimize(objective), constraints)
+        return {'problem':problem, 'w':w, 'k':k, 'factor':factor, 'mu':mu}
+
+
+    def _cov_factor(cov):
+        """ F with F^T F = cov """
+        try:
+            return np.linalg.cholesky(cov).T
+        except np.linalg.LinAlgError:
+            eigvals, eigvecs = np.linalg.eigh(cov)
+            return (eigvecs * np.sqrt(np.maximum(eigvals, 0))).T
+
+
+    def _is_scalar_bounds(weight_bounds)->bool:
+        return isinstance(weight_bounds, (tuple, list)) and len(weight_bounds) == 2 and \
+               all(isinstance(b, (int, float)) for b in weight_bounds)
+
+
     def ppo_vol_long_from_cov(cov, as_dense=True):
         """ Backward compat """
         return ppo_vol_port(cov=cov, as_dense=as_dense)
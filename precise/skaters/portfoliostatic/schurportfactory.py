@@ -1,8 +1,8 @@
 from precise.skaters.portfoliostatic.diagportfactory import diagonal_portfolio_factory
 from precise.skaters.portfoliostatic.diagalloc import diag_alloc
-from pprint import pprint
 from precise.skaters.portfoliostatic.schurportutil import schur_augmentation, symmetric_step_up_matrix, even_split
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, Future
 from precise.skaters.portfoliostatic.equalport import equal_long_port
 from precise.skaters.covarianceutil.covrandom import jiggle_cov
 from precise.skaters.covarianceutil.covfunctions import cov_distance, try_invert
@@ -11,7 +11,8 @@ from precise.skaters.covarianceutil.covfunctions import cov_distance, try_invert
 def schur_portfolio_factory(cov=None, pre=None, port=None, port_kwargs=None,
                             alloc=None, alloc_kwargs=None,
                             n_split=5, gamma=1.0, delta=0.0,
-                            seriation_depth=10, jiggle=True):
+                            seriation_depth=10, jiggle=True, reseriate=True, diagnostics:dict=None,
+                            executor=None, n_workers:int=None, parallel_depth:int=2):
     """
          A divide and conquer allocation strategy using seriation, and augmented sub-covariancecomparisonutil matrices
 
@@ -23,7 +24,17 @@ def schur_portfolio_factory(cov=None, pre=None, port=None, port_kwargs=None,
     :param n_split:             Minimum size to split
     :param gamma:
     :param delta:
-    :param seriation_depth:
+    :param seriation_depth:     Number of levels at which sub-matrices are re-ordered by seriation
+    :param reseriate:           If False, seriation is performed once on cov (as for hierarchical risk parity) and
+                                the recursion walks index ranges of that ordering. Otherwise each augmented
+                                sub-matrix is re-seriated, down to seriation_depth, which is the original method.
+    :param diagnostics:         Optional dict, filled with the tree of research diagnostics. See schur_diagnostics
+    :param executor:            Evaluate sub-portfolios concurrently, using 'thread' (suits numpy leaves, which release
+                                the GIL in BLAS), 'process' (suits cvxpy leaves), or an existing Executor, which is
+                                cheaper when called every rebalance. Leaves and allocators must then be picklable.
+    :param n_workers:           Pool size when executor is 'thread' or 'process'
+    :param parallel_depth:      Levels split before handing subtrees to the executor, so up to 2^parallel_depth tasks.
+                                Results do not depend on the executor, except for stochastic leaves in a thread pool.
     :return:
     """
 
@@ -36,18 +47,23 @@ def schur_portfolio_factory(cov=None, pre=None, port=None, port_kwargs=None,
     seriator = seriation
     seriator_kwargs = {}
 
+    if not reseriate:
+        seriation_depth = min(seriation_depth, 1)
+
     if jiggle:
         jiggled_cov = jiggle_cov(cov=cov)
     else:
         jiggled_cov = np.copy(cov)
 
-    return hierarchical_schur_complementary_portfolio_with_defaults(seriator=seriator, seriator_kwargs=seriator_kwargs,
-                                                                    seriation_depth=seriation_depth,
-                                                                    port=port, port_kwargs=port_kwargs,
-                                                                    alloc=alloc, alloc_kwargs=alloc_kwargs,
-                                                                    splitter=splitter, splitter_kwargs=splitter_kwargs,
-                                                                    cov=jiggled_cov,
-                                                                    gamma=gamma, delta=delta)
+    schur_kwargs = dict(seriator=seriator, seriator_kwargs=seriator_kwargs, seriation_depth=seriation_depth,
+                        port=port, port_kwargs=port_kwargs, alloc=alloc, alloc_kwargs=alloc_kwargs,
+                        splitter=splitter, splitter_kwargs=splitter_kwargs, cov=jiggled_cov,
+                        gamma=gamma, delta=delta, diagnostics=diagnostics, parallel_depth=parallel_depth)
+    if executor in ['thread', 'process']:
+        pool_cls = ThreadPoolExecutor if executor == 'thread' else ProcessPoolExecutor
+        with pool_cls(max_workers=n_workers) as pool:
+            return hierarchical_schur_complementary_portfolio_with_defaults(executor=pool, **schur_kwargs)
+    return hierarchical_schur_complementary_portfolio_with_defaults(executor=executor, **schur_kwargs)
 
 
 def hierarchical_schur_complementary_portfolio_with_defaults(cov=None, port=None, port_kwargs=None,
@@ -55,7 +71,8 @@ def hierarchical_schur_complementary_portfolio_with_defaults(cov=None, port=None
                                                              splitter=None, splitter_kwargs=None,
                                                              seriator=None, seriator_kwargs=None,
                                                              seriation_depth=10,
-                                                             delta=0.0, gamma=1.0):
+                                                             delta=0.0, gamma=1.0, diagnostics:dict=None,
+                                                             executor=None, parallel_depth:int=0):
 
     if alloc is None:
         alloc = diag_alloc
@@ -74,7 +91,8 @@ def hierarchical_schur_complementary_portfolio_with_defaults(cov=None, port=None
                                                       splitter=splitter, splitter_kwargs=splitter_kwargs,
                                                       seriator = seriator, seriator_kwargs=seriator_kwargs,
                                                       seriation_depth=seriation_depth,
-                                                      delta=delta, gamma=gamma)
+                                                      delta=delta, gamma=gamma, diagnostics=diagnostics,
+                                                      executor=executor, parallel_depth=parallel_depth)
 
 
 def hierarchical_schur_complementary_portfolio(cov, port, port_kwargs,
@@ -82,77 +100,165 @@ def hierarchical_schur_complementary_portfolio(cov, port, port_kwargs,
                                                splitter, splitter_kwargs,
                                                seriator, seriator_kwargs,
                                                seriation_depth,
-                                               delta, gamma):
+                                               delta, gamma, diagnostics:dict=None, out=None,
+                                               executor=None, parallel_depth:int=0):
     """
         An experimental way to split allocation
+
+        The ordering is established by seriation of cov, for the top seriation_depth levels. Below that the recursion
+        works on index ranges of the already ordered matrix, passing views rather than permuted copies, and
+        sub-portfolios are written into slices of a single weight vector.
+
+        :param diagnostics:  If a dict is supplied it is filled with research diagnostics for this node, and
+                             diagnostics['children'] for the two sub-portfolios. Otherwise none are computed.
+        :param out:          Optional array of length n to write weights into
+        :param executor:     Optional Executor. The top parallel_depth levels are split here, and the subtrees
+                             below are evaluated as independent tasks
+        :returns w
+    """
+    schur_kwargs = dict(port=port, port_kwargs=port_kwargs, alloc=alloc, alloc_kwargs=alloc_kwargs,
+                        splitter=splitter, splitter_kwargs=splitter_kwargs, seriator=seriator, seriator_kwargs=seriator_kwargs,
+                        delta=delta, gamma=gamma)
+    n = np.shape(cov)[0]
+    w = np.empty(n) if out is None else out
+    if executor is not None and parallel_depth > 0:
+        pending = _schur_descend(cov=cov, executor=executor, parallel_depth=parallel_depth, seriation_depth=seriation_depth,
+                                 diagnostics=diagnostics, schur_kwargs=schur_kwargs)
+        return _schur_assemble(pending, w=w)
+
+    split = _schur_split(cov=cov, w=w, seriation_depth=seriation_depth, diagnostics=diagnostics, **schur_kwargs)
+    if split is None:
+        return w
+    ndx, n1, aA, aD, Ag, Dg, children = split
+    ordered_w = w if ndx is None else np.empty(n)
+
+    # Sub-allocate
+    for sub_cov, sub_w, sub_diagnostics in [(Ag, ordered_w[:n1], children[0]), (Dg, ordered_w[n1:], children[1])]:
+        hierarchical_schur_complementary_portfolio(cov=sub_cov, out=sub_w, diagnostics=sub_diagnostics,
+                                                   seriation_depth=seriation_depth - 1, **schur_kwargs)
+    return _schur_combine(w=w, ordered_w=ordered_w, ndx=ndx, n1=n1, aA=aA, aD=aD)
+
+
+def _schur_split(cov, w, port, port_kwargs, alloc, alloc_kwargs, splitter, splitter_kwargs, seriator, seriator_kwargs,
+                 seriation_depth, delta, gamma, diagnostics:dict=None):
+    """ One level of the recursion
+    :returns None, having written w, if this is a leaf. Otherwise (ndx, n1, aA, aD, Ag, Dg, children diagnostics)
     """
     n = np.shape(cov)[0]
     n1, n2 = splitter(cov, **splitter_kwargs)
     assert n1+n2==n
+    if diagnostics is not None:
+        diagnostics.update({'n':n, 'n1':n1, 'n2':n2})
     if n1<=1 or n2<=1:
         # If the portfolio is not too big, apply to leaves directly
-        w = port(cov, **port_kwargs)
-        if isinstance(w,list):
-            print('Warning: '+port.__name__+' returns list not array ')
-            w = np.array(w)
-        return w
+        w_leaf = port(cov, **port_kwargs)
+        if diagnostics is not None:
+            diagnostics.update({'leaf':port.__name__ if hasattr(port, '__name__') else str(port),
+                                'returns_list':isinstance(w_leaf, list)})
+        w[:] = w_leaf
+        return None
+    elif any(np.diag(cov) < 1e-8):
+        # Bail out altogether
+        if diagnostics is not None:
+            diagnostics.update({'equal':True})
+        w[:] = equal_long_port(cov=cov)
+        return None
+
+    # 1. Establish ordering
+    if seriation_depth<=0:
+        ndx = None
+        ordered_cov = cov
     else:
-        # 1. Establish ordering, or bail out altogether
-        if any(np.diag(cov) < 1e-8):
-            return equal_long_port(cov=cov)
-        elif seriation_depth<=0:
-            ndx = list(range(n1+n2))
-        else:
-            cov_dist = cov_distance(cov)
-            ndx = seriator(cov_dist, **seriator_kwargs)
-        inv_ndx = np.argsort(ndx)
-        cov_cols = cov[:, ndx]
-        cov_back = cov_cols[:, inv_ndx]
-        assert np.allclose(cov, cov_back)
-        ordered_cov = cov_cols[ndx, :]
-
-        # 2. Split
-        A = ordered_cov[:n1, :n1]
-        D = ordered_cov[n1:, n1:]
-        B = ordered_cov[:n1, n1:]
-        C = ordered_cov[n1:, :n1]  #  = B.T
-
-        # 3. Augment and allocate
-        Ag, Dg, info = schur_augmentation(A=A, B=B, C=C, D=D, gamma=gamma)
-        aA, aD = alloc(covs=[Ag, Dg])
-        if True:
-            # 3a. Just for interest, compare allocations. This is research code :)
-            aA_original, aD_original = alloc(covs=[A, D])
-            allocationRatioA = (aA / aA_original)
-            info.update({'allocationRatioA':allocationRatioA})
-            if False:
-                pprint({'allocationRatioA':allocationRatioA})
-
-        # Sub-allocate
-        wA = hierarchical_schur_complementary_portfolio(cov=Ag, port=port, port_kwargs=port_kwargs,
-                                                       alloc=alloc, alloc_kwargs=alloc_kwargs,
-                                                       splitter=splitter, splitter_kwargs=splitter_kwargs,
-                                                       seriator=seriator, seriator_kwargs=seriator_kwargs,
-                                                       seriation_depth = seriation_depth-1,
-                                                       delta=delta, gamma=gamma)
-        wD = hierarchical_schur_complementary_portfolio(cov=Dg, port=port, port_kwargs=port_kwargs,
-                                                        alloc=alloc, alloc_kwargs=alloc_kwargs,
-                                                        splitter=splitter, splitter_kwargs=splitter_kwargs,
-                                                        seriator=seriator, seriator_kwargs=seriator_kwargs,
-                                                        seriation_depth=seriation_depth - 1,
-                                                        delta=delta, gamma=gamma)
-        # Reconstruct
-        ordered_w = np.concatenate([aA * np.array(wA), aD * np.array(wD)])
-
-        # Undo seriation ordering
-        try:
-            w = ordered_w[inv_ndx]
-        except TypeError:
-            print('Warning: ' + port.__name__ + ' returns list not array - should really fix this ')
-            w = np.array(ordered_w)[inv_ndx]
-        return np.array(w)
+        ndx = np.asarray(seriator(cov_distance(cov), **seriator_kwargs))
+        ordered_cov = cov[np.ix_(ndx, ndx)]
+
+    # 2. Split
+    A = ordered_cov[:n1, :n1]
+    D = ordered_cov[n1:, n1:]
+    B = ordered_cov[:n1, n1:]
+    C = ordered_cov[n1:, :n1]  #  = B.T
+
+    # 3. Augment and allocate
+    Ag, Dg, info = schur_augmentation(A=A, B=B, C=C, D=D, gamma=gamma, with_info=diagnostics is not None)
+    aA, aD = alloc(covs=[Ag, Dg])
+    if diagnostics is not None:
+        # 3a. Just for interest, compare allocations. This is research code :)
+        aA_original, aD_original = alloc(covs=[A, D])
+        info.update({'seriated':ndx is not None, 'aA':aA, 'aD':aD, 'allocationRatioA':aA / aA_original,
+                     'children':[dict(), dict()]})
+        diagnostics.update(info)
+    children = diagnostics['children'] if diagnostics is not None else [None, None]
+    return ndx, n1, aA, aD, Ag, Dg, children
 
 
+def _schur_combine(w, ordered_w, ndx, n1:int, aA, aD):
+    """ Scale sub-portfolios and undo seriation ordering """
+    ordered_w[:n1] *= aA
+    ordered_w[n1:] *= aD
+    if ndx is not None:
+        w[ndx] = ordered_w
+    return w
+
+
+def _schur_descend(cov, executor, parallel_depth:int, seriation_depth:int, diagnostics:dict, schur_kwargs:dict):
+    """ Split the top levels in this process, submitting the subtrees below
+    :returns  tree of (w, split) pairs with (future, diagnostics) at the bottom, for _schur_assemble
+    """
+    if parallel_depth <= 0:
+        # Processes don't share the random state, so stochastic leaves get seeds drawn in a fixed order
+        seed = np.random.randint(0, 2 ** 31 - 1) if isinstance(executor, ProcessPoolExecutor) else None
+        future = executor.submit(_schur_subtree, cov, seriation_depth, diagnostics is not None, seed, schur_kwargs)
+        return future, diagnostics
+    w = np.empty(np.shape(cov)[0])
+    split = _schur_split(cov=cov, w=w, seriation_depth=seriation_depth, diagnostics=diagnostics, **schur_kwargs)
+    if split is not None:
+        ndx, n1, aA, aD, Ag, Dg, children = split
+        subtrees = [_schur_descend(cov=sub_cov, executor=executor, parallel_depth=parallel_depth - 1,
+                                   seriation_depth=seriation_depth - 1, diagnostics=sub_diagnostics, schur_kwargs=schur_kwargs)
+                    for sub_cov, sub_diagnostics in [(Ag, children[0]), (Dg, children[1])]]
+        split = (ndx, n1, aA, aD, subtrees)
+    return w, split
+
+
+def _schur_assemble(pending, w):
+    """ Wait for the subtrees submitted by _schur_descend and write the portfolio into w """
+    if isinstance(pending[0], Future):
+        future, diagnostics = pending
+        w_sub, sub_diagnostics = future.result()
+        if diagnostics is not None:
+            diagnostics.update(sub_diagnostics)
+        w[:] = w_sub
+        return w
+    w_node, split = pending
+    if split is None:
+        w[:] = w_node
+        return w
+    ndx, n1, aA, aD, (pending_A, pending_D) = split
+    ordered_w = w if ndx is None else np.empty(len(w))
+    _schur_assemble(pending_A, w=ordered_w[:n1])
+    _schur_assemble(pending_D, w=ordered_w[n1:])
+    return _schur_combine(w=w, ordered_w=ordered_w, ndx=ndx, n1=n1, aA=aA, aD=aD)
+
+
+def _schur_subtree(cov, seriation_depth:int, with_diagnostics:bool, seed, schur_kwargs:dict):
+    if seed is not None:
+        np.random.seed(seed)
+    diagnostics = dict() if with_diagnostics else None
+    w = hierarchical_schur_complementary_portfolio(cov=cov, seriation_depth=seriation_depth, diagnostics=diagnostics,
+                                                   **schur_kwargs)
+    return w, diagnostics
+
+
+def schur_diagnostics(cov=None, pre=None, **schur_kwargs)->(np.ndarray, dict):
+    """ Weights from schur_portfolio_factory along with the tree of diagnostics, e.g.
+             allocationRatioA    Allocation to A relative to what it would be without augmentation
+             reductionA          Norm of the augmented A relative to A (and likewise D)
+             children            Diagnostics for the A and D sub-portfolios
+    """
+    diagnostics = dict()
+    w = schur_portfolio_factory(cov=cov, pre=pre, diagnostics=diagnostics, **schur_kwargs)
+    return w, diagnostics
+
 
 if __name__=='__main__':
     M = symmetric_step_up_matrix(n1=7, n2=6)
@@ -4,9 +4,12 @@ from precise.skaters.covarianceutil.covfunctions import schur_complement, \
 from scipy.optimize import root_scalar
 
 
-def schur_augmentation(A,B,C,D, gamma):
+def schur_augmentation(A,B,C,D, gamma, with_info=True):
     """
        Mess with A, D to try to incorporate some off-diag info
+
+       :param with_info:  If False, info is empty and no reductions are computed
+       :returns Ag, Dg, info
     """
     if gamma>0.0:
         max_gamma = _maximal_gamma(A=A, B=B, C=C, D=D)
@@ -30,26 +33,29 @@ def schur_augmentation(A,B,C,D, gamma):
             Dg = augD
 
         if augmentation_fail:
-            print('Warning: augmentation failed')
             reductionA = 1.0
             reductionD = 1.0
             reductionRatioA = 1.0
             Ag = A
             Dg = D
-        else:
+        elif with_info:
             reductionD = np.linalg.norm(Dg)/np.linalg.norm(D)
             reductionA = np.linalg.norm(Ag)/np.linalg.norm(A)
             reductionRatioA = reductionA/reductionD
     else:
+        augmentation_fail = False
         reductionRatioA = 1.0
         reductionA = 1.0
         reductionD = 1.0
         Ag = A
         Dg = D
 
+    if not with_info:
+        return Ag, Dg, {}
     info = {'reductionA': reductionA,
                 'reductionD': reductionD,
-                'reductionRatioA': reductionRatioA}
+                'reductionRatioA': reductionRatioA,
+                'augmentationFail': augmentation_fail}
     return Ag, Dg, info
 
 
@@ -41,6 +41,21 @@ def unitary_from_cov(cov,phi=1.0):
     return unitary_from_pre(pre=pre)
 
 
+def unitary_from_covs(covs)->np.ndarray:
+    """ Signed min var portfolios for a (l, n, n) stack of cov matrices, with one batched solve
+    :returns (l, n) weights, falling back to equal weights as per unitary_from_pre
+    """
+    covs = np.asarray(covs)
+    n_dim = np.shape(covs)[-1]
+    u = np.linalg.solve(covs, np.ones(np.shape(covs)[:-1] + (1,)))[..., 0]
+    sum_u = np.sum(u, axis=1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ws = u / sum_u
+    failed = ~np.all(np.isfinite(ws), axis=1)
+    ws[failed] = 1 / n_dim
+    return ws
+
+
 def unitary_portfolio_variance(cov=None, pre=None):
     """
         Variance of the unit min-var portfolio
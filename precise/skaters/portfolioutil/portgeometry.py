@@ -10,24 +10,31 @@ def shortlist_by_l1_norm(origin, xs, tol=0.2, n_max=None):
     :param n_max:
     :return:
     """
+    X = _as_rows(xs)
     try:
-        dxs = sorted( [ ( sum(np.abs(np.array(origin) - np.array(xsi))),xsi) for xsi in xs], key=lambda t: t[0])
+        order = np.argsort(np.sum(np.abs(X - np.asarray(origin)), axis=1), kind='stable')
     except ValueError:
         raise NotImplementedError('huh?')
-    w_shortlist = [ dxs[0][1] ]
-    for _,wj in dxs[1:]:
-        separation = min([sum(np.abs(np.array(wj) - np.array(wk))) for wk in w_shortlist])
+    shortlist = [order[0]]
+    for j in order[1:]:
+        separation = np.min(np.sum(np.abs(X[shortlist] - X[j]), axis=1))
         if separation>tol:
-            w_shortlist.append(wj)
-        if (n_max is not None) and len(w_shortlist)>=n_max:
+            shortlist.append(j)
+        if (n_max is not None) and len(shortlist)>=n_max:
             break
-    return w_shortlist
+    return [xs[j] for j in shortlist]
 
 
 def np_linalg_norms(xs, ord=1, origin=None):
+    """ Distance from origin to each of xs, a list of points or (n_points, n_dim) array """
+    X = _as_rows(xs)
     if origin is None:
-        origin = np.zeros_like(xs[0])
-    return [np.linalg.norm(np.array(origin) - np.array(wsi), ord=ord) for wsi in xs]
+        return np.linalg.norm(X, ord=ord, axis=1)
+    return np.linalg.norm(np.asarray(origin) - X, ord=ord, axis=1)
+
+
+def _as_rows(xs)->np.ndarray:
+    return np.atleast_2d(np.asarray(xs, dtype=float))
 
 
 def closest_point_l1(xs, ord=1, origin=None) -> int:
@@ -46,7 +53,7 @@ def closest_weak_l1(xs, origin, n_max=50, verbose=False):
     :return:
     """
     ws_short = shortlist_by_l1_norm(origin=origin, xs=xs, n_max=n_max)
-    xs = [np.array(wj) - np.array(origin) for wj in ws_short]
+    xs = _as_rows(ws_short) - np.asarray(origin)
     x = verbosely_choose_close_point_on_boundary_of_convex_hull(xs=xs, verbose=verbose)
     return np.array(origin) + np.array(x)
 
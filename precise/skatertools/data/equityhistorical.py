@@ -1,30 +1,55 @@
 import pandas as pd
 import numpy as np
 import random
+from precise.skatertools.data.localstore import synced_store, dense_columns, sources_name
 
+EQUITY_CSV = 'https://raw.githubusercontent.com/microprediction/precisedata/main/stocks/log_price_diff_K_part_N.csv'
 
-def random_cached_equity_dense(k, n_obs, n_dim=10, as_frame=False, **ignore):
+
+def random_cached_equity_dense(k, n_obs, n_dim=10, as_frame=False, store_dir:str=None, sources:[str]=None,
+                               refresh:bool=False, **ignore):
     """
          Log price differences without missing values
          :param k - days
+         :param store_dir:  Local store location, see localstore.py
+         :param sources:    CSVs to import if the store is empty, defaulting to precisedata
+         :param refresh:    Check the CSVs for changes, even if already checked in this process
 
     """
-    pd.options.mode.chained_assignment = None
-    df = _sparse_cached_equity(k=k)
-    n_samples = len(df.index)
+    xs, meta = cached_equity_store(k=k, store_dir=store_dir, sources=sources, refresh=refresh)
+    n_samples = len(xs)
     assert n_samples>n_obs
     n_start = random.choice(range(n_samples-n_obs))
     n_end = n_start + n_obs
-    df_sub = df[n_start:n_end]
-    df_sub.dropna(how='any', inplace=True, axis=1)
-    df_sub.drop(df.columns[0], inplace=True, axis=1)
-    size = min(len(df_sub.columns),n_dim)
-    selected = np.random.choice(df_sub.columns, size=size, replace=False)
-    df_some = df_sub[selected]
-    return df_some if as_frame else df_some.values
+    candidates = dense_columns(meta=meta, start=n_start, end=n_end, xs=xs)
+    size = min(len(candidates),n_dim)
+    selected = np.random.choice(candidates, size=size, replace=False)
+    values = np.array(xs[n_start:n_end, selected])
+    if as_frame:
+        return pd.DataFrame(values, columns=[meta['columns'][j] for j in selected], index=range(n_start, n_end))
+    return values
+
+
+def cached_equity_store(k=1, store_dir:str=None, sources:[str]=None, refresh:bool=False)->(np.ndarray, dict):
+    """ Memory-mapped log price differences, imported from CSV the first time. The CSVs are checked for changes
+        once per process, or again if refresh=True (see synced_store)
+    :returns xs, meta     as per load_store
+    """
+    sources = sources or _equity_urls(k=k)
+    name = sources_name('stocks_log_price_diff_' + str(k), sources=sources)
+
+    def make_frame():
+        df = _sparse_cached_equity(k=k, sources=sources)
+        return df.drop(columns=df.columns[0])
+
+    return synced_store(name=name, sources=sources, make_frame=make_frame, store_dir=store_dir, refresh=refresh)
+
+
+def _equity_urls(k=1)->[str]:
+    return [EQUITY_CSV.replace('K',str(k)).replace('N',str(part)) for part in list(range(1,4))]
 
 
-def _sparse_cached_equity(k=1):
+def _sparse_cached_equity(k=1, sources:[str]=None):
     """ Retrieve daily or less frequent price changes
     :param k:  difference measured in business days
     :returns   pd.DataFrame with NaNs
@@ -39,8 +64,7 @@ def _sparse_cached_equity(k=1):
     else:
         ssl._create_default_https_context = _create_unverified_https_context
 
-    CSV ='https://raw.githubusercontent.com/microprediction/precisedata/main/stocks/log_price_diff_K_part_N.csv'
-    dfs = [ pd.read_csv(CSV.replace('K',str(k)).replace('N',str(part)) ) for part in list(range(1,4)) ]
+    dfs = [ pd.read_csv(source) for source in (sources or _equity_urls(k=k)) ]
     df_merged = pd.concat(dfs,axis=1)
     return df_merged
 
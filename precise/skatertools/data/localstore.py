@@ -0,0 +1,141 @@
+import numpy as np
+import pandas as pd
+import json
+import os
+import hashlib
+from precise.whereami import DATA_STORE_DIR
+
+# A local store for the CSVs in the precisedata repo, so battles don't re-download and re-parse them
+#
+#     xs, meta = synced_store(name, sources, make_frame)   # (n_obs, n_cols) memory-mapped float array, and column metadata
+#
+# which, the first time it is called for a store in a process (or with refresh=True), does
+#
+#     version = source_version(sources)            # Changes when any of the CSVs (urls or paths) change
+#     if not has_store(name, version=version):
+#         store_frame(name, make_frame(), version=version)
+#
+# and after that only has_store and load_store, so repeated draws don't touch the network.
+#
+# Each store is a .npy file of values and a .json file listing the columns and their validity ranges:
+#     meta['first_valid'][j], meta['last_valid'][j]   first and last row where column j is not NaN
+#     meta['n_valid'][j]                              number of non-NaN rows
+# A column is gap-free if n_valid == last_valid - first_valid + 1. Only numeric columns are stored.
+#
+# The version of a local file is its modification time and size. For a url it is the ETag or Last-Modified header,
+# and if that can't be fetched (e.g. offline) the version is None and whatever is in the store is used.
+
+
+CHECKED_STORES = dict()   # store path -> source version, for stores checked against their sources in this process
+
+
+def store_path(name:str, store_dir:str=None)->str:
+    return os.path.join(store_dir or DATA_STORE_DIR, name)
+
+
+def sources_name(prefix:str, sources:[str])->str:
+    """ Store name for a list of sources, so that different sources never share a store """
+    return prefix + '_' + hashlib.sha256('\n'.join(sources).encode()).hexdigest()[:12]
+
+
+def source_version(sources:[str], timeout:float=10)->str:
+    """ Hash of the versions of urls or paths, or None if any url can't be checked """
+    parts = list()
+    for source in sources:
+        if os.path.exists(source):
+            stat = os.stat(source)
+            parts.append(source + '|' + str(stat.st_mtime_ns) + '|' + str(stat.st_size))
+        else:
+            version = _url_version(source, timeout=timeout)
+            if version is None:
+                return None
+            parts.append(source + '|' + version)
+    return hashlib.sha256('\n'.join(parts).encode()).hexdigest()
+
+
+def _url_version(url:str, timeout:float=10)->str:
+    from urllib.request import Request, urlopen
+    try:
+        with urlopen(Request(url, method='HEAD'), timeout=timeout) as response:
+            return response.headers.get('ETag') or response.headers.get('Last-Modified')
+    except Exception:
+        return None
+
+
+def has_store(name:str, store_dir:str=None, version:str=None)->bool:
+    """ True if the store exists and, when version is supplied, was written from that version of the sources """
+    path = store_path(name=name, store_dir=store_dir)
+    if not (os.path.exists(path + '.npy') and os.path.exists(path + '.json')):
+        return False
+    if version is not None:
+        with open(path + '.json', 'rt') as fh:
+            return json.load(fh).get('version') == version
+    return True
+
+
+def synced_store(name:str, sources:[str], make_frame, store_dir:str=None, refresh:bool=False)->(np.ndarray, dict):
+    """ Load a store, first writing make_frame() to it if it is missing or its sources have changed
+    :param make_frame:  Callable returning the pd.DataFrame to store
+    :param refresh:     Check the sources again, even if they were checked earlier in this process
+    """
+    path = store_path(name=name, store_dir=store_dir)
+    if refresh or (path not in CHECKED_STORES) or not has_store(name=name, store_dir=store_dir):
+        version = source_version(sources)
+        if not has_store(name=name, store_dir=store_dir, version=version):
+            store_frame(name=name, df=make_frame(), store_dir=store_dir, version=version)
+        CHECKED_STORES[path] = version
+    return load_store(name=name, store_dir=store_dir)
+
+
+def store_frame(name:str, df:pd.DataFrame, store_dir:str=None, version:str=None)->dict:
+    """ Write numeric columns of df to the store. Files are written then renamed, so readers never see partial files
+    :param version:  Version of the sources, as per source_version
+    """
+    df = df.select_dtypes(include='number')
+    xs = np.ascontiguousarray(df.values, dtype=float)
+    valid = np.isfinite(xs)
+    has_any = valid.any(axis=0)
+    n_obs = len(xs)
+    meta = {'columns':[str(c) for c in df.columns],
+            'n_obs':n_obs,
+            'first_valid':np.where(has_any, np.argmax(valid, axis=0), n_obs).tolist(),
+            'last_valid':np.where(has_any, n_obs - 1 - np.argmax(valid[::-1], axis=0), -1).tolist(),
+            'n_valid':np.sum(valid, axis=0).tolist(),
+            'version':version}
+
+    path = store_path(name=name, store_dir=store_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.' + str(os.getpid()) + '.tmp'
+    with open(tmp + '.npy', 'wb') as fh:
+        np.save(fh, xs)
+    with open(tmp + '.json', 'wt') as fh:
+        json.dump(meta, fh)
+    os.replace(tmp + '.npy', path + '.npy')
+    os.replace(tmp + '.json', path + '.json')
+    return meta
+
+
+def load_store(name:str, store_dir:str=None, mmap:bool=True)->(np.ndarray, dict):
+    """ Values (memory-mapped read-only by default) and metadata """
+    path = store_path(name=name, store_dir=store_dir)
+    with open(path + '.json', 'rt') as fh:
+        meta = json.load(fh)
+    xs = np.load(path + '.npy', mmap_mode='r' if mmap else None)
+    return xs, meta
+
+
+def dense_columns(meta:dict, start:int, end:int, xs=None)->np.ndarray:
+    """ Indexes of columns with no NaNs in rows start:end
+    :param xs:  If supplied, columns whose validity range covers the window but which have gaps are checked against the data
+    """
+    first_valid = np.asarray(meta['first_valid'])
+    last_valid = np.asarray(meta['last_valid'])
+    n_valid = np.asarray(meta['n_valid'])
+    covers = (first_valid <= start) & (last_valid >= end - 1)
+    gap_free = n_valid == last_valid - first_valid + 1
+    dense = covers & gap_free
+    if xs is not None:
+        gappy = np.flatnonzero(covers & ~gap_free)
+        if len(gappy):
+            dense[gappy] = np.isfinite(xs[start:end, gappy]).all(axis=0)
+    return np.flatnonzero(dense)
@@ -1,6 +1,9 @@
 import time
 import random
+import os
+import numpy as np
 import pandas as pd
+from precise.skatertools.data.localstore import synced_store
 
 # Replica of https://raw.githubusercontent.com/microprediction/timemachines/main/timemachines/skatertools/data/skaterresiduals.py to avoid timemachine dependency
 
@@ -8,19 +11,33 @@ SKATER_RESIDUAL_URL = 'https://raw.githubusercontent.com/microprediction/precise
 n_data = 450
 
 
-def random_skater_residual_dataframe(n_obs:int):
+def random_skater_residual_dataframe(n_obs:int, store_dir:str=None):
     got = False
     while not got:
         the_choice = random.choice(list(range(n_data)))
         the_url = SKATER_RESIDUAL_URL.replace('N', str(the_choice))
         try:
-            df = pd.read_csv(the_url)
-            del df['Unnamed: 0']
+            df = cached_skater_residual_dataframe(the_url, store_dir=store_dir)
             got = len(df.index) > n_obs + 10
         except:
             got = False
     return df
 
+
+def cached_skater_residual_dataframe(source:str, store_dir:str=None, refresh:bool=False)->pd.DataFrame:
+    """ Residuals from source (url or path), imported into the local store the first time. The source is checked
+        for changes once per process, or again if refresh=True
+    """
+    name = 'skater_residuals_' + os.path.splitext(os.path.basename(source))[0]
+
+    def make_frame():
+        df = pd.read_csv(source)
+        del df['Unnamed: 0']
+        return df
+
+    xs, meta = synced_store(name=name, sources=[source], make_frame=make_frame, store_dir=store_dir, refresh=refresh)
+    return pd.DataFrame(np.array(xs), columns=meta['columns'])
+
 def random_long_residual(n_obs):
     """ Returns random long time series of skater residuals """
     assert n_obs<35000
@@ -0,0 +1,192 @@
+import time
+import sys
+import math
+import tracemalloc
+import threading
+from functools import wraps
+import numpy as np
+
+# Opt-in profiling of skaters and managers
+#
+#     with profiling() as profile:
+#         manager_stats(mgr=mgr, xs=xs, n_burn=50)
+#     print(profile_table())
+#
+# Code marks sections with
+#
+#     with profile_section('port'):              # or decorate with @profiled('port')
+#         w = port(cov)
+#
+# When profiling is off, entering a section is one attribute lookup and a comparison.
+# Sections used in this package:
+#     burn_in        manager calls with e<0 in manager_stats
+#     manager        manager calls during assessment in manager_stats
+#     cov_update     the cov skater call in static_cov_manager_factory_d0
+#     port           static portfolio construction
+#     nudge          closest point geometry applied to repeated port calls
+# Sections may nest (e.g. cov_update within burn_in), so times are inclusive. Each thread keeps its own stack of
+# open sections, so sections entered from pools (e.g. schur_portfolio_factory with executor='thread') are timed correctly.
+#
+# Each section records a latency histogram with log spaced bins, and optionally (allocations=True)
+# the net number of Python memory blocks and bytes allocated, the latter via tracemalloc.
+
+HISTOGRAM_EDGES = np.power(10., np.arange(-7, 4.01, 0.25))   # Seconds, 100ns to 10000s
+
+
+class _Profiler:
+    enabled = False
+    allocations = False
+    records = dict()
+    lock = threading.Lock()
+
+
+PROFILER = _Profiler()
+
+
+def _new_record()->dict:
+    return {'n':0, 'total':0., 'min':math.inf, 'max':0.,
+            'counts':np.zeros(len(HISTOGRAM_EDGES) + 1, dtype=int),
+            'blocks':0, 'bytes':0}
+
+
+class _Section:
+
+    def __init__(self, name:str):
+        self.name = name
+        self.local = threading.local()
+
+    @property
+    def starts(self)->list:
+        """ Start times of this section's open entries, in the current thread """
+        try:
+            return self.local.starts
+        except AttributeError:
+            self.local.starts = list()
+            return self.local.starts
+
+    def __enter__(self):
+        if PROFILER.enabled:
+            if PROFILER.allocations:
+                self.starts.append((time.perf_counter(), sys.getallocatedblocks(), tracemalloc.get_traced_memory()[0]))
+            else:
+                self.starts.append((time.perf_counter(), 0, 0))
+        return self
+
+    def __exit__(self, *args):
+        starts = self.starts if PROFILER.enabled else None
+        if starts:
+            start_time, start_blocks, start_bytes = starts.pop()
+            elapsed = time.perf_counter() - start_time
+            if PROFILER.allocations:
+                n_blocks = sys.getallocatedblocks() - start_blocks
+                n_bytes = tracemalloc.get_traced_memory()[0] - start_bytes
+            with PROFILER.lock:
+                record = PROFILER.records.get(self.name)
+                if record is None:
+                    record = PROFILER.records[self.name] = _new_record()
+                record['n'] += 1
+                record['total'] += elapsed
+                record['min'] = min(record['min'], elapsed)
+                record['max'] = max(record['max'], elapsed)
+                record['counts'][np.searchsorted(HISTOGRAM_EDGES, elapsed)] += 1
+                if PROFILER.allocations:
+                    record['blocks'] += n_blocks
+                    record['bytes'] += n_bytes
+        return False
+
+
+SECTIONS = dict()
+
+
+def profile_section(name:str)->_Section:
+    """ Context manager timing a named section, when profiling is enabled """
+    section = SECTIONS.get(name)
+    if section is None:
+        section = SECTIONS[name] = _Section(name)
+    return section
+
+
+def profiled(name:str):
+    """ Decorator timing every call to a function as section name """
+    def decorator(func):
+        section = profile_section(name)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not PROFILER.enabled:
+                return func(*args, **kwargs)
+            with section:
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class profiling:
+    """ Context manager enabling profiling
+    :param allocations:  Also record allocations (slower, as tracemalloc is started)
+    :param reset:        Discard records from earlier sessions
+    """
+
+    def __init__(self, allocations:bool=False, reset:bool=True):
+        self.allocations = allocations
+        self.reset = reset
+        self.started_tracemalloc = False
+
+    def __enter__(self):
+        if self.reset:
+            reset_profile()
+        if self.allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracemalloc = True
+        PROFILER.allocations = self.allocations
+        PROFILER.enabled = True
+        return PROFILER
+
+    def __exit__(self, *args):
+        PROFILER.enabled = False
+        PROFILER.allocations = False
+        if self.started_tracemalloc:
+            tracemalloc.stop()
+        return False
+
+
+def reset_profile():
+    PROFILER.records.clear()
+    for section in SECTIONS.values():
+        section.local = threading.local()    # Forgets open entries in every thread
+
+
+def profile_records()->dict:
+    """ Copy of raw records, by section """
+    return dict([(name, dict(record, counts=record['counts'].copy())) for name, record in PROFILER.records.items()])
+
+
+def histogram_quantile(counts, q:float)->float:
+    """ Approximate quantile of latency, in seconds, from histogram counts (upper bin edge) """
+    n = np.sum(counts)
+    if n == 0:
+        return np.nan
+    ndx = int(np.searchsorted(np.cumsum(counts), q * n))
+    return float(HISTOGRAM_EDGES[min(ndx, len(HISTOGRAM_EDGES) - 1)])
+
+
+def profile_table(records:dict=None):
+    """ One row per section, times in milliseconds
+    :returns pd.DataFrame
+    """
+    import pandas as pd
+    records = records or PROFILER.records
+    rows = list()
+    for name, record in records.items():
+        rows.append({'section':name,
+                     'n':record['n'],
+                     'total_s':record['total'],
+                     'mean_ms':1000 * record['total'] / max(record['n'], 1),
+                     'p50_ms':1000 * histogram_quantile(record['counts'], 0.5),
+                     'p90_ms':1000 * histogram_quantile(record['counts'], 0.9),
+                     'p99_ms':1000 * histogram_quantile(record['counts'], 0.99),
+                     'max_ms':1000 * record['max'],
+                     'blocks':record['blocks'],
+                     'bytes':record['bytes']})
+    columns = ['section', 'n', 'total_s', 'mean_ms', 'p50_ms', 'p90_ms', 'p99_ms', 'max_ms', 'blocks', 'bytes']
+    return pd.DataFrame(rows, columns=columns).sort_values('total_s', ascending=False).reset_index(drop=True)
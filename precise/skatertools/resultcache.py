@@ -0,0 +1,250 @@
+import os
+import json
+import time
+import pickle
+import shutil
+import hashlib
+import inspect
+from functools import partial, wraps
+import numpy as np
+from precise.whereami import RESULT_CACHE_DIR
+
+# Content addressed cache of expensive results, such as a skater or manager run over a dataset
+#
+#     assessment, metrics = cached_call(cov_likelihood, contestant=f, xs=xs, n_burn=100, lb=-1000, ub=1000)
+#
+# The key is a hash of the function, the arguments and the bytes of any arrays, so the same skater run on the
+# same data is computed once. Functions are identified by module and qualified name, so results are only as
+# fresh as the code: call invalidate(func) (or invalidate(involving='skater_name')) after changing one.
+# Lambdas and nested functions don't have unique names, so they are also identified by a hash of their code,
+# defaults and closure (see function_fingerprint).
+#
+# Layout:  <cache_dir>/<module.qualname>/<key>.pkl    the result
+#                                        <key>.json   what it was called with, for invalidation and inspection
+#
+# Reading an entry bumps its modification time, and once the cache exceeds max_bytes the least recently used
+# entries are removed. Only returned values are stored, so a run that raises is tried again next time.
+# Stochastic functions will be frozen at their first result, which is usually what a comparison wants.
+
+CACHE_VERSION = 1
+CACHE_MAX_BYTES = int(os.environ.get('PRECISE_RESULT_CACHE_MAX_BYTES', 2 * 1024 ** 3))
+
+
+def fingerprint(obj)->str:
+    """ Deterministic description of an argument, hashing array contents """
+    if isinstance(obj, np.ndarray):
+        a = np.ascontiguousarray(obj)
+        return 'array(' + a.dtype.str + ',' + str(a.shape) + ',' + hashlib.sha256(a.tobytes()).hexdigest() + ')'
+    if isinstance(obj, partial):
+        return 'partial(' + fingerprint(obj.func) + ',' + fingerprint(list(obj.args)) + ',' + fingerprint(obj.keywords) + ')'
+    if callable(obj) and hasattr(obj, '__qualname__'):
+        return function_fingerprint(obj)
+    if isinstance(obj, dict):
+        return '{' + ','.join(repr(k) + ':' + fingerprint(v) for k, v in sorted(obj.items(), key=lambda kv: repr(kv[0]))) + '}'
+    if isinstance(obj, (list, tuple)):
+        if len(obj) and all(isinstance(x, (float, int)) for x in obj):
+            return type(obj).__name__ + fingerprint(np.asarray(obj, dtype=float))
+        return type(obj).__name__ + '[' + ','.join(fingerprint(x) for x in obj) + ']'
+    if isinstance(obj, (np.floating, np.integer, np.bool_)):
+        return repr(obj.item())
+    return repr(obj)
+
+
+def function_name(func)->str:
+    return getattr(func, '__module__', '') + '.' + func.__qualname__
+
+
+def function_fingerprint(func)->str:
+    """ Module and qualified name, plus a hash of code, defaults and closure if the name may not be unique """
+    name = function_name(func)
+    code = getattr(func, '__code__', None)
+    if '<' not in func.__qualname__ or code is None:
+        return name
+    parts = [_code_digest(code), fingerprint(func.__defaults__), fingerprint(func.__kwdefaults__)]
+    for cell in (func.__closure__ or ()):
+        try:
+            value = cell.cell_contents
+        except ValueError:
+            value = None     # Not yet assigned
+        # Functions in the closure are named rather than fingerprinted, so recursive closures terminate
+        parts.append(function_name(value) if callable(value) and hasattr(value, '__qualname__') else fingerprint(value))
+    return name + '#' + hashlib.sha256('|'.join(parts).encode()).hexdigest()[:16]
+
+
+def _code_digest(code)->str:
+    consts = [_code_digest(c) if hasattr(c, 'co_code') else repr(c) for c in code.co_consts]
+    return hashlib.sha256(code.co_code + repr((consts, code.co_names)).encode()).hexdigest()
+
+
+def result_key(func, **kwargs)->str:
+    """ Cache key for func(**kwargs), with defaults filled in so that omitting an argument makes no difference """
+    text = str(CACHE_VERSION) + '|' + function_fingerprint(func) + '|' + fingerprint(_with_defaults(func, kwargs))
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def cached_call(func, cache_dir:str=None, max_bytes:int=None, refresh:bool=False, with_hit:bool=False, **kwargs):
+    """ func(**kwargs), from the cache if it has been computed before
+    :param refresh:   Recompute and overwrite
+    :param with_hit:  Return (value, hit) where hit is True if the value came from the cache
+    """
+    cache_dir = cache_dir or RESULT_CACHE_DIR
+    path = _entry_path(cache_dir=cache_dir, func=func, key=result_key(func, **kwargs))
+    if not refresh:
+        found, value = _read_entry(path)
+        if found:
+            return (value, True) if with_hit else value
+    value = func(**kwargs)
+    _write_entry(path=path, value=value, meta={'func':function_name(func), 'kwargs':_describe(kwargs), 'created':time.time()})
+    evict(cache_dir=cache_dir, max_bytes=max_bytes)
+    return (value, False) if with_hit else value
+
+
+def memoized(func=None, cache_dir:str=None, max_bytes:int=None):
+    """ Decorator version of cached_call. Positional arguments are bound to names, so f(xs) and f(xs=xs) share an entry """
+    if func is None:
+        return partial(memoized, cache_dir=cache_dir, max_bytes=max_bytes)
+    signature = inspect.signature(func)
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        return cached_call(func, cache_dir=cache_dir, max_bytes=max_bytes, **bound.arguments)
+    return wrapper
+
+
+def invalidate(func=None, involving:str=None, cache_dir:str=None, **kwargs)->int:
+    """ Remove cached results
+    :param func:       Remove results of func, or only func(**kwargs) if kwargs are supplied
+    :param involving:  Remove results whose arguments mention this name, e.g. a skater that has changed
+    :returns number of entries removed
+    """
+    cache_dir = cache_dir or RESULT_CACHE_DIR
+    if func is not None and kwargs:
+        path = _entry_path(cache_dir=cache_dir, func=func, key=result_key(func, **kwargs))
+        return int(_remove_entry(path))
+    n_removed = 0
+    for path, _, _ in _entries(cache_dir=cache_dir):
+        if func is not None and os.path.basename(os.path.dirname(path)) != _dir_name(func):
+            continue
+        if involving is not None and involving not in _read_meta(path).get('kwargs', ''):
+            continue
+        n_removed += _remove_entry(path)
+    return n_removed
+
+
+def clear_cache(cache_dir:str=None):
+    cache_dir = cache_dir or RESULT_CACHE_DIR
+    if os.path.isdir(cache_dir):
+        shutil.rmtree(cache_dir)
+
+
+def cache_size(cache_dir:str=None)->(int, int):
+    """ Number of entries and total bytes """
+    entries = _entries(cache_dir=cache_dir or RESULT_CACHE_DIR)
+    return len(entries), sum(size for _, _, size in entries)
+
+
+def evict(cache_dir:str=None, max_bytes:int=None)->int:
+    """ Remove least recently used entries until the cache is within max_bytes
+    :returns number of entries removed
+    """
+    max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    entries = sorted(_entries(cache_dir=cache_dir or RESULT_CACHE_DIR), key=lambda e: e[1])
+    total = sum(size for _, _, size in entries)
+    n_removed = 0
+    for path, _, size in entries:
+        if total <= max_bytes:
+            break
+        n_removed += _remove_entry(path)
+        total -= size
+    return n_removed
+
+
+def _with_defaults(func, kwargs:dict)->dict:
+    try:
+        bound = inspect.signature(func).bind(**kwargs)
+    except (TypeError, ValueError):
+        return kwargs
+    bound.apply_defaults()
+    return dict(bound.arguments)
+
+
+def _dir_name(func)->str:
+    return function_name(func).replace('<', '').replace('>', '')
+
+
+def _entry_path(cache_dir:str, func, key:str)->str:
+    return os.path.join(cache_dir, _dir_name(func), key + '.pkl')
+
+
+def _entries(cache_dir:str)->[(str, float, int)]:
+    """ (path, last used, bytes) for every entry """
+    entries = list()
+    if not os.path.isdir(cache_dir):
+        return entries
+    for sub in os.scandir(cache_dir):
+        if sub.is_dir():
+            for entry in os.scandir(sub.path):
+                if entry.name.endswith('.pkl'):
+                    try:
+                        stat = entry.stat()
+                        meta_size = os.path.getsize(entry.path[:-4] + '.json')
+                    except FileNotFoundError:
+                        continue
+                    entries.append((entry.path, stat.st_mtime, stat.st_size + meta_size))
+    return entries
+
+
+def _read_entry(path:str)->(bool, object):
+    try:
+        with open(path, 'rb') as fh:
+            value = pickle.load(fh)
+    except FileNotFoundError:
+        return False, None
+    except (pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        _remove_entry(path)    # Truncated, or refers to code that has moved
+        return False, None
+    os.utime(path)
+    return True, value
+
+
+def _read_meta(path:str)->dict:
+    try:
+        with open(path[:-4] + '.json', 'rt') as fh:
+            return json.load(fh)
+    except (FileNotFoundError, json.decoder.JSONDecodeError):
+        return {}
+
+
+def _write_entry(path:str, value, meta:dict):
+    # Written to temporary files then renamed, so concurrent workers never read a partial entry
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.' + str(os.getpid()) + '.tmp'
+    with open(tmp + 'm', 'wt') as fh:
+        json.dump(meta, fh)
+    os.replace(tmp + 'm', path[:-4] + '.json')
+    with open(tmp, 'wb') as fh:
+        pickle.dump(value, fh, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+
+
+def _remove_entry(path:str)->bool:
+    removed = False
+    for fn in [path, path[:-4] + '.json']:
+        try:
+            os.remove(fn)
+            removed = True
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+def _describe(kwargs:dict)->str:
+    """ Readable version of the arguments, with arrays summarized by shape """
+    def brief(v):
+        if isinstance(v, np.ndarray):
+            return 'array' + str(v.shape)
+        if isinstance(v, partial) or (callable(v) and hasattr(v, '__qualname__')):
+            return fingerprint(v)
+        return repr(v)[:200]
+    return ', '.join(k + '=' + brief(v) for k, v in sorted(kwargs.items()))
@@ -0,0 +1,175 @@
+import numpy as np
+import pandas as pd
+from precise.skatervaluation.battleutil.battleio import win_data
+from precise.skatervaluation.battleutil.speed import TIMING
+
+# Bradley-Terry ratings fitted to battle results, on the Elo scale
+#
+#     df = bt_elo_df(genre='cov_likelihood', category='stocks')    # Same columns as elo_df, plus confidence bounds
+#
+# Unlike elo_from_win_counts, which plays games one at a time in random order, these are maximum likelihood
+# estimates and don't depend on the ordering. P(i beats j) = 1 / (1 + 10^((elo_j - elo_i)/400)).
+# Fitting uses Newton iterations on many win matrices at once, which is how bootstrap samples are fitted in one pass.
+
+BT_PRIOR = 0.5        # Virtual wins added to each side of every pair that has met, so ratings stay finite
+BT_MAX_ITER = 100
+BT_TOL = 1e-8
+BT_MAX_STEP = 2.0     # Newton steps are shortened to this, in log strength, as a safeguard early on
+BT_RIDGE = 1e-8
+
+
+def win_matrix(ctn)->(list, np.ndarray):
+    """ Contestants and matrix W with W[i,j] the number of wins of i over j
+    :param ctn:  Counter or dict of 'winner>loser' -> count, as per battleio.load_win_data
+    """
+    pairs = [(battle.split('>'), count) for battle, count in ctn.items()]
+    names = sorted(set([p[0][0] for p in pairs] + [p[0][1] for p in pairs]))
+    ndx = dict([(name, i) for i, name in enumerate(names)])
+    W = np.zeros((len(names), len(names)))
+    for (winner, loser), count in pairs:
+        if winner != loser:
+            W[ndx[winner], ndx[loser]] += count
+    return names, W
+
+
+def bradley_terry(W, prior:float=BT_PRIOR, max_iter:int=BT_MAX_ITER, tol:float=BT_TOL, init=None, hessian=None)->np.ndarray:
+    """ Maximum likelihood log strengths, centered
+    :param W:        (n,n) win matrix, or (n_batch,n,n) to fit several at once
+    :param init:     Optional starting log strengths, same leading shape as W
+    :param hessian:  Optional fixed (n,n) matrix, as returned by bt_hessian, used for every step instead of the
+                     exact Hessian. For bootstrap samples, the Hessian at the point estimate is close enough.
+    :returns (n,) or (n_batch,n) log strengths theta, with P(i beats j) = 1/(1+exp(theta_j-theta_i))
+    """
+    W = np.asarray(W, dtype=float)
+    batched = W.ndim == 3
+    W = W if batched else W[np.newaxis]
+    n_batch, n = W.shape[:2]
+    i, j, wins, games = _pair_terms(W, prior=prior)
+    incidence = np.zeros((len(i), n))
+    incidence[np.arange(len(i)), i] = 1.0
+    incidence[np.arange(len(i)), j] = -1.0
+    theta = np.zeros((n_batch, n)) if init is None else np.array(np.reshape(init, (n_batch, n)), dtype=float)
+    inverse = None if hessian is None else np.linalg.inv(hessian)
+    for _ in range(max_iter):
+        prob = 1.0 / (1.0 + np.exp(theta[:, j] - theta[:, i]))
+        gradient = np.dot(wins - games * prob, incidence)
+        if inverse is None:
+            step = np.linalg.solve(_laplacian(games * prob * (1 - prob), i, j, n), gradient[:, :, np.newaxis])[:, :, 0]
+        else:
+            step = np.dot(gradient, inverse)
+        largest = np.max(np.abs(step), axis=1, keepdims=True)
+        step = step * np.minimum(1.0, BT_MAX_STEP / np.maximum(largest, 1e-300))
+        theta = theta + step
+        theta = theta - np.mean(theta, axis=1, keepdims=True)
+        if np.max(largest) < tol:
+            break
+    return theta if batched else theta[0]
+
+
+def bt_hessian(W, theta, prior:float=BT_PRIOR)->np.ndarray:
+    """ Negative Hessian of the log likelihood at theta, made invertible as used by bradley_terry """
+    W = np.asarray(W, dtype=float)[np.newaxis]
+    i, j, _, games = _pair_terms(W, prior=prior)
+    prob = 1.0 / (1.0 + np.exp(theta[j] - theta[i]))
+    return _laplacian(games * prob * (1 - prob), i, j, W.shape[-1])[0]
+
+
+def _pair_terms(W, prior:float):
+    """ Pairs i<j that have met in any of the win matrices, wins of i and games played, with the prior added """
+    N = W + np.swapaxes(W, 1, 2)
+    i, j = np.nonzero(np.triu(np.any(N > 0, axis=0), k=1))
+    wins, games = W[:, i, j], N[:, i, j]
+    if prior:
+        met = games > 0
+        wins, games = wins + prior * met, games + 2 * prior * met
+    return i, j, wins, games
+
+
+def _laplacian(weights, i, j, n:int):
+    # The negative Hessian is a weighted graph Laplacian, singular along the all-ones direction. We add 1 1^T/n,
+    # which leaves steps unchanged because gradients sum to zero, plus a small ridge for disconnected contestants.
+    L = np.zeros((len(weights), n, n))
+    L[:, i, j] = -weights
+    L[:, j, i] = -weights
+    degree = np.zeros((len(weights), n))
+    np.add.at(degree, (slice(None), i), weights)
+    np.add.at(degree, (slice(None), j), weights)
+    L[:, np.arange(n), np.arange(n)] = degree
+    return L + np.ones((n, n)) / n + BT_RIDGE * np.eye(n)
+
+
+def theta_to_elo(theta, f:float=400, mean:float=1500):
+    return mean + f / np.log(10) * np.asarray(theta)
+
+
+def bootstrap_win_matrices(W, n_bootstrap:int, seed:int=None)->np.ndarray:
+    """ (n_bootstrap,n,n) win matrices resampling each pair's games, holding the number of games fixed """
+    W = np.asarray(W, dtype=float)
+    rng = np.random.default_rng(seed)
+    N = np.rint(W + W.T)
+    i, j = np.nonzero(np.triu(N > 0, k=1))
+    games = N[i, j]
+    wins = rng.binomial(games.astype(int), W[i, j] / (W[i, j] + W[j, i]), size=(n_bootstrap, len(i)))
+    Ws = np.zeros((n_bootstrap,) + W.shape)
+    Ws[:, i, j] = wins
+    Ws[:, j, i] = games - wins
+    return Ws
+
+
+def bt_elo_ratings(ctn, n_bootstrap:int=200, alpha:float=0.05, prior:float=BT_PRIOR, seed:int=0)->pd.DataFrame:
+    """ Bradley-Terry Elo ratings with bootstrap confidence intervals
+    :returns DataFrame with columns strategy, elo, elo_lo, elo_hi sorted by elo descending
+    """
+    names, W = win_matrix(ctn)
+    theta = bradley_terry(W, prior=prior)
+    elo = theta_to_elo(theta)
+    if n_bootstrap:
+        Ws = bootstrap_win_matrices(W, n_bootstrap=n_bootstrap, seed=seed)
+        thetas = bradley_terry(Ws, prior=prior, init=np.tile(theta, (n_bootstrap, 1)), hessian=bt_hessian(W, theta, prior=prior))
+        lo, hi = np.percentile(theta_to_elo(thetas), [100 * alpha / 2, 100 * (1 - alpha / 2)], axis=0)
+    else:
+        lo, hi = np.full(len(names), np.nan), np.full(len(names), np.nan)
+    df = pd.DataFrame({'strategy':names, 'elo':elo, 'elo_lo':lo, 'elo_hi':hi})
+    return df.sort_values('elo', ascending=False).reset_index(drop=True)
+
+
+def bt_elo_df(genre='manager_info', category='stocks', n_bootstrap:int=200, alpha:float=0.05, prior:float=BT_PRIOR,
+              seed:int=0, store=None)->pd.DataFrame:
+    """ Bradley-Terry ratings for all matching categories, with the columns of elo_df followed by elo_lo, elo_hi
+    :param store:  Optional results store filename or connection (see resultstore), rather than reading battle files
+    """
+    if store is None:
+        categories = win_data(genre=genre, category=category)
+    else:
+        from precise.skatervaluation.battleutil.resultstore import connect_store, sync_win_files, store_categories, category_win_counts
+        con = store if hasattr(store, 'execute') else connect_store(store)
+        try:
+            sync_win_files(con=con, genre=genre)
+            categories = [(cat, category_win_counts(con=con, genre=genre, category=cat))
+                          for cat in store_categories(con=con, genre=genre, category=category)]
+        finally:
+            if con is not store:
+                con.close()
+    timing = TIMING.get(genre) or dict()
+    frames = list()
+    for cat, ctn in categories:
+        if ctn:
+            df = bt_elo_ratings(ctn, n_bootstrap=n_bootstrap, alpha=alpha, prior=prior, seed=seed)
+            df.insert(0, 'category', cat)
+            df.insert(0, 'genre', genre)
+            df.insert(4, 'cpu', [_cpu(timing.get(s)) for s in df['strategy']])
+            frames.append(df)
+    columns = ['genre', 'category', 'strategy', 'elo', 'cpu', 'elo_lo', 'elo_hi']
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+
+
+def _cpu(t)->float:
+    try:
+        return round(float(t), 1)
+    except (TypeError, ValueError):
+        return -1
+
+
+if __name__=='__main__':
+    from pprint import pprint
+    pprint(bt_elo_df(genre='cov_likelihood', category='stocks_20_days'))
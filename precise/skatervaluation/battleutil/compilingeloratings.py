@@ -8,6 +8,8 @@ from precise.skatervaluation.battleutil.speed import TIMING
 from collections import OrderedDict
 import pandas as pd
 from precise.whereami import ELO_CSV
+from precise.skatervaluation.battleutil.resultstore import connect_store, sync_win_files, store_categories, \
+    latest_ingest_id, win_counts_since, load_ratings, save_ratings
 # Creating Elo ratings from collections of wins and losses stored in hashed files /battleresults
 
 GENRES = ['manager_var','manager_info','cov_likelihood']
@@ -23,23 +25,31 @@ def get_elo(genre):
     return df
 
 
-def create_elo_csvs(k=10):
-    """ Clobber the elo_***.csv files """
+def create_elo_csvs(k=10, incremental=False, store=None):
+    """ Clobber the elo_***.csv files
+    :param incremental:  Bring ratings kept in the results store up to date, rather than replaying all files.
+                         Faster, but not the same ratings. See elo_from_store.
+    :param store:        Filename of the results store, defaulting to whereami.BATTLE_STORE
+    """
     print(ELO_CSV)
     for genre in GENRES:
         fn = ELO_CSV.replace('elo', 'elo_' + genre)
         print(fn)
-        df = elo_df(genre=genre, category=None, k=k)
+        df = elo_df(genre=genre, category=None, k=k, incremental=incremental, store=store)
         df.to_csv(fn, index=False)
 
 
-def elo_df(genre='manager_info', category='stocks',k=10):
+def elo_df(genre='manager_info', category='stocks',k=10, incremental=False, store=None):
     """ Elo ratings in a dataframe
     :param genre:      'cov_likelihood'
     :param category:
+    :param incremental: Use elo_from_store rather than elo_from_win_files
     :return:
     """
-    ratings = elo_from_win_files(genre=genre, category=category, k=k)
+    if incremental:
+        ratings = elo_from_store(genre=genre, category=category, k=k, store=store)
+    else:
+        ratings = elo_from_win_files(genre=genre, category=category, k=k)
     elo_tuples = list()
     for r in ratings:
         cat = r[0]
@@ -77,6 +87,68 @@ def elo_from_win_files(genre='cov_likelihood', category=None, k=10):
     return [(cat, elo_from_win_counts(cat_data, timing_genre=genre, k=k)) for cat, cat_data in win_data(genre=genre, category=category)]
 
 
+def elo_from_store(genre='cov_likelihood', category=None, k=10, store=None, results_dir=None):
+    """
+        Elo ratings for all categories, updated incrementally
+
+        New and changed battle files are ingested into the results store, then stored ratings are updated by replaying
+        only the games added since the ratings were last saved.
+
+        This does not reproduce elo_from_win_files. Elo depends on the order games are played, and there all games
+        are shuffled together, whereas here older games are always played before newer ones, and up to ELO_LIMIT
+        games are sampled from each update rather than ELO_LIMIT in total. Ratings are rebuilt from the aggregated
+        counts when a file is deleted or a count goes down.
+
+    :param store:        Filename of the results store, or an open connection
+    :param results_dir:  Defaults to whereami.BATTLE_RESULTS_DIR
+    :return:  [ (category, elo) ] as per elo_from_win_files
+    """
+    con = store if hasattr(store, 'execute') else connect_store(store)
+    try:
+        sync_win_files(con=con, genre=genre, results_dir=results_dir)
+        ratings = list()
+        for cat in store_categories(con=con, genre=genre, category=category):
+            elo, ingest_id = load_ratings(con=con, genre=genre, category=cat, k=k)
+            latest_id = latest_ingest_id(con=con, genre=genre, category=cat)
+            if latest_id > ingest_id:
+                ctn = win_counts_since(con=con, genre=genre, category=cat, ingest_id=ingest_id)
+                elo = elo_replay(elo=elo, ctn=ctn, k=k)
+                save_ratings(con=con, genre=genre, category=cat, k=k, elo=elo, ingest_id=latest_id)
+            ratings.append((cat, _with_timing(elo=Counter(elo), timing_genre=genre)))
+    finally:
+        if con is not store:
+            con.close()
+    return ratings
+
+
+def elo_replay(elo:dict, ctn, k=10, n_limit=None)->dict:
+    """ Apply the games in ctn, in random order, to existing ratings
+    :param ctn:      Counter or dict of 'winner>loser' -> number of games
+    :param n_limit:  Maximum number of games, defaulting to ELO_LIMIT
+    """
+    elo = dict(elo)
+    games = list()
+    for battle, count in ctn.items():
+        winner, loser = battle.split('>')
+        elo.setdefault(winner, 1500)
+        elo.setdefault(loser, 1500)
+        games.extend([(winner, loser)] * int(count))
+    random.shuffle(games)
+    for winner, loser in games[:ELO_LIMIT if n_limit is None else n_limit]:
+        winner_change, loser_change = elo_change(elo[winner], elo[loser], points=1.0, k=k)
+        elo[winner] += winner_change
+        elo[loser] += loser_change
+    return elo
+
+
+def _with_timing(elo, timing_genre=None):
+    if timing_genre is not None:
+        contestant_timing = TIMING.get(timing_genre)
+        if contestant_timing is not None:
+            with_timing = sorted( [ (contestant,(score,contestant_timing.get(contestant))) for contestant, score in elo.items()], key= lambda x: x[1][0], reverse=True)
+            elo = OrderedDict(with_timing)
+    return elo
+
 
 def elo_from_win_counts(ctn, timing_genre=None, k=10):
     """
@@ -126,12 +198,7 @@ def elo_from_win_counts(ctn, timing_genre=None, k=10):
             elo[winner] += winner_change
             elo[loser] += loser_change
     pprint({'total time':time.time()-st,'choice time':ct})
-    if timing_genre is not None:
-        contestant_timing = TIMING.get(timing_genre)
-        if contestant_timing is not None:
-            with_timing = sorted( [ (contestant,(score,contestant_timing.get(contestant))) for contestant, score in elo.items()], key= lambda x: x[1][0], reverse=True)
-            elo = OrderedDict(with_timing)
-    return elo
+    return _with_timing(elo=elo, timing_genre=timing_genre)
 
 
 if __name__=='__main__':
@@ -0,0 +1,257 @@
+from precise.whereami import BATTLE_RESULTS_DIR
+from momentum.functions import rvar
+from concurrent.futures import ProcessPoolExecutor
+from collections import Counter
+from uuid import uuid4
+from pprint import pprint
+import numpy as np
+import traceback
+import pathlib
+import random
+import json
+import math
+import time
+import os
+
+# Running battles in a process pool
+#
+# Each round draws data for several battles, places each dataset in shared memory, and fans the
+# (battle, contestant) assessments out to the pool. Outcomes are merged into the same battle Counter and
+# timing/reliability structures used by generic_battle in arrangingbattles.py
+
+
+def parallel_generic_battle(contestants, evaluator, params:dict, atol=1.0, n_workers:int=None, n_battles:int=None,
+                            n_per_battle:int=7, seed:int=None, n_rounds:int=None, data_func=None, results_dir:str=None,
+                            memoize:bool=False):
+    """
+        As for generic_battle, but contestants from several battles are assessed at once in a process pool
+
+        :param n_workers:     Size of process pool, defaults to the number of cpus
+        :param n_battles:     Battles per round, each on a fresh draw of data. Defaults to enough to occupy the pool
+        :param seed:          Task k of battle b in round i seeds numpy and random with a seed derived from (seed, i, b, k),
+                              so results do not depend on which worker runs what. If supplied, the draw of data for
+                              battle b in round i is likewise seeded from (seed, i, b)
+        :param n_rounds:      Stop after this many rounds (default runs forever, like generic_battle)
+        :param data_func:     Defaults to params_category_and_data
+        :param results_dir:   Defaults to BATTLE_RESULTS_DIR
+        :param memoize:       Reuse assessments of the same contestant on the same data. See skatertools.resultcache
+
+        Data is placed in shared memory, once per battle, rather than pickled for each task (Python 3.8+,
+        otherwise it is pickled).
+        Evaluator and contestants must be picklable, i.e. module level functions.
+
+        :returns  battles, timing, reliability, failures    (if n_rounds is supplied)
+    """
+    data_func = data_func or _default_data_func()
+    n_workers = n_workers or os.cpu_count()
+    n_battles = n_battles or max(1, int(math.ceil(2 * n_workers / n_per_battle)))
+    params, category, queue = battle_setup(contestants=contestants, evaluator=evaluator, params=params, data_func=data_func,
+                                           results_dir=results_dir)
+    seed_sequence = np.random.SeedSequence(seed)
+    rng = np.random.default_rng(seed_sequence.spawn(1)[0])
+
+    battles = Counter()
+    timing = dict()
+    reliability = dict()
+    failures = dict()
+
+    worst_assessment_seen = 10000000
+    lb = params['lb']
+    ub = params['ub']
+
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        round_no = 0
+        while (n_rounds is None) or (round_no < n_rounds):
+            blocks = list()
+            futures = list()
+            try:
+                for b in range(n_battles):
+                    if seed is not None:
+                        data_seed = _task_seed(seed_sequence, round_no, b)
+                        np.random.seed(data_seed)
+                        random.seed(data_seed)
+                    params, category, xs = data_func(params=params)
+                    assert len(xs)==params['n_obs']
+                    block, data = _to_shared_memory(np.asarray(xs, dtype=float))
+                    if block is not None:
+                        blocks.append(block)
+                    some_contestants = [contestants[i] for i in rng.permutation(len(contestants))[:n_per_battle]]
+                    futures.append([pool.submit(_assess_shared, contestant, evaluator, data, np.shape(xs),
+                                                params['n_burn'], lb, ub, _task_seed(seed_sequence, round_no, b, k), memoize)
+                                    for k, contestant in enumerate(some_contestants)])
+                for battle_futures in futures:
+                    outcomes = [f.result() for f in battle_futures]
+                    worst_assessment_seen = tally_battle(outcomes=outcomes, battles=battles, timing=timing, reliability=reliability,
+                                                         failures=failures, atol=atol, worst_assessment_seen=worst_assessment_seen)
+            finally:
+                for block in blocks:
+                    block.close()
+                    block.unlink()
+            save_battles(queue=queue, battles=battles, timing=timing, reliability=reliability, failures=failures)
+            round_no += 1
+    return battles, timing, reliability, failures
+
+
+def assess_contestant(contestant, evaluator, xs, n_burn, lb, ub, memoize:bool=False):
+    """ Run evaluator, converting failure into metrics
+    :param memoize:   Look up, or store, the evaluation in the result cache. Failures are not stored.
+                      Results from the cache have metrics['cached']=True and no timing, which would be stale
+    :returns  (assessment, metrics) where assessment is None if the contestant failed
+    """
+    try:
+        if memoize:
+            from precise.skatertools.resultcache import cached_call
+            (assessment, metrics), hit = cached_call(evaluator, contestant=contestant, xs=np.asarray(xs, dtype=float),
+                                                     n_burn=n_burn, lb=lb, ub=ub, with_hit=True)
+            metrics = dict(metrics)
+            if hit:
+                metrics = dict([(key, value) for key, value in metrics.items() if 'time' not in key])
+                metrics['cached'] = True
+        else:
+            assessment, metrics = evaluator(contestant=contestant, xs=xs, n_burn=n_burn, lb=lb, ub=ub)
+        metrics['name']=contestant.__name__
+        metrics['traceback']=''
+        metrics['passing']=1
+    except Exception as e:
+        metrics = {'name':contestant.__name__,'passing':0,'traceback':traceback.format_exc(),'ll':-100000000}
+        assessment = None
+    return assessment, metrics
+
+
+def tally_battle(outcomes, battles:Counter, timing:dict, reliability:dict, failures:dict, atol:float, worst_assessment_seen:float):
+    """ Merge the outcomes of one battle into the battle Counter and running timing/reliability
+    :param outcomes:  [ (assessment, metrics) ] as returned by assess_contestant
+    :returns worst_assessment_seen
+    """
+    stuff, worst_assessment_seen = tally_health(outcomes=outcomes, timing=timing, reliability=reliability, failures=failures,
+                                                worst_assessment_seen=worst_assessment_seen)
+    valid = [ s for s in stuff if s[1]['passing']>0.5 ]
+
+    for i, mi in enumerate(valid):
+        for j, mj in enumerate(valid):
+            if j != i:
+                if mi[0] > mj[0]+atol:
+                    i_name = mi[1]['name']
+                    j_name = mj[1]['name']
+                    cmp_name = i_name+'>'+j_name
+                    battles.update({cmp_name:1.0})
+    return worst_assessment_seen
+
+
+def tally_health(outcomes, timing:dict, reliability:dict, failures:dict, worst_assessment_seen:float):
+    """ Update running timing, reliability and failures
+    :returns  [ (assessment, metrics) ], worst_assessment_seen     where failed contestants are assigned the worst assessment
+    """
+    stuff = list()
+    for assessment, metrics in outcomes:
+        name = metrics['name']
+        if metrics['passing']:
+            if assessment<worst_assessment_seen:
+                worst_assessment_seen = assessment
+                print({'worst_assessment_yet':assessment})
+            if 'time' in metrics:    # Absent for results replayed from the cache
+                if name not in timing:
+                    timing[name] = {}
+                timing[name] = rvar(timing[name], x=metrics['time'], rho=0.05)
+            if name not in reliability:
+                reliability[name] = {}
+            reliability[name] = rvar(reliability[name], x=1.0, rho=0.05)
+        else:
+            if name not in reliability:
+                reliability[name] = {}
+            reliability[name] = rvar(reliability[name], x=0.0, rho=0.05)
+            failures[name] = metrics['traceback']
+            assessment = worst_assessment_seen
+        stuff.append( (assessment,metrics))
+    valid = [ s for s in stuff if s[1]['passing']>0.5 ]
+
+    if len(valid)<=2:
+        print('Less than 2 working contestants this time around: ')
+        for _, metrics in stuff:
+            print(metrics['name'])
+            pprint(failures.get(metrics['name']))
+        print('Urgh')
+    return stuff, worst_assessment_seen
+
+
+def battle_setup(contestants, evaluator, params:dict, data_func=None, results_dir:str=None, category_suffix:str=''):
+    """ Check data can be retrieved, and create a new queue file name
+    :param category_suffix:  Appended to the category directory, keeping results of a different contest apart
+    """
+    data_func = data_func or _default_data_func()
+    evaluator_name = evaluator.__name__
+    try:
+        params, category, xs_test = data_func(params=params)
+    except Exception as e:
+        print(e)
+        pprint(params)
+        print('Something is probably wrong with params for getting data, so this config will not fly')
+        params, category, xs_test = data_func(params=params)
+
+    print('Data retrieval test passed for category '+category)
+    pprint(params)
+    time.sleep(1)
+    print('Will test the following contestants')
+    pprint(contestants)
+
+    qn = str(uuid4())+'.json'
+    queue_dir = os.path.join(results_dir or BATTLE_RESULTS_DIR, evaluator_name, category + category_suffix)
+    queue = os.path.join(queue_dir,qn)
+    pathlib.Path(queue_dir).mkdir(parents=True, exist_ok=True)
+    print(queue)
+    return params, category, queue
+
+
+def save_battles(queue, battles, timing, reliability, failures):
+    reliabilties = dict([(nm, reliab['mean']) for nm,reliab in reliability.items() ] )
+    cpu_times = dict([(nm, tm['mean']) for nm, tm in timing.items()])
+    with open(queue,'wt') as fh:
+        print('Saving')
+        json.dump(battles,fh)
+        print('---')
+        pprint(reliabilties)
+        print('---')
+        pprint(battles)
+        print(' ')
+        pprint(failures)
+        print('---')
+        pprint(cpu_times)
+
+
+def _default_data_func():
+    from precise.skatervaluation.battledata.allsources import params_category_and_data
+    return params_category_and_data
+
+
+def _to_shared_memory(xs:np.ndarray):
+    """ Copy xs into shared memory
+    :returns  block, data    where data is the block name to hand to workers, or xs itself if shared memory is unavailable
+    """
+    try:
+        from multiprocessing.shared_memory import SharedMemory    # Python 3.8+
+    except ImportError:
+        return None, xs
+    block = SharedMemory(create=True, size=max(1, xs.nbytes))
+    np.ndarray(np.shape(xs), dtype=float, buffer=block.buf)[:] = xs
+    return block, block.name
+
+
+def _task_seed(seed_sequence, *spawn_key)->int:
+    child = np.random.SeedSequence(entropy=seed_sequence.entropy, spawn_key=spawn_key)
+    return int(child.generate_state(1)[0])
+
+
+def _assess_shared(contestant, evaluator, data, shape, n_burn, lb, ub, seed:int, memoize:bool=False):
+    """ Worker: read data from shared memory (or data itself, if an array), seed, and assess """
+    if isinstance(data, str):
+        from multiprocessing.shared_memory import SharedMemory
+        block = SharedMemory(name=data)
+        try:
+            xs = np.array(np.ndarray(shape, dtype=float, buffer=block.buf))
+        finally:
+            block.close()
+    else:
+        xs = np.asarray(data, dtype=float)
+    np.random.seed(seed)
+    random.seed(seed)
+    return assess_contestant(contestant=contestant, evaluator=evaluator, xs=xs, n_burn=n_burn, lb=lb, ub=ub, memoize=memoize)
@@ -0,0 +1,197 @@
+import time
+import traceback
+import numpy as np
+from collections import Counter
+from precise.skaters.covarianceutil.likelihood import batch_log_likelihood
+from precise.skaters.covarianceutil.warmstart import warm_start
+from precise.skaters.managerutil.managerwarmstart import warm_start_manager
+from precise.skatervaluation.battleutil.parallelbattles import tally_health
+
+# Racing: evaluate contestants on successive chunks of data, dropping those that are clearly behind
+#
+#     results = race(contestants=mgrs, stepper=manager_race_step, xs=xs, n_burn=100, statistic='info')
+#
+# A stepper advances one contestant by n_steps observations and returns a score for each observation:
+#     scores, s = stepper(contestant, xs=xs, s=s, n_steps=n_steps, n_burn=n_burn, **kwargs)
+# where s is a dict holding the contestant's state and position (start with s={}).
+#
+# After each chunk the statistic and a standard error are computed for every remaining contestant, over the same
+# observations, and contestants whose upper bound is below the lower bound of the leader are eliminated:
+#     'mean'   mean score, e.g. log-likelihood. Judged on paired differences from the leader.
+#     'info'   mean/std, e.g. of portfolio returns, with standard error sqrt((1+info^2/2)/n)
+#     'var'    minus the variance, with standard error from the fourth moment
+#
+# Each result reports n_obs, the number of observations the contestant was evaluated on.
+#
+# Steppers score xs[t] against the prediction made just before it, and 'info' is estimated as above, so scores
+# differ from cov_likelihood and manager_stats. Racing battles therefore save wins under their own category,
+# with RACE_CATEGORY_SUFFIX appended, and their Elo ratings are compiled separately.
+
+RACE_STATISTICS = ['mean', 'info', 'var']
+RACE_CATEGORY_SUFFIX = '_racing'
+
+
+def race(contestants, stepper, xs, n_burn:int, n_chunk:int=50, z:float=3.0, statistic:str='mean', n_min:int=None,
+         verbose:bool=False, **stepper_kwargs)->[dict]:
+    """
+    :param n_chunk:    Observations per round
+    :param z:          Width of confidence bounds, in standard errors
+    :param n_min:      No eliminations before this many observations, defaults to n_chunk
+    :returns [ dict ]  name, contestant, passing, survivor, n_obs, assessment, scores, time, traceback
+                       Survivors first, then in reverse order of elimination
+    """
+    assert statistic in RACE_STATISTICS
+    n_min = n_min or n_chunk
+    n_available = len(xs) - n_burn
+    results = [{'name':c.__name__, 'contestant':c, 'passing':1, 'survivor':True, 'n_obs':0, 'scores':np.zeros(0),
+                'time':0., 'traceback':'', 'state':{}, 'eliminated':None} for c in contestants]
+    alive = list(range(len(results)))
+    n_done = 0
+    round_no = 0
+    while alive and n_done < n_available:
+        n_steps = min(n_chunk, n_available - n_done)
+        for i in list(alive):
+            r = results[i]
+            start_time = time.time()
+            try:
+                scores, r['state'] = stepper(r['contestant'], xs=xs, s=r['state'], n_steps=n_steps, n_burn=n_burn, **stepper_kwargs)
+                r['scores'] = np.concatenate([r['scores'], scores])
+                r['n_obs'] = len(r['scores'])
+            except Exception:
+                r.update({'passing':0, 'survivor':False, 'traceback':traceback.format_exc(), 'eliminated':round_no})
+                alive.remove(i)
+            r['time'] += time.time() - start_time
+        n_done += n_steps
+
+        if len(alive) > 1 and n_done >= n_min:
+            dominated = race_dominated(np.array([results[i]['scores'] for i in alive]), statistic=statistic, z=z)
+            for i, dom in zip(list(alive), dominated):
+                if dom:
+                    results[i].update({'survivor':False, 'eliminated':round_no})
+                    alive.remove(i)
+            if verbose:
+                print('  after ' + str(n_done) + ' observations ' + str(len(alive)) + ' remain')
+        if len(alive) == 1:
+            break
+        round_no += 1
+
+    for r in results:
+        del r['state']
+        r['assessment'] = race_assessment(r['scores'], statistic=statistic) if r['passing'] and r['n_obs'] else None
+    return sorted(results, key=lambda r: (r['survivor'], r['n_obs'], r['assessment'] if r['assessment'] is not None else -np.inf),
+                  reverse=True)
+
+
+def race_dominated(scores, statistic:str='mean', z:float=3.0):
+    """ Which contestants are dominated by the leader
+    :param scores:  (n_contestants, n_obs) scores on the same observations
+    :returns bool array
+    """
+    n_obs = np.shape(scores)[1]
+    if statistic == 'mean':
+        means = np.mean(scores, axis=1)
+        diffs = scores - scores[np.argmax(means)]
+        se = np.std(diffs, axis=1, ddof=1) / np.sqrt(n_obs)
+        return np.mean(diffs, axis=1) + z * se < 0
+    estimates, se = race_estimates(scores, statistic=statistic)
+    leader = np.argmax(estimates)
+    return estimates + z * se < estimates[leader] - z * se[leader]
+
+
+def race_estimates(scores, statistic:str):
+    """ Statistic and standard error for each row of scores """
+    scores = np.atleast_2d(scores)
+    n_obs = np.shape(scores)[1]
+    mean = np.mean(scores, axis=1)
+    std = np.std(scores, axis=1)
+    if statistic == 'mean':
+        return mean, std / np.sqrt(n_obs)
+    elif statistic == 'info':
+        with np.errstate(divide='ignore', invalid='ignore'):
+            info = np.where(std > 0, mean / std, 0.)
+        return info, np.sqrt((1 + info ** 2 / 2) / n_obs)
+    elif statistic == 'var':
+        m4 = np.mean((scores - mean[:, np.newaxis]) ** 4, axis=1)
+        return -std ** 2, np.sqrt(np.maximum(m4 - std ** 4, 0) / n_obs)
+    raise ValueError('statistic should be one of ' + str(RACE_STATISTICS))
+
+
+def race_assessment(scores, statistic:str='mean', n_obs:int=None)->float:
+    """ Assessment on the first n_obs scores, on the scale used by the evaluators
+        'mean' gives the total (e.g. cumulative log-likelihood), 'info' the info ratio, 'var' minus the variance
+    """
+    scores = np.asarray(scores)[:n_obs]
+    if statistic == 'mean':
+        return float(np.sum(scores))
+    return float(race_estimates(scores, statistic=statistic)[0][0])
+
+
+def cov_likelihood_race_step(f, xs, s:dict, n_steps:int, n_burn:int, lb=-1000, ub=1000):
+    """ Log-likelihood of each observation under the cov skater's one step ahead prediction """
+    if not s:
+        y_hat, y_cov, f_state = warm_start(f=f, xs=xs[:n_burn], e=-1)
+        s = {'t':n_burn, 'f_state':f_state, 'y_hat':y_hat, 'y_cov':y_cov}
+    t_end = min(s['t'] + n_steps, len(xs))
+    n = t_end - s['t']
+    n_dim = np.shape(xs)[1]
+    covs = np.empty((n, n_dim, n_dim))
+    dys = np.empty((n, n_dim))
+    for m, t in enumerate(range(s['t'], t_end)):
+        covs[m] = s['y_cov']
+        dys[m] = np.asarray(xs[t]) - np.asarray(s['y_hat'])
+        s['y_hat'], s['y_cov'], s['f_state'] = f(y=xs[t], s=s['f_state'], k=1, e=1)
+    s['t'] = t_end
+    return batch_log_likelihood(covs=covs, ys=dys, lb=lb, ub=ub), s
+
+
+def manager_race_step(mgr, xs, s:dict, n_steps:int, n_burn:int, metric=None, j=1, q=1.0, **ignore):
+    """ Return of each observation under the portfolio the manager chose after the previous one """
+    if metric is None:
+        from precise.skatervaluation.managercomparisonutil.managerstats import var_metric
+        metric = var_metric
+    if not s:
+        w, mgr_state = warm_start_manager(mgr=mgr, xs=xs[:n_burn], e=-1, j=j, q=q)
+        s = {'t':n_burn, 'mgr_state':mgr_state, 'w':w}
+    t_end = min(s['t'] + n_steps, len(xs))
+    scores = np.empty(t_end - s['t'])
+    for m, t in enumerate(range(s['t'], t_end)):
+        scores[m] = metric(y=xs[t], w_prev=s['w'])
+        s['w'], s['mgr_state'] = mgr(y=xs[t], s=s['mgr_state'], k=1, e=1, j=j, q=q)
+    s['t'] = t_end
+    return scores, s
+
+
+# Steppers for the battle evaluators, keyed by evaluator name
+RACE_EVALUATORS = {'cov_likelihood':(cov_likelihood_race_step, 'mean'),
+                   'manager_info':(manager_race_step, 'info'),
+                   'manager_var':(manager_race_step, 'var')}
+
+
+def race_outcomes(contestants, evaluator, xs, n_burn:int, lb, ub, **race_kwargs)->[dict]:
+    """ Race contestants using the stepper matching a battle evaluator """
+    if evaluator.__name__ not in RACE_EVALUATORS:
+        raise ValueError('No racing stepper for evaluator ' + evaluator.__name__)
+    stepper, statistic = RACE_EVALUATORS[evaluator.__name__]
+    stepper_kwargs = {'lb':lb, 'ub':ub} if stepper is cov_likelihood_race_step else {}
+    race_kwargs = dict(race_kwargs)
+    race_kwargs.setdefault('statistic', statistic)
+    return race(contestants=contestants, stepper=stepper, xs=xs, n_burn=n_burn, **race_kwargs, **stepper_kwargs)
+
+
+def tally_race(results:[dict], battles:Counter, timing:dict, reliability:dict, failures:dict, atol:float,
+               worst_assessment_seen:float, statistic:str='mean')->float:
+    """ As per tally_battle, except each pair is compared on the observations both were evaluated on
+    :returns worst_assessment_seen
+    """
+    outcomes = [(r['assessment'], r) for r in results]
+    _, worst_assessment_seen = tally_health(outcomes=outcomes, timing=timing, reliability=reliability, failures=failures,
+                                            worst_assessment_seen=worst_assessment_seen)
+    valid = [r for r in results if r['passing'] and r['n_obs']]
+    for ri in valid:
+        for rj in valid:
+            if ri is not rj:
+                n_common = min(ri['n_obs'], rj['n_obs'])
+                if race_assessment(ri['scores'], statistic=statistic, n_obs=n_common) > \
+                        race_assessment(rj['scores'], statistic=statistic, n_obs=n_common) + atol:
+                    battles.update({ri['name'] + '>' + rj['name']:1.0})
+    return worst_assessment_seen
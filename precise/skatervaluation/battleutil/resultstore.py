@@ -0,0 +1,181 @@
+import os
+import json
+import sqlite3
+from glob import glob
+from collections import Counter
+from precise.whereami import BATTLE_RESULTS_DIR, BATTLE_STORE
+
+# An indexed store of battle results, so Elo ratings can be brought up to date without re-reading every file
+#
+#     con = connect_store()                            # SQLite file, created on first use
+#     sync_win_files(con, genre='cov_likelihood')      # Ingest only the .json files that are new or have changed
+#     ctn = category_win_counts(con, genre, category)  # Aggregated counter, as per battleio.load_win_data
+#
+# Tables:
+#     files       One row per battle file, with the modification time and size it had when last ingested
+#     ingests     One row each time a file is (re)ingested. Its id is the watermark used by ratings.
+#     battles     Change in each file's win counts at each ingestion
+#     wins        Win counts aggregated by genre, category and pair
+#     ratings     Elo ratings and the last ingest id they reflect, for each genre, category and k
+#
+# A running battle rewrites its file with cumulative counts every round (see parallelbattles.save_battles), so a
+# file whose modification time or size has changed is read again and only the difference is recorded. If any count
+# went down, or a file is deleted, ratings for that category are dropped, to be recomputed from the aggregated
+# counts. Files that can't be parsed (e.g. caught half written) are not recorded, so they are tried again next time.
+#
+# Only plain INSERT and UPDATE statements are used, so any SQLite version will do.
+
+STORE_VERSION = 2    # Kept in PRAGMA user_version. Stores from earlier versions are rebuilt from the battle files.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (id INTEGER PRIMARY KEY AUTOINCREMENT, genre TEXT, category TEXT, path TEXT UNIQUE,
+                                  mtime_ns INTEGER, size INTEGER);
+CREATE TABLE IF NOT EXISTS ingests (id INTEGER PRIMARY KEY AUTOINCREMENT, file_id INTEGER, genre TEXT, category TEXT);
+CREATE INDEX IF NOT EXISTS ingests_category ON ingests (genre, category);
+CREATE TABLE IF NOT EXISTS battles (ingest_id INTEGER, file_id INTEGER, winner TEXT, loser TEXT, count REAL);
+CREATE INDEX IF NOT EXISTS battles_file ON battles (file_id);
+CREATE INDEX IF NOT EXISTS battles_ingest ON battles (ingest_id);
+CREATE TABLE IF NOT EXISTS wins (genre TEXT, category TEXT, winner TEXT, loser TEXT, count REAL,
+                                 PRIMARY KEY (genre, category, winner, loser));
+CREATE TABLE IF NOT EXISTS ratings (genre TEXT, category TEXT, k REAL, contestant TEXT, elo REAL,
+                                    PRIMARY KEY (genre, category, k, contestant));
+CREATE TABLE IF NOT EXISTS watermarks (genre TEXT, category TEXT, k REAL, ingest_id INTEGER,
+                                       PRIMARY KEY (genre, category, k));
+"""
+
+TABLES = ['files', 'ingests', 'battles', 'wins', 'ratings', 'watermarks']
+
+
+def connect_store(filename:str=None)->sqlite3.Connection:
+    filename = filename or BATTLE_STORE
+    if filename != ':memory:':
+        os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+    con = sqlite3.connect(filename)
+    (version,) = con.execute('PRAGMA user_version').fetchone()
+    if version != STORE_VERSION:
+        with con:
+            for table in TABLES:
+                con.execute('DROP TABLE IF EXISTS ' + table)
+        con.execute('PRAGMA user_version = ' + str(STORE_VERSION))
+    con.executescript(SCHEMA)
+    return con
+
+
+def sync_win_files(con:sqlite3.Connection, genre:str='cov_likelihood', results_dir:str=None)->dict:
+    """ Ingest battle files that are new or have changed, and forget those that have been deleted
+    :returns { category: number of new or changed files }
+    """
+    results_dir = results_dir or BATTLE_RESULTS_DIR
+    on_disk = dict()
+    for fn in glob(os.path.join(results_dir, genre, '*', '*.json')):
+        on_disk[os.path.relpath(fn, results_dir)] = fn
+    known = dict([(path, (file_id, mtime_ns, size)) for path, file_id, mtime_ns, size in
+                  con.execute('SELECT path, id, mtime_ns, size FROM files WHERE genre=?', (genre,)).fetchall()])
+
+    n_new = Counter()
+    with con:
+        for path in sorted(on_disk):
+            try:
+                stat = os.stat(on_disk[path])
+            except FileNotFoundError:
+                continue
+            if path in known and known[path][1:] == (stat.st_mtime_ns, stat.st_size):
+                continue
+            try:
+                with open(on_disk[path], 'rt') as fh:
+                    data = json.load(fh)
+            except (json.decoder.JSONDecodeError, FileNotFoundError):
+                print('Issue with ' + on_disk[path] + ', will try again')
+                continue
+            category = os.path.basename(os.path.dirname(path))
+            if path in known:
+                file_id = known[path][0]
+                con.execute('UPDATE files SET mtime_ns=?, size=? WHERE id=?', (stat.st_mtime_ns, stat.st_size, file_id))
+            else:
+                file_id = con.execute('INSERT INTO files (genre, category, path, mtime_ns, size) VALUES (?,?,?,?,?)',
+                                      (genre, category, path, stat.st_mtime_ns, stat.st_size)).lastrowid
+            _ingest(con=con, genre=genre, category=category, file_id=file_id, ctn=Counter(data))
+            n_new[category] += 1
+
+        removed = set(known) - set(on_disk)
+        for category in set(os.path.basename(os.path.dirname(path)) for path in removed):
+            _forget_files(con=con, genre=genre, category=category,
+                          file_ids=[known[path][0] for path in removed if os.path.basename(os.path.dirname(path)) == category])
+    return dict(n_new)
+
+
+def _ingest(con, genre:str, category:str, file_id:int, ctn:Counter):
+    """ Record the change from the file's previously ingested counts to ctn """
+    previous = Counter(dict([(winner + '>' + loser, count) for winner, loser, count in
+                             con.execute('SELECT winner, loser, SUM(count) FROM battles WHERE file_id=? GROUP BY winner, loser', (file_id,))]))
+    changes = [(pair, ctn.get(pair, 0) - previous.get(pair, 0)) for pair in sorted(set(ctn) | set(previous))]
+    changes = [(pair, change) for pair, change in changes if change != 0]
+    if not changes:
+        return
+    ingest_id = con.execute('INSERT INTO ingests (file_id, genre, category) VALUES (?,?,?)', (file_id, genre, category)).lastrowid
+    rows = [tuple(pair.split('>')) + (change,) for pair, change in changes]
+    con.executemany('INSERT INTO battles (ingest_id, file_id, winner, loser, count) VALUES (?,?,?,?,?)',
+                    [(ingest_id, file_id, winner, loser, change) for winner, loser, change in rows])
+    con.executemany('INSERT OR IGNORE INTO wins (genre, category, winner, loser, count) VALUES (?,?,?,?,0)',
+                    [(genre, category, winner, loser) for winner, loser, _ in rows])
+    con.executemany('UPDATE wins SET count = count + ? WHERE genre=? AND category=? AND winner=? AND loser=?',
+                    [(change, genre, category, winner, loser) for winner, loser, change in rows])
+    if any(change < 0 for _, change in changes):
+        _drop_ratings(con=con, genre=genre, category=category)    # Games can't be un-played
+
+
+def _forget_files(con, genre:str, category:str, file_ids:[int]):
+    marks = ','.join('?' * len(file_ids))
+    con.execute('DELETE FROM battles WHERE file_id IN (' + marks + ')', file_ids)
+    con.execute('DELETE FROM ingests WHERE file_id IN (' + marks + ')', file_ids)
+    con.execute('DELETE FROM files WHERE id IN (' + marks + ')', file_ids)
+    con.execute('DELETE FROM wins WHERE genre=? AND category=?', (genre, category))
+    con.execute('INSERT INTO wins (genre, category, winner, loser, count) '
+                'SELECT i.genre, i.category, b.winner, b.loser, SUM(b.count) FROM battles b JOIN ingests i ON b.ingest_id = i.id '
+                'WHERE i.genre=? AND i.category=? GROUP BY b.winner, b.loser', (genre, category))
+    _drop_ratings(con=con, genre=genre, category=category)
+
+
+def _drop_ratings(con, genre:str, category:str):
+    con.execute('DELETE FROM ratings WHERE genre=? AND category=?', (genre, category))
+    con.execute('DELETE FROM watermarks WHERE genre=? AND category=?', (genre, category))
+
+
+def store_categories(con:sqlite3.Connection, genre:str, category:str=None)->[str]:
+    """ Categories with ingested files, optionally those containing the substring category, as per battleio.win_dirs """
+    cats = [c for (c,) in con.execute('SELECT DISTINCT category FROM files WHERE genre=? ORDER BY category', (genre,))]
+    return cats if category is None else [c for c in cats if category in c]
+
+
+def category_win_counts(con:sqlite3.Connection, genre:str, category:str)->Counter:
+    """ Aggregated wins, keyed 'winner>loser' """
+    rows = con.execute('SELECT winner, loser, count FROM wins WHERE genre=? AND category=? AND count>0', (genre, category))
+    return Counter(dict([(winner + '>' + loser, count) for winner, loser, count in rows]))
+
+
+def latest_ingest_id(con:sqlite3.Connection, genre:str, category:str)->int:
+    (ingest_id,) = con.execute('SELECT MAX(id) FROM ingests WHERE genre=? AND category=?', (genre, category)).fetchone()
+    return ingest_id or 0
+
+
+def win_counts_since(con:sqlite3.Connection, genre:str, category:str, ingest_id:int)->Counter:
+    """ Wins added after ingest_id. From zero, the aggregated wins. """
+    if not ingest_id:
+        return category_win_counts(con=con, genre=genre, category=category)
+    rows = con.execute('SELECT b.winner, b.loser, SUM(b.count) FROM battles b JOIN ingests i ON b.ingest_id = i.id '
+                       'WHERE i.genre=? AND i.category=? AND i.id>? GROUP BY b.winner, b.loser', (genre, category, ingest_id))
+    return Counter(dict([(winner + '>' + loser, count) for winner, loser, count in rows if count > 0]))
+
+
+def load_ratings(con:sqlite3.Connection, genre:str, category:str, k:float)->(dict, int):
+    """ Stored Elo ratings and the watermark (ingest id) they reflect, or ({}, 0) """
+    elo = dict(con.execute('SELECT contestant, elo FROM ratings WHERE genre=? AND category=? AND k=?', (genre, category, k)).fetchall())
+    row = con.execute('SELECT ingest_id FROM watermarks WHERE genre=? AND category=? AND k=?', (genre, category, k)).fetchone()
+    return (elo, row[0]) if row is not None else ({}, 0)
+
+
+def save_ratings(con:sqlite3.Connection, genre:str, category:str, k:float, elo:dict, ingest_id:int):
+    with con:
+        con.executemany('INSERT OR REPLACE INTO ratings (genre, category, k, contestant, elo) VALUES (?,?,?,?,?)',
+                        [(genre, category, k, c, float(r)) for c, r in elo.items()])
+        con.execute('INSERT OR REPLACE INTO watermarks (genre, category, k, ingest_id) VALUES (?,?,?,?)', (genre, category, k, ingest_id))
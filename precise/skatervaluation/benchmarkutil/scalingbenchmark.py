@@ -0,0 +1,193 @@
+import time
+import json
+import math
+import platform
+import tracemalloc
+import traceback
+import numpy as np
+from precise.skatertools.syntheticdata.factor import create_factor_dataset
+
+# Offline scaling benchmarks for cov skaters and managers
+#
+#     report = scaling_benchmark(kind='skater', n_dims=[5, 10, 25, 50, 100])
+#     save_baseline(report, 'baseline.json')
+#     ...
+#     regressions = compare_to_baseline(report=scaling_benchmark(...), baseline=load_baseline('baseline.json'))
+#
+# Each contestant is run on synthetic factor data for every (n_dim, n_obs) on the grid, in increasing n_dim,
+# and we record per tick latency and, in a separate pass, peak traced memory (tracing would slow the timed pass).
+# Larger n_dim are skipped once a run exceeds max_seconds.
+# Scaling exponents are slopes of log median tick latency against log n_dim.
+
+DEFAULT_N_DIMS = [5, 10, 25, 50, 100, 250, 500, 1000]
+DEFAULT_N_OBS = [100]
+BENCHMARK_VERSION = 1
+
+
+def default_contestants(kind:str)->list:
+    if kind == 'skater':
+        from precise.skaters.covariance.allcovskaters import ALL_D0_SKATERS, ALL_D1_SKATERS
+        return ALL_D0_SKATERS + ALL_D1_SKATERS
+    elif kind == 'manager':
+        from precise.skaters.managers.allmanagers import RELIABLE_LONG_MANAGERS
+        return RELIABLE_LONG_MANAGERS
+    else:
+        raise ValueError('kind should be skater or manager')
+
+
+def benchmark_run(f, xs, kind:str='skater', memory:bool=True)->dict:
+    """ Time every tick of skater or manager f applied to xs
+    :param memory:  Also measure peak traced memory, in a second pass. Ticks are timed without tracing, which slows
+                    allocation heavy code several-fold (unless the caller is already tracing)
+    :returns dict with per tick latency in milliseconds and peak traced memory in megabytes
+    """
+    random_state = np.random.get_state()
+    ticks = np.empty(len(xs))
+    s = {}
+    for t, y in enumerate(xs):
+        start_time = time.perf_counter()
+        if kind == 'skater':
+            _, _, s = f(s=s, y=y, k=1, e=1)
+        else:
+            _, s = f(s=s, y=y, k=1, e=1)
+        ticks[t] = time.perf_counter() - start_time
+    if memory:
+        np.random.set_state(random_state)    # So that stochastic contestants repeat the timed run
+        peak_mb = benchmark_peak_mb(f=f, xs=xs, kind=kind)
+    else:
+        peak_mb = np.nan
+    return {'tick_ms_median':1000 * float(np.median(ticks)),
+            'tick_ms_mean':1000 * float(np.mean(ticks)),
+            'tick_ms_max':1000 * float(np.max(ticks)),
+            'seconds':float(np.sum(ticks)),
+            'peak_mb':float(peak_mb)}
+
+
+def benchmark_peak_mb(f, xs, kind:str='skater')->float:
+    """ Peak traced memory in megabytes, above that in use at the start, while f is applied to xs """
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    elif hasattr(tracemalloc, 'reset_peak'):
+        tracemalloc.reset_peak()
+    else:
+        tracemalloc.stop()     # Before Python 3.9 restarting is the only way to reset the peak
+        tracemalloc.start()
+    start_memory = tracemalloc.get_traced_memory()[0]
+    s = {}
+    try:
+        for y in xs:
+            if kind == 'skater':
+                _, _, s = f(s=s, y=y, k=1, e=1)
+            else:
+                _, s = f(s=s, y=y, k=1, e=1)
+        return (tracemalloc.get_traced_memory()[1] - start_memory) / 1e6
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
+
+
+def scaling_benchmark(contestants=None, kind:str='skater', n_dims=None, n_obs=None, max_seconds:float=30.,
+                      memory:bool=True, seed:int=0, verbose:bool=True)->dict:
+    """
+    :param contestants:  cov skaters or managers, defaulting to ALL_D0_SKATERS + ALL_D1_SKATERS, or RELIABLE_LONG_MANAGERS
+    :param kind:         'skater' or 'manager'
+    :param max_seconds:  Once a run takes longer than this, larger n_dim are skipped for that contestant
+    :returns report      JSON-able dict with 'results' (one row per run) and 'exponents'
+    """
+    contestants = contestants or default_contestants(kind=kind)
+    n_dims = sorted(n_dims or DEFAULT_N_DIMS)
+    n_obs = n_obs or DEFAULT_N_OBS
+    datasets = dict()
+    results = list()
+    for f in contestants:
+        for n in n_obs:
+            for n_dim in n_dims:
+                if (n, n_dim) not in datasets:
+                    np.random.seed(seed)
+                    datasets[(n, n_dim)] = 0.01 * create_factor_dataset(n=n, n_dim=n_dim)
+                row = {'name':f.__name__, 'kind':kind, 'n_dim':n_dim, 'n_obs':n, 'error':''}
+                try:
+                    np.random.seed(seed)
+                    row.update(benchmark_run(f=f, xs=datasets[(n, n_dim)], kind=kind, memory=memory))
+                except Exception:
+                    row['error'] = traceback.format_exc()
+                results.append(row)
+                if verbose:
+                    print(row['name'] + ' n_dim=' + str(n_dim) + ' n_obs=' + str(n) + ' ' +
+                          (str(round(row['tick_ms_median'], 3)) + 'ms/tick' if not row['error'] else 'failed'))
+                if row['error'] or row['seconds'] > max_seconds:
+                    break
+    return {'version':BENCHMARK_VERSION,
+            'created':time.time(),
+            'environment':benchmark_environment(),
+            'results':results,
+            'exponents':scaling_exponents(results)}
+
+
+def scaling_exponents(results:[dict])->dict:
+    """ Slope of log median latency against log n_dim, for each contestant and n_obs with at least two sizes
+    :returns { name: { str(n_obs): exponent } }
+    """
+    exponents = dict()
+    groups = dict()
+    for row in results:
+        if not row['error']:
+            groups.setdefault((row['name'], row['n_obs']), list()).append((row['n_dim'], row['tick_ms_median']))
+    for (name, n), points in groups.items():
+        points = [(n_dim, ms) for n_dim, ms in points if ms > 0]
+        if len(set(n_dim for n_dim, _ in points)) >= 2:
+            log_n, log_ms = np.log([p[0] for p in points]), np.log([p[1] for p in points])
+            exponents.setdefault(name, dict())[str(n)] = float(np.polyfit(log_n, log_ms, 1)[0])
+    return exponents
+
+
+def benchmark_environment()->dict:
+    import precise
+    return {'python':platform.python_version(),
+            'numpy':np.__version__,
+            'machine':platform.machine(),
+            'processor':platform.processor(),
+            'precise':getattr(precise, '__version__', None)}
+
+
+def save_baseline(report:dict, filename:str):
+    with open(filename, 'wt') as fh:
+        json.dump(report, fh, indent=1)
+
+
+def load_baseline(filename:str)->dict:
+    with open(filename, 'rt') as fh:
+        return json.load(fh)
+
+
+def compare_to_baseline(report:dict, baseline:dict, tolerance:float=1.25, min_ms:float=0.05)->[dict]:
+    """ Runs that got slower
+    :param tolerance:  Flag if median tick latency exceeds tolerance times the baseline
+    :param min_ms:     Ignore runs faster than this in both, as noise
+    :returns [ dict ]  with name, n_dim, n_obs, baseline_ms, ms, ratio. Also newly failing runs, with ratio inf
+    """
+    before = dict([((row['name'], row['n_dim'], row['n_obs']), row) for row in baseline['results']])
+    regressions = list()
+    for row in report['results']:
+        old = before.get((row['name'], row['n_dim'], row['n_obs']))
+        if old is None or old['error']:
+            continue
+        flagged = {'name':row['name'], 'n_dim':row['n_dim'], 'n_obs':row['n_obs'], 'baseline_ms':old['tick_ms_median']}
+        if row['error']:
+            regressions.append(dict(flagged, ms=math.nan, ratio=math.inf))
+        elif max(row['tick_ms_median'], old['tick_ms_median']) >= min_ms:
+            ratio = row['tick_ms_median'] / max(old['tick_ms_median'], 1e-12)
+            if ratio > tolerance:
+                regressions.append(dict(flagged, ms=row['tick_ms_median'], ratio=ratio))
+    return sorted(regressions, key=lambda r: -r['ratio'])
+
+
+if __name__ == '__main__':
+    import sys
+    from pprint import pprint
+    report = scaling_benchmark(kind='skater', n_dims=[5, 10, 25], max_seconds=5.)
+    if len(sys.argv) > 2:
+        pprint(compare_to_baseline(report=report, baseline=load_baseline(sys.argv[2])))
+    if len(sys.argv) > 1:
+        save_baseline(report, sys.argv[1])
@@ -0,0 +1,40 @@
+from precise.skaters.covariance.bufsk import BUF_SK_PERSISTENT_PAIRS
+from precise.skaters.covarianceutil.likelihood import cov_skater_loglikelihood
+from precise.skatertools.syntheticdata.factor import create_factor_dataset
+
+# Wall-clock saving of the persistent (refit every j, warm started) sklearn skaters
+# relative to their fit-every-observation counterparts
+
+
+def persistent_sk_speedup(pairs=None, xs=None, n_obs:int=200, n_dim:int=8, n_burn:int=50, verbose=True)->[dict]:
+    """
+    :param pairs:  [ (baseline skater, persistent skater) ]
+    :param xs:     (n_obs, n_dim) data, otherwise synthetic factor data is used
+    :return: list of dicts, one per persistent skater
+    """
+    if pairs is None:
+        pairs = BUF_SK_PERSISTENT_PAIRS
+    if xs is None:
+        xs = create_factor_dataset(n=n_obs, n_dim=n_dim)
+
+    report = list()
+    for baseline, persistent in pairs:
+        baseline_ll, baseline_metrics = cov_skater_loglikelihood(f=baseline, xs=xs, n_burn=n_burn, verbose=False)
+        ll, metrics = cov_skater_loglikelihood(f=persistent, xs=xs, n_burn=n_burn, verbose=False)
+        row = {'skater':persistent.__name__,
+               'baseline':baseline.__name__,
+               'baseline_time':baseline_metrics['time'],
+               'time':metrics['time'],
+               'saving':baseline_metrics['time'] - metrics['time'],
+               'speedup':baseline_metrics['time'] / max(metrics['time'], 1e-9),
+               'baseline_ll':baseline_ll,
+               'll':ll}
+        report.append(row)
+        if verbose:
+            print(row['skater'] + ' saves ' + str(round(row['saving'], 3)) + 's (' + str(round(row['speedup'], 1)) + 'x)')
+    return report
+
+
+if __name__ == '__main__':
+    from pprint import pprint
+    pprint(persistent_sk_speedup())
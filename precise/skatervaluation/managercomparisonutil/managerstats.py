@@ -3,6 +3,8 @@ import numpy as np
 from momentum.functions import var_init, var_update
 from itertools import zip_longest
 from pprint import pprint
+from precise.skatertools.profiling import profile_section, profiling, profile_table
+from precise.skaters.managerutil.managerwarmstart import warm_start_manager
 
 
 def manager_info(contestant, xs, n_burn, **ignore):
@@ -22,7 +24,7 @@ def var_metric(y,w_prev):
 
 
 def manager_stats_leaderboard(mgrs, xs, n_burn=100, metric=var_metric, j=1, q=1.0,
-                              verbose=True, field='info'):
+                              verbose=True, field='info', racing=False, n_chunk=50, z=3.0, memoize=False):
     """
     :param mgrs:
     :param xs:
@@ -32,8 +34,17 @@ def manager_stats_leaderboard(mgrs, xs, n_burn=100, metric=var_metric, j=1, q=1.
     :param q:
     :param verbose:
     :param field:
-    :return:  [ (score, name, manager) ]
+    :param racing:   Evaluate in chunks of n_chunk observations, dropping managers whose field ('info' or 'mean')
+                     is z standard errors behind the leader. See battleutil.racing
+    :param memoize:  Reuse manager_stats for the same manager and data. See skatertools.resultcache
+    :return:  [ (score, name, manager, beat) ]  or if racing [ (score, name, manager, beat, n_obs) ] where
+              n_obs is the number of observations the manager was evaluated on, and beat compares it with the
+              benchmark over the observations both were evaluated on
     """
+    if racing:
+        return _racing_leaderboard(mgrs=mgrs, xs=xs, n_burn=n_burn, metric=metric, j=j, q=q, verbose=verbose,
+                                   field=field, n_chunk=n_chunk, z=z)
+
     def beating(score, benchmark_score):
         if abs(score-benchmark_score)<1e-8:
             return 0.5
@@ -50,7 +61,11 @@ def manager_stats_leaderboard(mgrs, xs, n_burn=100, metric=var_metric, j=1, q=1.
     lb = list()
     print('Benchmark is '+ mgrs[0].__name__)
     for ndx, mgr in enumerate(mgrs):
-        stats = manager_stats(mgr=mgr, xs=xs, n_burn=n_burn, j=j, q=q, metric=metric, verbose=False)
+        if memoize:
+            from precise.skatertools.resultcache import cached_call
+            stats = cached_call(manager_stats, mgr=mgr, xs=np.asarray(xs, dtype=float), n_burn=n_burn, j=j, q=q, metric=metric, verbose=False)
+        else:
+            stats = manager_stats(mgr=mgr, xs=xs, n_burn=n_burn, j=j, q=q, metric=metric, verbose=False)
         score = stats[field]
         if ndx==0:
             benchmark_score = score
@@ -69,10 +84,36 @@ def manager_stats_leaderboard(mgrs, xs, n_burn=100, metric=var_metric, j=1, q=1.
     return lb
 
 
-def manager_stats(mgr, xs, n_burn=100, metric=var_metric, j=1, q=1.0, verbose=False):
+def _racing_leaderboard(mgrs, xs, n_burn, metric, j, q, verbose, field, n_chunk, z):
+    from precise.skatervaluation.battleutil.racing import race, manager_race_step, race_assessment
+    if field not in ['info', 'mean']:
+        raise ValueError('Racing supports field info or mean')
+    results = race(contestants=mgrs, stepper=manager_race_step, xs=xs, n_burn=n_burn, n_chunk=n_chunk, z=z,
+                   statistic=field, verbose=verbose, metric=metric, j=j, q=q)
+    by_name = dict([(r['name'], r) for r in results])
+    benchmark = by_name[mgrs[0].__name__]
+    lb = list()
+    for r in results:
+        if not r['passing']:
+            continue
+        score = race_assessment(r['scores'], statistic='info') if field == 'info' else float(np.mean(r['scores']))
+        if r is benchmark or not benchmark['passing']:
+            beat = np.nan
+        else:
+            n_common = min(r['n_obs'], benchmark['n_obs'])
+            mine, theirs = (race_assessment(rr['scores'], statistic=field, n_obs=n_common) for rr in (r, benchmark))
+            beat = 0.5 if abs(mine - theirs) < 1e-8 else float(mine > theirs)
+        lb.append((score, r['name'], r['contestant'], beat, r['n_obs']))
+    if verbose:
+        pprint(sorted([(n_obs, score, name) for (score, name, _, _, n_obs) in lb], reverse=True))
+    return lb
+
+
+def manager_stats(mgr, xs, n_burn=100, metric=var_metric, j=1, q=1.0, verbose=False, warm=True):
     """
        Compute manager stats.
        Sends e=-1 during burn-in, then e=1 during assessment period
+       :param warm:  Fast-forward the burn-in with warm_start_manager, rather than stepping
        :returns  dict with  mean, var, kurtosis etc of portfolio returns
     """
     start_time = time.time()
@@ -83,8 +124,13 @@ def manager_stats(mgr, xs, n_burn=100, metric=var_metric, j=1, q=1.0, verbose=Fa
 
     if verbose:
       print('     burning in')
-    for y in xs[:n_burn]:
-        w, s = mgr(s=s, y=y, k=1, e=-1, j=j, q=q)
+    if warm:
+        with profile_section('burn_in'):
+            w, s = warm_start_manager(mgr=mgr, xs=xs[:n_burn], e=-1, j=j, q=q)
+    else:
+        for y in xs[:n_burn]:
+            with profile_section('burn_in'):
+                w, s = mgr(s=s, y=y, k=1, e=-1, j=j, q=q)
 
     if verbose:
         print('        burn in complete', flush=True)
@@ -103,7 +149,8 @@ def manager_stats(mgr, xs, n_burn=100, metric=var_metric, j=1, q=1.0, verbose=Fa
 
         # Make next portfolio selection
         st = time.time()
-        w, s = mgr(s=s, y=y, k=1, e=1, j=j, q=q)
+        with profile_section('manager'):
+            w, s = mgr(s=s, y=y, k=1, e=1, j=j, q=q)
         mrg_time += time.time() - st
 
     total_time = time.time() - start_time
@@ -116,6 +163,18 @@ def manager_stats(mgr, xs, n_burn=100, metric=var_metric, j=1, q=1.0, verbose=Fa
     return metrics
 
 
+def manager_profile(mgr, xs, n_burn=100, allocations=False, j=1, q=1.0):
+    """ Profile a manager, split into burn_in, manager, cov_update, port and nudge sections
+        The burn-in is stepped, so that its per-tick cost shows up
+    :returns pd.DataFrame as per profile_table
+    """
+    with profiling(allocations=allocations):
+        manager_stats(mgr=mgr, xs=xs, n_burn=n_burn, j=j, q=q, warm=False)
+        table = profile_table()
+    table.insert(0, 'manager', mgr.__name__)
+    return table
+
+
 if __name__=='__main__':
     import random
     from precise.skaters.managers.allmanagers import LONG_MANAGERS
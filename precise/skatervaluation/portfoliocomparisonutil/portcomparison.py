@@ -36,7 +36,7 @@ def equity_portfolio_correlation_points_race(n_iter=100,n_top=50, **kwargs):
     return points_race(n_iter=n_iter, n_top=n_top, ranker=m6_equity_portfolio_correlation_rankings, ranker_kwargs=kwargs)
 
 
-def rdps_etf_variance_rankings(ports, n_dim=10, n_obs = 300, k=1, as_frame=True, n_iter=10):
+def rdps_etf_variance_rankings(ports, n_dim=10, n_obs = 300, k=1, as_frame=True, n_iter=10, memoize=False):
     """
         Quick and dirty leave one-out
     """
@@ -45,10 +45,10 @@ def rdps_etf_variance_rankings(ports, n_dim=10, n_obs = 300, k=1, as_frame=True,
     t_obs = int(0.75*n_obs)
     test_cov = np.cov(data[:t_obs] ,rowvar=False)
     train_cov = np.cov(data[t_obs:], rowvar=False)
-    return portfolio_variance_rankings(cov_test=test_cov, ports=ports, cov_train=train_cov, as_frame=as_frame, n_iter=n_iter )
+    return portfolio_variance_rankings(cov_test=test_cov, ports=ports, cov_train=train_cov, as_frame=as_frame, n_iter=n_iter, memoize=memoize )
 
 
-def stock_portfolio_variance_rankings(ports, n_dim=10, n_obs = 300, k=1, as_frame=True, n_iter=10):
+def stock_portfolio_variance_rankings(ports, n_dim=10, n_obs = 300, k=1, as_frame=True, n_iter=10, memoize=False):
     """
         Quick and dirty
     """
@@ -57,10 +57,10 @@ def stock_portfolio_variance_rankings(ports, n_dim=10, n_obs = 300, k=1, as_fram
     t_obs = int(0.75*n_obs)
     test_cov = np.cov(data[:t_obs] ,rowvar=False)
     train_cov = np.cov(data[t_obs:], rowvar=False)
-    return portfolio_variance_rankings(cov_test=test_cov, ports=ports, cov_train=train_cov, as_frame=as_frame, n_iter=n_iter )
+    return portfolio_variance_rankings(cov_test=test_cov, ports=ports, cov_train=train_cov, as_frame=as_frame, n_iter=n_iter, memoize=memoize )
 
 
-def m6_equity_portfolio_variance_rankings(ports, n_dim=10, n_obs = 300, interval='1d', etf=1, as_frame=True, n_iter=10):
+def m6_equity_portfolio_variance_rankings(ports, n_dim=10, n_obs = 300, interval='1d', etf=1, as_frame=True, n_iter=10, memoize=False):
     """
         Quick and dirty
     """
@@ -69,10 +69,10 @@ def m6_equity_portfolio_variance_rankings(ports, n_dim=10, n_obs = 300, interval
     t_obs = int(0.5*n_obs)
     test_cov = np.cov(data[:t_obs] ,rowvar=False)
     train_cov = np.cov(data[t_obs:], rowvar=False)
-    return portfolio_variance_rankings(cov_test=test_cov, ports=ports, cov_train=train_cov, as_frame=as_frame, n_iter=n_iter )
+    return portfolio_variance_rankings(cov_test=test_cov, ports=ports, cov_train=train_cov, as_frame=as_frame, n_iter=n_iter, memoize=memoize )
 
 
-def m6_equity_portfolio_correlation_rankings(ports, n_dim=10, n_obs = 300, interval='1d', etf=1, as_frame=True):
+def m6_equity_portfolio_correlation_rankings(ports, n_dim=10, n_obs = 300, interval='1d', etf=1, as_frame=True, memoize=False):
     """
         Quick and dirty comparison using empirical corrcoef for cov
     """
@@ -85,16 +85,17 @@ def m6_equity_portfolio_correlation_rankings(ports, n_dim=10, n_obs = 300, inter
     ys = np.random.multivariate_normal(mean=np.zeros(n), cov=train_cov_gen, size=50 )
     train_cov = np.cov(ys, rowvar=False)
 
-    return portfolio_variance_rankings(cov_test=test_cov, ports=ports, cov_train=train_cov, as_frame=as_frame )
+    return portfolio_variance_rankings(cov_test=test_cov, ports=ports, cov_train=train_cov, as_frame=as_frame, memoize=memoize )
 
 
-def portfolio_variance_rankings(cov_train, ports, cov_test=None, as_frame=True, n_iter=1):
+def portfolio_variance_rankings(cov_train, ports, cov_test=None, as_frame=True, n_iter=1, memoize=False):
     """  Really crude comparison with single train/test
 
     :param cov_train:    Training cov matrix
     :param ports:        List of portfolio methods
     :param cov_test:
     :param as_frame:
+    :param memoize:      Reuse portfolios computed for the same cov_train. See skatertools.resultcache
     :return:
     """
 
@@ -103,7 +104,11 @@ def portfolio_variance_rankings(cov_train, ports, cov_test=None, as_frame=True,
 
     rankings = list()
     for port in ports:
-        w = port(cov_train)
+        if memoize:
+            from precise.skatertools.resultcache import cached_call
+            w = cached_call(port, cov=np.asarray(cov_train, dtype=float))
+        else:
+            w = port(cov_train)
         try:
             in_var = portfolio_variance(cov=cov_train, w=w)
             out_var = portfolio_variance(cov=cov_test, w=w)
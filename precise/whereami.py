@@ -11,6 +11,9 @@ MANAGER_MANIFEST = os.path.join(ROOT,'LISTING_OF_MANAGERS.md')
 COV_SKATER_MANIFEST = os.path.join(ROOT,'LISTING_OF_COV_SKATERS.md')
 TESTSERROR = os.path.join(ROOT,'testserrors')
 ELO_CSV = os.path.join(TOP,'skatervaluation','battleresults','elo.csv')
+DATA_STORE_DIR = os.environ.get('PRECISE_DATA_STORE', os.path.join(Path.home(), '.precise', 'datastore'))
+BATTLE_STORE = os.environ.get('PRECISE_BATTLE_STORE', os.path.join(DATA_STORE_DIR, 'battleresults.sqlite'))
+RESULT_CACHE_DIR = os.environ.get('PRECISE_RESULT_CACHE', os.path.join(Path.home(), '.precise', 'resultcache'))
 
 def url_from_skater_name(name:str)->str:
     """
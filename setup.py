@@ -43,6 +43,7 @@ setup(
               "precise.skatervaluation.portfoliocomparisonutil",
               "precise.skatervaluation.queues",
               "precise.skatervaluation.battleutil",
+              "precise.skatervaluation.benchmarkutil",
               "precise.skatervaluation.schurcomparisionutil",
               'precise.skatervaluation.battlescripts',
               'precise.skatervaluation.battlescriptscustom',
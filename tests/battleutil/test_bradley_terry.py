@@ -0,0 +1,37 @@
+import numpy as np
+from collections import Counter
+from precise.skatervaluation.battleutil.bradleyterry import win_matrix, bradley_terry, theta_to_elo, bt_elo_ratings, \
+    bootstrap_win_matrices
+
+
+def _simulated_counter(elos, n_games, seed=0):
+    rng = np.random.default_rng(seed)
+    ctn = Counter()
+    names = list(elos)
+    for a in range(len(names)):
+        for b in range(a + 1, len(names)):
+            p = 1 / (1 + 10 ** ((elos[names[b]] - elos[names[a]]) / 400))
+            wins = rng.binomial(n_games, p)
+            ctn[names[a] + '>' + names[b]] += wins
+            ctn[names[b] + '>' + names[a]] += n_games - wins
+    return ctn
+
+
+def test_recovers_elo_differences():
+    elos = dict([('c' + str(i), 1500 + 40 * (i - 5)) for i in range(11)])
+    df = bt_elo_ratings(_simulated_counter(elos, n_games=400), n_bootstrap=100)
+    fitted = dict(zip(df['strategy'], df['elo']))
+    assert all(abs(fitted[c] - elos[c]) < 25 for c in elos)
+    assert (df['elo_lo'] <= df['elo']).all() and (df['elo'] <= df['elo_hi']).all()
+    assert list(df['strategy'][:3]) == ['c10', 'c9', 'c8']
+
+
+def test_batched_matches_individual_and_undefeated_is_finite():
+    names, W = win_matrix({'a>b': 5, 'b>c': 3, 'c>b': 1, 'a>c': 2})
+    theta = bradley_terry(W)
+    assert np.all(np.isfinite(theta)) and abs(np.sum(theta)) < 1e-9
+    assert theta_to_elo(theta)[names.index('a')] > 1500
+    Ws = bootstrap_win_matrices(W, n_bootstrap=3, seed=1)
+    assert np.allclose(Ws + np.swapaxes(Ws, 1, 2), W + W.T)
+    thetas = bradley_terry(Ws)
+    assert np.allclose(thetas, np.array([bradley_terry(Wb) for Wb in Ws]), atol=1e-6)
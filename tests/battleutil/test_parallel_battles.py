@@ -0,0 +1,67 @@
+import numpy as np
+from precise.skatervaluation.battleutil.parallelbattles import parallel_generic_battle, _assess_shared, _to_shared_memory
+
+
+def fake_data(params:dict):
+    params = dict(params)
+    params.update({'n_obs':50, 'n_burn':10, 'lb':-1000, 'ub':1000})
+    return params, 'fake', np.random.randn(params['n_obs'], 3)
+
+
+def fake_evaluator(contestant, xs, n_burn, lb, ub):
+    return contestant(xs), {'time':0.01}
+
+
+def steady(xs):
+    return float(np.sum(xs))
+
+
+def noisy(xs):
+    return float(np.sum(xs)) + 10*np.random.randn()
+
+
+def flaky(xs):
+    raise ValueError('Always fails')
+
+
+def test_parallel_battle(tmp_path):
+    results = list()
+    for _ in range(2):
+        battles, timing, reliability, failures = parallel_generic_battle(contestants=[steady, noisy, flaky], evaluator=fake_evaluator,
+                                                                         params={}, n_workers=2, n_battles=3, seed=17, n_rounds=2,
+                                                                         data_func=fake_data, results_dir=str(tmp_path))
+        results.append(battles)
+    assert sum(results[0].values()) == 6
+    assert results[0] == results[1]     # Deterministic seeding of the noisy contestant
+    assert reliability['flaky']['mean'] == 0
+    assert 'flaky' in failures
+    assert set(timing) == {'steady', 'noisy'}
+
+
+def test_seeded_data_draws(tmp_path):
+    draws = list()
+
+    def recorded_data(params:dict):
+        params, category, xs = fake_data(params)
+        draws.append(xs)
+        return params, category, xs
+
+    for _ in range(2):
+        parallel_generic_battle(contestants=[steady, noisy], evaluator=fake_evaluator, params={}, n_workers=2, n_battles=2,
+                                seed=5, n_rounds=1, data_func=recorded_data, results_dir=str(tmp_path))
+    # One draw to test the data source, then one per battle
+    assert len(draws) == 6
+    assert all(np.array_equal(a, b) for a, b in zip(draws[:3][1:], draws[3:][1:]))
+
+
+def test_assess_pickled_or_shared():
+    xs = np.random.randn(20, 3)
+    block, name = _to_shared_memory(xs)
+    try:
+        shared = _assess_shared(steady, fake_evaluator, name, np.shape(xs), 5, -1000, 1000, 1)
+    finally:
+        if block is not None:
+            block.close()
+            block.unlink()
+    pickled = _assess_shared(steady, fake_evaluator, xs, np.shape(xs), 5, -1000, 1000, 1)
+    assert shared[0] == pickled[0] == steady(xs)
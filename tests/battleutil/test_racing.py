@@ -0,0 +1,50 @@
+import numpy as np
+from collections import Counter
+from precise.skaters.covariance.ewaemp import ewa_emp_pcov_d0_r05
+from precise.skaters.covariance.runemp import run_emp_pcov_d0
+from precise.skaters.covariance.identity import identity_scov
+import os
+from precise.skaters.covarianceutil.likelihood import cov_likelihood
+from precise.skatervaluation.battleutil.racing import race, cov_likelihood_race_step, race_dominated, tally_race, \
+    RACE_CATEGORY_SUFFIX
+from precise.skatervaluation.battleutil.parallelbattles import battle_setup
+
+
+def broken_skater(y, s, k=1, e=1):
+    if e > 0:
+        raise ValueError('broken')
+    return y, np.eye(len(y)), s
+
+
+def test_race_drops_bad_skater_early():
+    np.random.seed(3)
+    xs = 0.01 * np.random.randn(600, 3) * np.array([1, 2, 3])
+    results = race(contestants=[run_emp_pcov_d0, ewa_emp_pcov_d0_r05, identity_scov, broken_skater],
+                   stepper=cov_likelihood_race_step, xs=xs, n_burn=50, n_chunk=50)
+    by_name = dict([(r['name'], r) for r in results])
+    assert by_name['run_emp_pcov_d0']['survivor']
+    assert by_name['run_emp_pcov_d0']['n_obs'] == max(r['n_obs'] for r in results)
+    assert not by_name['identity_scov']['survivor'] and by_name['identity_scov']['n_obs'] == 50
+    assert by_name['broken_skater']['passing'] == 0
+    assert results[0]['survivor']
+
+    battles = Counter()
+    tally_race(results=results, battles=battles, timing={}, reliability={}, failures={}, atol=1.0, worst_assessment_seen=1e6)
+    assert battles['run_emp_pcov_d0>identity_scov'] == 1 and battles['ewa_emp_pcov_d0_r05>identity_scov'] == 1
+
+
+def test_dominance():
+    scores = np.random.randn(3, 400) + np.array([[0.], [0.05], [-1.]])
+    assert list(race_dominated(scores, statistic='mean')) == [False, False, True]
+    assert race_dominated(scores, statistic='info')[2]
+
+
+def test_racing_results_kept_apart(tmp_path):
+    def fake_data(params:dict):
+        return params, 'fake', np.random.randn(50, 3)
+    _, _, queue = battle_setup(contestants=[run_emp_pcov_d0], evaluator=cov_likelihood, params={}, data_func=fake_data,
+                               results_dir=str(tmp_path))
+    _, _, race_queue = battle_setup(contestants=[run_emp_pcov_d0], evaluator=cov_likelihood, params={},
+                                    data_func=fake_data, results_dir=str(tmp_path), category_suffix=RACE_CATEGORY_SUFFIX)
+    assert os.path.basename(os.path.dirname(queue)) == 'fake'
+    assert os.path.basename(os.path.dirname(race_queue)) == 'fake' + RACE_CATEGORY_SUFFIX
@@ -0,0 +1,87 @@
+import os
+import json
+import sqlite3
+import tempfile
+from precise.skatervaluation.battleutil.resultstore import connect_store, sync_win_files, category_win_counts, load_ratings
+from precise.skatervaluation.battleutil.compilingeloratings import elo_from_store
+
+
+def _write(results_dir, category, name, data):
+    os.makedirs(os.path.join(results_dir, 'g', category), exist_ok=True)
+    fn = os.path.join(results_dir, 'g', category, name + '.json')
+    with open(fn, 'wt') as fh:
+        json.dump(data, fh)
+    return fn
+
+
+def test_incremental_elo():
+    with tempfile.TemporaryDirectory() as results_dir:
+        con = connect_store(':memory:')
+        _write(results_dir, 'stocks', 'a', {'good>bad': 20.0, 'good>ok': 5.0})
+        _write(results_dir, 'stocks', 'b', {'ok>bad': 10.0})
+        assert sync_win_files(con, genre='g', results_dir=results_dir) == {'stocks': 2}
+        assert sync_win_files(con, genre='g', results_dir=results_dir) == {}
+        assert category_win_counts(con, genre='g', category='stocks') == {'good>bad': 20.0, 'good>ok': 5.0, 'ok>bad': 10.0}
+
+        [(cat, elo)] = elo_from_store(genre='g', k=10, store=con, results_dir=results_dir)
+        assert cat == 'stocks' and elo['good'] > elo['ok'] > elo['bad']
+        stored, ingest_id = load_ratings(con, genre='g', category='stocks', k=10)
+        assert ingest_id == 2 and stored == dict(elo)
+
+        # Only the new file is replayed
+        _write(results_dir, 'stocks', 'c', {'bad>good': 1.0})
+        [(_, elo_after)] = elo_from_store(genre='g', k=10, store=con, results_dir=results_dir)
+        assert elo_after['bad'] > elo['bad'] and elo_after['ok'] == elo['ok']
+        assert load_ratings(con, genre='g', category='stocks', k=10)[1] == 3
+
+        # Deleting a file drops it from the aggregate and resets ratings for the category
+        os.remove(os.path.join(results_dir, 'g', 'stocks', 'a.json'))
+        sync_win_files(con, genre='g', results_dir=results_dir)
+        assert category_win_counts(con, genre='g', category='stocks') == {'ok>bad': 10.0, 'bad>good': 1.0}
+        assert load_ratings(con, genre='g', category='stocks', k=10) == ({}, 0)
+
+
+def test_rewritten_and_partial_files():
+    with tempfile.TemporaryDirectory() as results_dir:
+        con = connect_store(':memory:')
+        fn = _write(results_dir, 'stocks', 'a', {'good>bad': 2.0})
+        elo_from_store(genre='g', k=10, store=con, results_dir=results_dir)
+
+        # A battle rewrites its file with cumulative counts. Only the two extra games are replayed.
+        _write(results_dir, 'stocks', 'a', {'good>bad': 4.0, 'ok>bad': 1.0})
+        os.utime(fn, ns=(1, 1))
+        assert sync_win_files(con, genre='g', results_dir=results_dir) == {'stocks': 1}
+        assert category_win_counts(con, genre='g', category='stocks') == {'good>bad': 4.0, 'ok>bad': 1.0}
+        added = con.execute('SELECT winner, loser, SUM(count) FROM battles b JOIN ingests i ON b.ingest_id=i.id '
+                              'WHERE i.id=2 GROUP BY winner, loser').fetchall()
+        assert sorted(added) == [('good', 'bad', 2.0), ('ok', 'bad', 1.0)]
+
+        # A half written file is skipped, and read once complete
+        with open(fn, 'wt') as fh:
+            fh.write('{"good>bad": 5.0, "ok>b')
+        assert sync_win_files(con, genre='g', results_dir=results_dir) == {}
+        _write(results_dir, 'stocks', 'a', {'good>bad': 5.0, 'ok>bad': 1.0})
+        os.utime(fn, ns=(2, 2))
+        assert sync_win_files(con, genre='g', results_dir=results_dir) == {'stocks': 1}
+        assert category_win_counts(con, genre='g', category='stocks') == {'good>bad': 5.0, 'ok>bad': 1.0}
+
+        # Counts going down resets ratings
+        elo_from_store(genre='g', k=10, store=con, results_dir=results_dir)
+        _write(results_dir, 'stocks', 'a', {'good>bad': 1.0})
+        os.utime(fn, ns=(3, 3))
+        sync_win_files(con, genre='g', results_dir=results_dir)
+        assert category_win_counts(con, genre='g', category='stocks') == {'good>bad': 1.0}
+        assert load_ratings(con, genre='g', category='stocks', k=10) == ({}, 0)
+
+
+def test_old_store_is_rebuilt():
+    with tempfile.TemporaryDirectory() as tmp:
+        fn = os.path.join(tmp, 'store.sqlite')
+        con = sqlite3.connect(fn)
+        con.execute('CREATE TABLE files (id INTEGER PRIMARY KEY AUTOINCREMENT, genre TEXT, category TEXT, path TEXT UNIQUE)')
+        con.commit()
+        con.close()
+        con = connect_store(fn)
+        columns = [row[1] for row in con.execute('PRAGMA table_info(files)')]
+        assert 'mtime_ns' in columns
+        con.close()
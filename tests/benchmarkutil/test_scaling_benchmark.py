@@ -0,0 +1,41 @@
+import os
+import tempfile
+import tracemalloc
+from precise.skaters.covariance.ewaemp import ewa_emp_pcov_d0_r05
+from precise.skaters.covariance.runemp import run_emp_pcov_d0
+from precise.skatervaluation.benchmarkutil.scalingbenchmark import scaling_benchmark, save_baseline, load_baseline, compare_to_baseline, \
+    benchmark_run
+
+
+def test_scaling_benchmark_round_trip():
+    report = scaling_benchmark(contestants=[ewa_emp_pcov_d0_r05, run_emp_pcov_d0], n_dims=[3, 6, 12], n_obs=[20], verbose=False)
+    assert len(report['results']) == 6
+    assert all(not row['error'] and row['peak_mb'] >= 0 for row in report['results'])
+    assert set(report['exponents']) == {'ewa_emp_pcov_d0_r05', 'run_emp_pcov_d0'}
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, 'baseline.json')
+        save_baseline(report, filename)
+        baseline = load_baseline(filename)
+    assert compare_to_baseline(report=report, baseline=baseline) == []
+
+    slower = dict(baseline, results=[dict(row, tick_ms_median=row['tick_ms_median'] / 10) for row in baseline['results']])
+    regressions = compare_to_baseline(report=report, baseline=slower, min_ms=0)
+    assert len(regressions) == 6 and all(r['ratio'] > 9 for r in regressions)
+
+
+def test_slow_runs_skip_larger_dims():
+    report = scaling_benchmark(contestants=[run_emp_pcov_d0], n_dims=[12, 3, 6], n_obs=[10], max_seconds=0., memory=False, verbose=False)
+    assert [row['n_dim'] for row in report['results']] == [3]
+
+
+def test_ticks_are_timed_untraced():
+    traced = list()
+
+    def recording_skater(y, s, k=1, e=1):
+        traced.append(tracemalloc.is_tracing())
+        return run_emp_pcov_d0(y=y, s=s, k=k, e=e)
+
+    xs = [[0.1, 0.2], [0.3, -0.1], [0.0, 0.2], [-0.2, 0.1]]
+    row = benchmark_run(f=recording_skater, xs=xs, memory=True)
+    assert traced == [False] * 4 + [True] * 4
+    assert row['peak_mb'] >= 0 and not tracemalloc.is_tracing()
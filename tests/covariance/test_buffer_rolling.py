@@ -0,0 +1,19 @@
+import numpy as np
+from precise.skaters.covariance.buffactory import buf_mean_and_pcov
+from precise.skaters.covarianceutil.datafunctions import data_population_covariance
+
+
+def test_rolling_matches_window():
+    xs = np.random.randn(300, 5)
+    xs[120, 2] = np.nan
+    for n_buffer, n_anchor in [(1, None), (7, None), (50, 1000)]:
+        s = {}
+        for k, x in enumerate(xs):
+            s = buf_mean_and_pcov(s=s, x=x, n_buffer=n_buffer, n_anchor=n_anchor)
+            window = xs[max(0, k - n_buffer + 1):k + 1]
+            assert np.allclose(s['mean'], np.nanmean(window, axis=0), equal_nan=True)
+            assert np.allclose(s['pcov'], data_population_covariance(window), equal_nan=True)
+
+
+if __name__=='__main__':
+    test_rolling_matches_window()
@@ -0,0 +1,21 @@
+import numpy as np
+from precise.skaters.covariance.ewaempfactory import ewa_emp_pcov_factory
+from precise.skaters.covariance.ewaemppanelfactory import ewa_emp_pcov_panel_factory
+
+
+def test_panel_matches_individual_streams():
+    n_streams, n_dim, n_obs = 4, 3, 60
+    xs = np.random.randn(n_obs, n_streams, n_dim)
+    r = 0.1
+    s_panel = {}
+    s_streams = [{} for _ in range(n_streams)]
+    for ys in xs:
+        x_panel, x_cov_panel, s_panel = ewa_emp_pcov_panel_factory(ys=ys, s=s_panel, r=r)
+        for j in range(n_streams):
+            x, x_cov, s_streams[j] = ewa_emp_pcov_factory(y=ys[j], s=s_streams[j], r=r)
+            assert np.allclose(x, x_panel[j])
+            assert np.allclose(x_cov, x_cov_panel[j])
+
+
+if __name__=='__main__':
+    test_panel_matches_individual_streams()
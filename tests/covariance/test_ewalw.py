@@ -0,0 +1,39 @@
+import numpy as np
+from sklearn.covariance import ledoit_wolf_shrinkage
+from precise.skaters.covariance.ewalwfactory import lw_ema_scov
+
+
+def test_lw_matches_batch_during_burn_in():
+    n_dim = 7
+    xs = 0.1 + np.dot(np.random.randn(150, n_dim), np.random.randn(n_dim, n_dim))
+    s = {}
+    for t, x in enumerate(xs):
+        s = lw_ema_scov(s=s, x=x, r=0.005)
+        if t >= 3:
+            assert abs(s['lmbd'] - ledoit_wolf_shrinkage(xs[:t + 1])) < 1e-8
+
+
+def test_lw_is_buffer_free():
+    xs = np.random.randn(500, 5)
+    s = {}
+    for x in xs:
+        s = lw_ema_scov(s=s, x=x, r=0.05)
+    assert 'buffer' not in s
+    assert 0 <= s['lmbd'] <= 1
+
+
+def test_lw_matches_batch_when_stationary():
+    # After burn-in the weights decay, so compare with batch LW on the trailing 2/r observations, within 10%
+    np.random.seed(0)
+    n_dim, r = 7, 0.005
+    xs = 0.1 + np.dot(np.random.randn(3000, n_dim), np.random.randn(n_dim, n_dim))
+    s = {}
+    for x in xs:
+        s = lw_ema_scov(s=s, x=x, r=r)
+    batch = ledoit_wolf_shrinkage(xs[-int(2 / r):])
+    assert abs(s['lmbd'] - batch) < 0.1 * batch
+
+
+if __name__=='__main__':
+    test_lw_matches_batch_during_burn_in()
+    test_lw_matches_batch_when_stationary()
@@ -0,0 +1,76 @@
+import numpy as np
+import os
+import sys
+import tempfile
+import subprocess
+from precise.skaters.covariance.ewalzfactory import lz_factory, sparse_lz_factory, _trim_adjacency, lz_resolve, lz_shutdown
+from precise.skaters.covarianceutil.statecheckpoint import save_states, load_states
+from precise.skaters.covariance.ewaemp import ewa_emp_pcov_factory
+from precise.skatertools.syntheticdata.factor import create_disjoint_factor_dataset
+
+
+def test_sparse_lz_matches_lz():
+    data = create_disjoint_factor_dataset(n=300, n_dims=[5,3,3,3,2,2])
+    s1, s2 = {}, {}
+    for y in data:
+        _, cov1, s1 = lz_factory(y=y, s=s1, n_epoch=50, f_local=ewa_emp_pcov_factory, f_global=ewa_emp_pcov_factory,
+                                 f_global_kwargs={'r':0.005}, f_local_kwargs={'r':0.02})
+        _, cov2, s2 = sparse_lz_factory(y=y, s=s2, n_epoch=50, f_global=ewa_emp_pcov_factory,
+                                        f_global_kwargs={'r':0.005}, rl=0.02)
+        assert np.allclose(cov1, cov2)
+
+
+def test_sparse_lz_background_is_deterministic():
+    data = create_disjoint_factor_dataset(n=200, n_dims=[4,4,3,3])
+    covs = list()
+    for _ in range(2):
+        s = {}
+        for y in data:
+            _, cov, s = sparse_lz_factory(y=y, s=s, n_epoch=40, rl=0.02, background='thread')
+        covs.append(cov)
+    assert np.allclose(covs[0], covs[1])
+    assert (np.diag(covs[0]) >= 0).all()
+
+
+def test_sparse_lz_resolved_state_can_be_checkpointed():
+    data = create_disjoint_factor_dataset(n=200, n_dims=[4,4,3,3])
+    s = {}
+    for y in data[:130]:
+        _, cov, s = sparse_lz_factory(y=y, s=s, n_epoch=40, rl=0.02, background='thread')
+    s = lz_resolve(s)
+    assert isinstance(s['pending'], dict)
+    with tempfile.TemporaryDirectory() as tmp:
+        fn = os.path.join(tmp, 'lz.npz')
+        save_states(fn, [s])
+        (s_restored,) = load_states(fn)
+    for y in data[130:]:
+        _, cov, s = sparse_lz_factory(y=y, s=s, n_epoch=40, rl=0.02, background='thread')
+        _, cov_restored, s_restored = sparse_lz_factory(y=y, s=s_restored, n_epoch=40, rl=0.02, background='thread')
+        assert np.allclose(cov, cov_restored)
+    lz_shutdown()
+
+
+def test_background_pools_shut_down_at_exit():
+    script = ('import atexit\n'
+              'import numpy as np\n'
+              'from precise.skaters.covariance.ewalzfactory import sparse_lz_factory, LZ_EXECUTORS\n'
+              's = {}\n'
+              'for y in np.random.randn(50, 4):\n'
+              '    _, _, s = sparse_lz_factory(y=y, s=s, n_epoch=20, background="process")\n'
+              'pools = list(LZ_EXECUTORS.values())\n'
+              'atexit._run_exitfuncs()\n'
+              'print(len(pools), len(LZ_EXECUTORS), all(p._shutdown_thread for p in pools))\n')
+    out = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, timeout=60)
+    assert out.returncode == 0, out.stderr
+    assert out.stdout.split() == ['1', '0', 'True']
+
+
+def test_trim_adjacency():
+    cov = np.cov(np.random.randn(50, 8).T)
+    adj = _trim_adjacency(adj=np.ones((8, 8), dtype=bool), cov=cov, max_nbrs=3)
+    assert (np.sum(adj, axis=0) == 3).all()
+    assert np.diag(adj).all()
+
+
+if __name__=='__main__':
+    test_sparse_lz_matches_lz()
@@ -0,0 +1,32 @@
+import numpy as np
+from precise.skaters.covariance.ewapmfactory import _partial_ema_scov_init, _partial_ema_scov_update, QUADRANTS
+from precise.skaters.covariance.ewaempfactory import _ema_scov_init, _ema_scov_update
+
+
+def _quadrant_by_quadrant(xs, r, target):
+    # Reference: one _ema_scov_update per quadrant
+    n_dim = xs.shape[1]
+    qs = dict([(q, _ema_scov_init(n_dim=n_dim, r=r)) for q in QUADRANTS])
+    for x in xs:
+        for q, (w, sgn1, sgn2) in QUADRANTS.items():
+            x1 = sgn1 * np.maximum((x - target) * sgn1, 0)
+            x2 = sgn2 * np.maximum((x - target) * sgn2, 0)
+            qs[q] = _ema_scov_update(qs[q], x=x1, r=r, target=0, y=x2)
+    return np.array([qs[q]['scov'] for q in QUADRANTS])
+
+
+def test_fused_matches_quadrant_loop():
+    xs = np.random.randn(60, 4)
+    target = np.random.randn(4) / 10
+    r = 0.05
+    for in_place in [False, True]:
+        s = _partial_ema_scov_init(n_dim=4, r=r, target=target)
+        for x in xs:
+            s = _partial_ema_scov_update(s=s, x=x, r=r, in_place=in_place)
+        qscov = _quadrant_by_quadrant(xs=xs, r=r, target=target)
+        assert np.allclose(s['qscov'], qscov)
+        assert np.allclose(s['scov'], np.sum(qscov, axis=0))
+
+
+if __name__=='__main__':
+    test_fused_matches_quadrant_loop()
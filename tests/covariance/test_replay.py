@@ -0,0 +1,55 @@
+import numpy as np
+import os
+import tempfile
+from precise.skaters.covariance.replay import replay, replay_by_stepping, replay_ewa_pm, REPLAYABLE
+from precise.skaters.covariance.ewapmfactory import ewa_pm_factory
+from precise.skaters.covariance.bufemp import buf_emp_pcov_d0_n20
+from precise.skaters.covarianceutil.likelihood import cov_skater_loglikelihood
+
+
+def _stepped(f, xs):
+    n_obs, n_dim = np.shape(xs)
+    return replay_by_stepping(f=f, xs=xs, x=np.empty((n_obs, n_dim)), x_cov=np.empty((n_obs, n_dim, n_dim)))
+
+
+def test_replay_matches_stepping():
+    xs = np.random.randn(400, 3) + 0.5
+    for f in REPLAYABLE:
+        x, x_cov = replay(f=f, xs=xs)
+        x_step, x_cov_step = _stepped(f=f, xs=xs)
+        assert np.allclose(x, x_step), f.__name__
+        assert np.allclose(x_cov, x_cov_step), f.__name__
+
+
+def test_replay_pm_running_target():
+    xs = np.random.randn(150, 4)
+    f = lambda s, y, k=1, e=1: ewa_pm_factory(s=s, y=y, k=k, r=0.05, target=None)
+    x_step, x_cov_step = _stepped(f=f, xs=xs)
+    x, x_cov = replay_ewa_pm(xs=xs, x=np.empty((150, 4)), x_cov=np.empty((150, 4, 4)), r=0.05, target=None)
+    assert np.allclose(x, x_step)
+    assert np.allclose(x_cov, x_cov_step)
+
+
+def test_replay_memmap_fallback():
+    xs = np.random.randn(30, 3)
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, 'x_cov.npy')
+        x, x_cov = replay(f=buf_emp_pcov_d0_n20, xs=xs, filename=filename)
+        x_step, x_cov_step = _stepped(f=buf_emp_pcov_d0_n20, xs=xs)
+        assert np.allclose(np.load(filename), x_cov_step)
+        del x_cov
+
+
+def test_bulk_likelihood_matches_stepping():
+    xs = np.random.randn(600, 3) + 0.5
+    for f in REPLAYABLE:
+        ll, _ = cov_skater_loglikelihood(f=f, xs=xs, n_burn=20, verbose=False)
+        ll_step, _ = cov_skater_loglikelihood(f=f, xs=xs, n_burn=20, verbose=False, bulk=False)
+        assert abs(ll - ll_step) < 1e-6 * max(1, abs(ll_step)), f.__name__
+
+
+if __name__=='__main__':
+    test_replay_matches_stepping()
+    test_replay_pm_running_target()
+    test_replay_memmap_fallback()
+    test_bulk_likelihood_matches_stepping()
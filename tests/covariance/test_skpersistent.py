@@ -0,0 +1,49 @@
+import numpy as np
+import warnings
+from sklearn.covariance import empirical_covariance
+from precise.skaters.covariance.bufskfactory import gl_solve
+from precise.skaters.covariance.bufsk import buf_sk_glcv_pcov_d0_n100_j5, buf_sk_gl_pcov_d0_n100_j5, BUF_SK_D0_SKATERS
+from precise.skatertools.syntheticdata.miscellaneous import create_correlated_dataset
+
+
+def test_persistent_sk_refits_every_j():
+    data = create_correlated_dataset(120, (2.2, 4.4, 1.5), np.array([[0.2, 0.5, 0.7],[0.3, 0.2, 0.2],[0.5,0.3,0.1]]), (1, 5, 3))
+    for f, n_emp in [(buf_sk_glcv_pcov_d0_n100_j5, 30), (buf_sk_gl_pcov_d0_n100_j5, 50)]:
+        s = {}
+        prev_cov = None
+        changed = list()
+        for t, y in enumerate(data):
+            x, x_cov, s = f(s=s, y=y, k=1)
+            assert (np.diag(x_cov) >= 0).all()
+            if prev_cov is not None and not np.allclose(prev_cov, x_cov):
+                changed.append(t)
+            prev_cov = x_cov
+        # Every observation during warm-up, then exactly every 5th
+        expected = list(range(1, n_emp)) + list(range(n_emp - 1, len(data), 5))[1:]
+        assert changed == expected
+        assert s['sk']['n_fit'] == len(range(n_emp - 1, len(data), 5))
+
+
+def test_persistent_sk_not_in_d0_list():
+    assert all('_j5' not in f.__name__ for f in BUF_SK_D0_SKATERS)
+
+
+def test_warm_started_gl_takes_fewer_iterations():
+    np.random.seed(1)
+    xs = np.random.randn(200, 8) @ (0.4 * np.random.randn(8, 8) + np.eye(8))
+    n_cold, n_warm = 0, 0
+    pcov = None
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        for t in range(30):
+            emp_cov = empirical_covariance(xs[t:t + 100])
+            n_cold += gl_solve(emp_cov=emp_cov, alpha=0.1, tol=1e-3, enet_tol=1e-7)[1]
+            pcov, n_iter = gl_solve(emp_cov=emp_cov, alpha=0.1, cov_init=pcov, tol=1e-3, enet_tol=1e-7)
+            n_warm += n_iter
+    assert n_warm < n_cold
+
+
+if __name__=='__main__':
+    test_persistent_sk_refits_every_j()
+    test_persistent_sk_not_in_d0_list()
+    test_warm_started_gl_takes_fewer_iterations()
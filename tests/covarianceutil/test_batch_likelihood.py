@@ -0,0 +1,41 @@
+import numpy as np
+from precise.skaters.covarianceutil.likelihood import batch_log_likelihood, vector_log_likelihood
+
+
+def _one_at_a_time(covs, ys, lb, ub):
+    lls = list()
+    for cov, y in zip(covs, ys):
+        try:
+            pre = np.linalg.inv(cov)
+        except np.linalg.LinAlgError:
+            pre = np.linalg.pinv(cov)
+        lls.append(min(vector_log_likelihood(pre=pre, y=y, lb=lb), ub))
+    return np.array(lls)
+
+
+def test_batch_matches_one_at_a_time():
+    n_dim = 5
+    a = np.random.randn(20, n_dim, n_dim)
+    covs = np.einsum('tij,tkj->tik', a, a) + 0.1 * np.eye(n_dim)
+    covs[3] = np.zeros((n_dim, n_dim))                 # Singular
+    covs[7] = np.diag([1., 1., -1., 1., 1.])           # Indefinite
+    covs[11] = 1e-6 * np.eye(n_dim)                    # Likelihood clipped by ub
+    ys = np.random.randn(20, n_dim)
+    ys[11] = 0
+    lls = batch_log_likelihood(covs=covs, ys=ys, lb=-1000, ub=20)
+    assert np.allclose(lls, _one_at_a_time(covs=covs, ys=ys, lb=-1000, ub=20))
+    assert lls[3] == -1000 and lls[7] == -1000 and lls[11] == 20
+
+
+def test_batch_uses_known_factors():
+    n_dim = 4
+    a = np.random.randn(6, n_dim, n_dim)
+    covs = np.einsum('tij,tkj->tik', a, a) + np.eye(n_dim)
+    ys = np.random.randn(6, n_dim)
+    chols = [np.linalg.cholesky(cov) if t % 2 else None for t, cov in enumerate(covs)]
+    assert np.allclose(batch_log_likelihood(covs=covs, ys=ys, lb=-1000, chols=chols),
+                       batch_log_likelihood(covs=covs, ys=ys, lb=-1000))
+
+
+if __name__=='__main__':
+    test_batch_matches_one_at_a_time()
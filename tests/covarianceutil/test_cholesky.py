@@ -0,0 +1,67 @@
+import numpy as np
+from scipy.linalg import solve_triangular
+from precise.skaters.covarianceutil.cholesky import cholesky_rank_one_update, cholesky_rank_one_downdate, batch_forward_substitution
+from precise.skaters.covarianceutil.likelihood import cov_skater_loglikelihood
+from precise.skaters.covariance.ewaempfactory import ewa_emp_pcov_factory, _ema_scov_update
+from precise.skaters.covariance.runempfactory import emp_pcov
+
+
+def test_rank_one_update_and_downdate():
+    a = np.cov(np.random.randn(20, 5), rowvar=False)
+    v = np.random.randn(5)
+    L = np.linalg.cholesky(a)
+    L_up = cholesky_rank_one_update(L, v)
+    assert np.allclose(np.dot(L_up, L_up.T), a + np.outer(v, v))
+    L_down = cholesky_rank_one_downdate(L_up, v)
+    assert np.allclose(L_down, L)
+
+
+def test_batch_forward_substitution():
+    a = np.random.randn(6, 4, 4)
+    L = np.linalg.cholesky(np.einsum('tij,tkj->tik', a, a) + np.eye(4))
+    b = np.random.randn(6, 4)
+    z = batch_forward_substitution(L, b)
+    assert np.allclose(z, [solve_triangular(Lt, bt, lower=True) for Lt, bt in zip(L, b)])
+
+
+def test_tracked_factor():
+    xs = np.random.randn(200, 4)
+    s_emp = {}
+    s_ewa = {}
+    for x in xs:
+        s_emp = emp_pcov(s=s_emp, x=x, with_chol=True)
+        _, x_cov, s_ewa = ewa_emp_pcov_factory(y=x, s=s_ewa, r=0.05, with_chol=True)
+    for s in [s_emp, s_ewa]:
+        L = s['pcov_chol']
+        assert np.allclose(np.dot(L, L.T), s['pcov'])
+
+
+def test_cross_term_drops_factor():
+    s = {}
+    for x in np.random.randn(50, 3):
+        _, _, s = ewa_emp_pcov_factory(y=x, s=s, r=0.05, with_chol=True)
+    assert s['pcov_chol'] is not None
+    s = _ema_scov_update(s=s, x=np.random.randn(3), y=np.random.randn(3))
+    assert s['pcov_chol'] is None
+
+
+def test_likelihood_with_factor():
+    xs = np.random.randn(150, 3)
+
+    def f(y, s, k=1, e=1):
+        return ewa_emp_pcov_factory(y=y, s=s, k=k, r=0.05)
+
+    def f_chol(y, s, k=1, e=1):
+        return ewa_emp_pcov_factory(y=y, s=s, k=k, r=0.05, with_chol=True)
+
+    ll, _ = cov_skater_loglikelihood(f=f, xs=xs, n_burn=20, verbose=False)
+    ll_chol, _ = cov_skater_loglikelihood(f=f_chol, xs=xs, n_burn=20, verbose=False)
+    assert np.isclose(ll, ll_chol)
+
+
+if __name__=='__main__':
+    test_rank_one_update_and_downdate()
+    test_batch_forward_substitution()
+    test_tracked_factor()
+    test_cross_term_drops_factor()
+    test_likelihood_with_factor()
@@ -0,0 +1,32 @@
+import numpy as np
+from precise.skaters.covarianceutil.ringbuffer import ring_init, ring_append, ring_view, ring_oldest
+from precise.skaters.covariance.buffactory import buf_mean_and_pcov
+
+
+def test_ring_view_is_chronological_window():
+    xs = np.random.randn(50, 3)
+    for n_buffer in [1, 5, 7]:
+        s = ring_init(n_buffer=n_buffer)
+        for k, x in enumerate(xs):
+            oldest = ring_oldest(s)
+            if k >= n_buffer:
+                assert np.allclose(oldest, xs[k - n_buffer])
+            s = ring_append(s=s, x=x)
+            assert np.allclose(ring_view(s), xs[max(0, k - n_buffer + 1):k + 1])
+
+
+def test_buf_mean_and_pcov_window():
+    xs = np.random.randn(40, 4)
+    n_buffer = 10
+    s = {}
+    for k, x in enumerate(xs):
+        s = buf_mean_and_pcov(s=s, x=x, n_buffer=n_buffer)
+        window = xs[max(0, k - n_buffer + 1):k + 1]
+        assert np.allclose(s['mean'], np.mean(window, axis=0))
+        if k >= 1:
+            assert np.allclose(s['pcov'], np.cov(window, rowvar=False, bias=True))
+
+
+if __name__=='__main__':
+    test_ring_view_is_chronological_window()
+    test_buf_mean_and_pcov_window()
@@ -0,0 +1,49 @@
+import numpy as np
+import os
+import tempfile
+from precise.skaters.covarianceutil.statecheckpoint import save_states, load_states, state_to_arrays, arrays_to_state
+from precise.skaters.covariance.ewaemp import ewa_emp_pcov_d0_r05
+from precise.skaters.covariance.ewapm import ewa_pm_emp_scov_r02_n50
+from precise.skaters.covariance.bufemp import buf_emp_pcov_d0_n20
+from precise.skaters.covariance.ewaemp import ewa_emp_pcov_d1_r05
+
+
+def test_round_trip_of_mixed_state():
+    s = {'a':np.random.randn(3, 3), 'n':5, 'r':0.1, 'flag':True, 'name':'x', 'none':None, 1:[1, 2, 3],
+         'w':[0.1, 0.9], 'shape':(3, 3), 'buffer':[np.ones(3), np.zeros(3)], 'nested':{'b':[{'c':1.5}, 'd']}}
+    schema, arrays = state_to_arrays(s)
+    s_back = arrays_to_state(schema, arrays)
+    assert s_back.keys() == s.keys()
+    assert np.allclose(s_back['a'], s['a'])
+    for key in ['n', 'r', 'flag', 'name', 'none', 1, 'w', 'shape', 'nested']:
+        assert s_back[key] == s[key]
+    assert np.allclose(np.array(s_back['buffer']), np.array(s['buffer']))
+
+
+def test_checkpoint_and_resume_skaters():
+    skaters = [ewa_emp_pcov_d0_r05, ewa_pm_emp_scov_r02_n50, buf_emp_pcov_d0_n20, ewa_emp_pcov_d1_r05]
+    n_streams = 3
+    xs = np.random.randn(n_streams, 80, 4)
+    fs = [f for f in skaters for _ in range(n_streams)]
+    data = [xs[k % n_streams] for k in range(len(fs))]
+    states = [{} for _ in fs]
+    for f, ys, k in zip(fs, data, range(len(fs))):
+        for y in ys[:50]:
+            _, _, states[k] = f(s=states[k], y=y, k=1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for filename, mmap in [(os.path.join(tmp, 'states.npz'), False), (os.path.join(tmp, 'states'), True)]:
+            save_states(filename, states)
+            restored = load_states(filename, mmap=mmap)
+            for f, ys, s, s_restored in zip(fs, data, states, restored):
+                s_copy = arrays_to_state(*state_to_arrays(s))
+                for y in ys[50:]:
+                    x, x_cov, s_copy = f(s=s_copy, y=y, k=1)
+                    x_restored, x_cov_restored, s_restored = f(s=s_restored, y=y, k=1)
+                    assert np.allclose(x, x_restored)
+                    assert np.allclose(x_cov, x_cov_restored)
+
+
+if __name__=='__main__':
+    test_round_trip_of_mixed_state()
+    test_checkpoint_and_resume_skaters()
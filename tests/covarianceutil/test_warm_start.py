@@ -0,0 +1,43 @@
+import numpy as np
+from precise.skaters.covariance.runemp import run_emp_pcov_d0
+from precise.skaters.covariance.ewaemp import ewa_emp_pcov_d0_r05
+from precise.skaters.covariance.ewapm import ewa_pm_emp_scov_r01_n100, ewa_pm_emp_scov_r01_n100_t0
+from precise.skaters.covariance.bufemp import buf_emp_pcov_d0_n50
+from precise.skaters.covariance.ewaemp import ewa_emp_pcov_d1_r05
+from precise.skaters.covarianceutil.warmstart import warm_start, block_state
+from precise.skaters.covarianceutil.likelihood import cov_skater_loglikelihood
+
+
+def _stepped(f, xs, e=-1):
+    s = {}
+    for y in xs:
+        x, x_cov, s = f(y=y, s=s, k=1, e=e)
+    return x, x_cov, s
+
+
+def test_warm_start_matches_stepping():
+    xs = 0.01 * np.random.randn(260, 5)
+    for f in [run_emp_pcov_d0, ewa_emp_pcov_d0_r05, ewa_pm_emp_scov_r01_n100, ewa_pm_emp_scov_r01_n100_t0,
+              buf_emp_pcov_d0_n50, ewa_emp_pcov_d1_r05]:
+        x, x_cov, s = _stepped(f, xs[:250])
+        x_warm, x_cov_warm, s_warm = warm_start(f, xs[:250])
+        assert np.allclose(x, x_warm) and np.allclose(x_cov, x_cov_warm)
+        for y in xs[250:]:
+            x, x_cov, s = f(y=y, s=s, k=1, e=1)
+            x_warm, x_cov_warm, s_warm = f(y=y, s=s_warm, k=1, e=1)
+        assert np.allclose(x, x_warm) and np.allclose(x_cov, x_cov_warm, rtol=1e-7, atol=1e-14), f.__name__
+
+
+def test_closed_form_is_used():
+    xs = np.random.randn(10, 3)
+    _, _, s1 = ewa_emp_pcov_d0_r05(y=xs[0], s={}, k=1, e=-1)
+    assert block_state(s=s1, xs=xs) is not None
+    _, _, s1 = ewa_emp_pcov_d1_r05(y=xs[0], s={}, k=1, e=-1)
+    assert block_state(s=s1, xs=xs) is None
+
+
+def test_likelihood_unchanged():
+    xs = 0.01 * np.random.randn(120, 4)
+    ll_warm, _ = cov_skater_loglikelihood(f=ewa_pm_emp_scov_r01_n100, xs=xs, n_burn=60, verbose=False)
+    ll_stepped, _ = cov_skater_loglikelihood(f=ewa_pm_emp_scov_r01_n100, xs=xs, n_burn=60, verbose=False, warm=False)
+    assert abs(ll_warm - ll_stepped) < 1e-6 * abs(ll_stepped)
@@ -0,0 +1,49 @@
+import numpy as np
+from precise.skaters.covarianceutil.covrandom import random_factor_cov, jiggle_cov, jiggle_covs
+from precise.skaters.managers.covmanagerfactory import repeated_ports, closest_random_nudge, BATCHED_PORTS
+from precise.skaters.portfoliostatic.unitportfactory import unit_portfolio_factory
+from precise.skaters.portfoliostatic.diagportfactory import diagonal_portfolio_factory
+from precise.skaters.portfoliostatic.unitport import unit_port, unit_port_p090
+from precise.skaters.portfoliostatic.diagport import diag_long_port
+from concurrent.futures import ThreadPoolExecutor
+
+
+def test_jiggle_covs():
+    cov = random_factor_cov(n=50, n_dim=6)
+    np.random.seed(3)
+    covs = jiggle_covs(cov=cov, l=5, noise=0.1)
+    np.random.seed(3)
+    assert np.allclose(covs, [jiggle_cov(cov=cov, noise=0.1) for _ in range(5)])
+
+
+def test_batched_ports():
+    cov = random_factor_cov(n=50, n_dim=6)
+    for port in [unit_portfolio_factory, diagonal_portfolio_factory, unit_port, diag_long_port, unit_port_p090]:
+        np.random.seed(4)
+        ws = repeated_ports(port=port, cov=cov, l=7, jiggle=0.1)
+        np.random.seed(4)
+        ws_loop = [port(cov=c) for c in jiggle_covs(cov=cov, l=7, noise=0.1)]
+        assert np.shape(ws) == (7, 6)
+        assert np.allclose(ws, ws_loop)
+        w = closest_random_nudge(port=port, cov=cov, q=0.5, l=7, w=list(np.ones(6) / 6), port_kwargs={}, jiggle=0.1)
+        assert len(w) == 6 and abs(sum(w) - 1) < 1e-6
+    assert unit_port in BATCHED_PORTS and diag_long_port in BATCHED_PORTS
+    assert unit_port_p090 not in BATCHED_PORTS
+
+
+def test_supplied_executor_is_reused():
+    cov = random_factor_cov(n=50, n_dim=6)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        for _ in range(2):
+            np.random.seed(5)
+            ws = repeated_ports(port=unit_port_p090, cov=cov, l=5, jiggle=0.1, executor=pool)
+            np.random.seed(5)
+            ws_loop = [unit_port_p090(cov=c) for c in jiggle_covs(cov=cov, l=5, noise=0.1)]
+            assert np.allclose(ws, ws_loop)
+        assert not pool._shutdown
+
+
+if __name__ == '__main__':
+    test_jiggle_covs()
+    test_batched_ports()
+    test_supplied_executor_is_reused()
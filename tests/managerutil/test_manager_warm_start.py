@@ -0,0 +1,19 @@
+import numpy as np
+from precise.skaters.managers.covmanagerfactory import static_cov_manager_factory_d0
+from precise.skaters.covariance.ewapm import ewa_pm_emp_scov_r01_n100_t0
+from precise.skaters.portfoliostatic.diagport import diag_long_port
+from precise.skaters.managerutil.managerwarmstart import warm_start_manager
+from precise.skatervaluation.managercomparisonutil.managerstats import manager_stats
+
+
+def pm_diag_manager(y, s, k=1, e=1, j=1, q=1.0):
+    return static_cov_manager_factory_d0(f=ewa_pm_emp_scov_r01_n100_t0, port=diag_long_port, y=y, s=s, e=e, j=j, q=q)
+
+
+def test_manager_warm_start():
+    xs = 0.01 * np.random.randn(200, 4)
+    w, s = warm_start_manager(mgr=pm_diag_manager, xs=xs[:150], j=1, q=1.0)
+    assert s['count'] == 150 and not s['account_state']
+    warm = manager_stats(mgr=pm_diag_manager, xs=xs, n_burn=150)
+    stepped = manager_stats(mgr=pm_diag_manager, xs=xs, n_burn=150, warm=False)
+    assert np.isclose(warm['mean'], stepped['mean']) and np.isclose(warm['var'], stepped['var'])
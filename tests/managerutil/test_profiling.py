@@ -0,0 +1,55 @@
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from precise.skaters.managers.covmanagerfactory import static_cov_manager_factory_d0
+from precise.skaters.covariance.ewaemp import ewa_emp_pcov_d0_r05
+from precise.skaters.portfoliostatic.weakport import weak_long_port
+from precise.skatervaluation.managercomparisonutil.managerstats import manager_profile, manager_stats
+from precise.skatertools.profiling import profiling, profile_section, profiled, profile_records, PROFILER
+
+
+def weak_ewa_l3_manager(y, s, k=1, e=1, j=1, q=1.0):
+    return static_cov_manager_factory_d0(f=ewa_emp_pcov_d0_r05, port=weak_long_port, y=y, s=s, e=e, j=j, q=q, l=3)
+
+
+def test_manager_profile():
+    xs = 0.01 * np.random.randn(80, 4)
+    table = manager_profile(mgr=weak_ewa_l3_manager, xs=xs, n_burn=30, allocations=True)
+    n = dict(zip(table['section'], table['n']))
+    assert n['burn_in'] == 30 and n['manager'] == 50
+    assert n['cov_update'] == 80
+    assert n['port'] > n['nudge'] > 0
+    assert (table['p50_ms'] <= table['p99_ms']).all()
+    assert not PROFILER.enabled
+
+
+def test_disabled_by_default():
+    @profiled('squaring')
+    def square(x):
+        return x * x
+    assert square(3) == 9
+    with profile_section('idle'):
+        pass
+    assert 'squaring' not in profile_records() and 'idle' not in profile_records()
+    with profiling():
+        square(4)
+    assert profile_records()['squaring']['n'] == 1
+
+
+def test_sections_in_threads():
+    def work(_):
+        with profile_section('outer'):
+            time.sleep(0.002)
+            with profile_section('outer'):
+                time.sleep(0.001)
+
+    with profiling():
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            list(pool.map(work, range(40)))
+    records = profile_records()
+    assert records['outer']['n'] == 80
+    assert records['outer']['min'] >= 0.001 and records['outer']['max'] < 1.0
+
+
+if __name__=='__main__':
+    test_manager_profile()
@@ -0,0 +1,18 @@
+import numpy as np
+from precise.skaters.managers.equalmanagers import equal_long_manager
+from precise.skaters.managers.covmanagerfactory import static_cov_manager_factory_d0
+from precise.skaters.covariance.ewaemp import ewa_emp_pcov_d0_r05
+from precise.skaters.portfoliostatic.diagport import diag_long_port
+from precise.skatervaluation.managercomparisonutil.managerstats import manager_stats_leaderboard
+
+
+def ewa_diag_manager(y, s, k=1, e=1, j=1, q=1.0):
+    return static_cov_manager_factory_d0(f=ewa_emp_pcov_d0_r05, port=diag_long_port, y=y, s=s, e=e, j=j, q=q)
+
+
+def test_racing_leaderboard():
+    xs = 0.01 * np.random.randn(300, 4)
+    lb = manager_stats_leaderboard(mgrs=[equal_long_manager, ewa_diag_manager], xs=xs, n_burn=100, racing=True, verbose=False)
+    assert [name for (_, name, _, _, _) in lb] != []
+    assert all(0 < n_obs <= 200 for (_, _, _, _, n_obs) in lb)
+    assert np.isnan(dict([(name, beat) for (_, name, _, beat, _) in lb])['equal_long_manager'])
@@ -0,0 +1,23 @@
+from precise.skaters.covarianceutil.covrandom import random_factor_cov
+import numpy as np
+from precise.inclusion.pyportfoliooptinclusion import using_pyportfolioopt
+
+
+def test_ppo_compiled():
+    if using_pyportfolioopt:
+        from precise.skaters.portfoliostatic.ppoportfactory import ppo_portfolio_factory, ppo_compiled_problem, \
+            PPO_METHODS, PPO_LONG_BOUNDS, PPO_UNIT_BOUNDS
+        for method in PPO_METHODS:
+            for weight_bounds in [PPO_LONG_BOUNDS, PPO_UNIT_BOUNDS]:
+                for _ in range(3):
+                    cov = random_factor_cov(n=200, n_dim=7)
+                    w = ppo_portfolio_factory(method=method, cov=cov, weight_bounds=weight_bounds, as_dense=True)
+                    w_ef = ppo_portfolio_factory(method=method, cov=cov, weight_bounds=weight_bounds, as_dense=True, compiled=False)
+                    assert np.allclose(w, w_ef, atol=1e-4)
+                problem = ppo_compiled_problem(method=method, weight_bounds=weight_bounds, n_dim=7)
+                assert problem is ppo_compiled_problem(method=method, weight_bounds=weight_bounds, n_dim=7)
+                assert problem['problem'].is_dpp()
+
+
+if __name__ == '__main__':
+    test_ppo_compiled()
@@ -0,0 +1,23 @@
+from precise.skaters.covarianceutil.covrandom import random_factor_cov
+from precise.skaters.portfoliostatic.schurportfactory import schur_portfolio_factory, schur_diagnostics
+import numpy as np
+
+
+def _leaves(tree):
+    return [tree] if 'children' not in tree else _leaves(tree['children'][0]) + _leaves(tree['children'][1])
+
+
+def test_schur_diagnostics(capsys):
+    cov = random_factor_cov(n=100, n_dim=30)
+    w, tree = schur_diagnostics(cov=cov, gamma=0.5, jiggle=False)
+    assert np.array_equal(w, schur_portfolio_factory(cov=cov, gamma=0.5, jiggle=False))
+    assert tree['n'] == 30 and tree['seriated']
+    assert 'allocationRatioA' in tree and 'reductionA' in tree
+    assert sum(leaf['n'] for leaf in _leaves(tree)) == 30
+    assert capsys.readouterr().out == ''
+
+
+if __name__ == '__main__':
+    cov = random_factor_cov(n=100, n_dim=30)
+    from pprint import pprint
+    pprint(schur_diagnostics(cov=cov)[1])
@@ -0,0 +1,24 @@
+from precise.skaters.covarianceutil.covrandom import random_factor_cov
+from precise.skaters.portfoliostatic.schurportfactory import schur_portfolio_factory, schur_diagnostics
+from precise.skaters.portfoliostatic.weakportfactory import weak_portfolio_factory
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+
+def test_schur_parallel():
+    cov = random_factor_cov(n=100, n_dim=60)
+    kwargs = dict(port=weak_portfolio_factory, gamma=0.5, n_split=10)
+    np.random.seed(1)
+    w, tree = schur_diagnostics(cov=cov, **kwargs)
+    for executor in ['thread', 'process']:
+        np.random.seed(1)
+        w_parallel, tree_parallel = schur_diagnostics(cov=cov, executor=executor, n_workers=2, parallel_depth=2, **kwargs)
+        assert np.array_equal(w, w_parallel)
+        assert tree_parallel == tree
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        np.random.seed(1)
+        assert np.array_equal(w, schur_portfolio_factory(cov=cov, executor=pool, parallel_depth=5, **kwargs))
+
+
+if __name__ == '__main__':
+    test_schur_parallel()
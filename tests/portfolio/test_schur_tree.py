@@ -0,0 +1,30 @@
+from precise.skaters.covarianceutil.covrandom import random_factor_cov
+from precise.skaters.portfoliostatic.schurportfactory import schur_portfolio_factory
+from precise.skaters.portfoliostatic.weakportfactory import weak_portfolio_factory
+from precise.skaters.portfoliostatic.weakalloc import weak_long_alloc
+import numpy as np
+
+
+def test_seriate_once():
+    cov = random_factor_cov(n=100, n_dim=37)
+    for gamma in [0.0, 0.5]:
+        w_once = schur_portfolio_factory(cov=cov, gamma=gamma, jiggle=False, reseriate=False)
+        w_top = schur_portfolio_factory(cov=cov, gamma=gamma, jiggle=False, seriation_depth=1)
+        assert np.array_equal(w_once, w_top)
+        assert abs(np.sum(w_once) - 1) < 1e-6
+
+
+def test_seriation_is_undone():
+    # Seriating once is the same as running without seriation on the ordered matrix
+    from precise.skaters.covarianceutil.covfunctions import seriation, cov_distance
+    cov = random_factor_cov(n=100, n_dim=23)
+    kwargs = dict(port=weak_portfolio_factory, alloc=weak_long_alloc, gamma=0.5, jiggle=False)
+    w = schur_portfolio_factory(cov=cov, seriation_depth=1, **kwargs)
+    ndx = seriation(cov_distance(cov))
+    w_ordered = schur_portfolio_factory(cov=cov[np.ix_(ndx, ndx)], seriation_depth=0, **kwargs)
+    assert np.allclose(w[ndx], w_ordered)
+
+
+if __name__ == '__main__':
+    test_seriate_once()
+    test_seriation_is_undone()
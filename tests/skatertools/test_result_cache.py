@@ -0,0 +1,105 @@
+import os
+import tempfile
+import numpy as np
+from precise.skatertools.resultcache import cached_call, memoized, invalidate, cache_size, evict, result_key, _entry_path
+from precise.skaters.covariance.bufemp import buf_emp_pcov_d0_n100
+from precise.skatervaluation.battleutil.parallelbattles import assess_contestant, tally_health
+
+CALLS = list()
+
+
+def _slow_stats(f, xs, n_burn=10):
+    CALLS.append(1)
+    return {'name':f.__name__, 'total':float(np.sum(xs[n_burn:]))}
+
+
+def test_cached_call():
+    CALLS.clear()
+    xs = np.random.randn(50, 3)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        first = cached_call(_slow_stats, cache_dir=cache_dir, f=buf_emp_pcov_d0_n100, xs=xs)
+        again = cached_call(_slow_stats, cache_dir=cache_dir, f=buf_emp_pcov_d0_n100, xs=np.copy(xs))
+        assert first == again and len(CALLS) == 1
+        cached_call(_slow_stats, cache_dir=cache_dir, f=buf_emp_pcov_d0_n100, xs=xs + 1e-12)
+        assert len(CALLS) == 2
+
+        # Positional arguments and defaults share the entry
+        slow_stats = memoized(_slow_stats, cache_dir=cache_dir)
+        assert slow_stats(buf_emp_pcov_d0_n100, xs) == first and len(CALLS) == 2
+
+        assert invalidate(involving='buf_emp_pcov', cache_dir=cache_dir) == 2
+        assert cache_size(cache_dir=cache_dir)[0] == 0
+
+
+def test_key_and_eviction():
+    xs = np.ones((5, 2))
+    assert result_key(_slow_stats, f=buf_emp_pcov_d0_n100, xs=xs) != result_key(_slow_stats, f=buf_emp_pcov_d0_n100, xs=xs.T)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for n_burn in range(4):
+            cached_call(_slow_stats, cache_dir=cache_dir, f=buf_emp_pcov_d0_n100, xs=xs, n_burn=n_burn)
+        # Distinct, explicit last use times, oldest first
+        paths = [_entry_path(cache_dir=cache_dir, func=_slow_stats,
+                             key=result_key(_slow_stats, f=buf_emp_pcov_d0_n100, xs=xs, n_burn=n_burn)) for n_burn in range(4)]
+        for k, path in enumerate(paths):
+            os.utime(path, (1000 + k, 1000 + k))
+        n_entries, n_bytes = cache_size(cache_dir=cache_dir)
+        assert n_entries == 4
+        assert evict(cache_dir=cache_dir, max_bytes=n_bytes - 1) == 1
+        assert not os.path.exists(paths[0]) and all(os.path.exists(path) for path in paths[1:])
+        max_bytes = n_bytes // 2
+        evict(cache_dir=cache_dir, max_bytes=max_bytes)
+        assert cache_size(cache_dir=cache_dir)[1] <= max_bytes
+        assert os.path.exists(paths[3])
+
+
+def test_lambdas_and_closures_are_distinguished():
+    def scaled(c):
+        return lambda xs: c * float(np.sum(xs))
+    xs = np.ones((3, 2))
+    keys = [result_key(_apply, g=g, xs=xs) for g in [scaled(1.0), scaled(2.0), lambda xs: 0.0, lambda xs: 1.0]]
+    assert len(set(keys)) == 4
+    assert result_key(_apply, g=scaled(1.0), xs=xs) == keys[0]
+    with tempfile.TemporaryDirectory() as cache_dir:
+        assert cached_call(_apply, cache_dir=cache_dir, g=scaled(1.0), xs=xs) == 6.0
+        assert cached_call(_apply, cache_dir=cache_dir, g=scaled(2.0), xs=xs) == 12.0
+
+
+def _apply(g, xs):
+    return g(xs)
+
+
+def _timed_evaluator(contestant, xs, n_burn, lb, ub):
+    return float(np.sum(xs)), {'time':1.5}
+
+
+def test_cached_assessments_have_no_timing(monkeypatch):
+    import precise.skatertools.resultcache as rc
+    xs = np.random.randn(20, 2)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        monkeypatch.setattr(rc, 'RESULT_CACHE_DIR', cache_dir)
+        outcomes = [assess_contestant(contestant=buf_emp_pcov_d0_n100, evaluator=_timed_evaluator, xs=xs, n_burn=5,
+                                      lb=-1000, ub=1000, memoize=True) for _ in range(2)]
+    (_, fresh), (_, cached) = outcomes
+    assert fresh['time'] == 1.5 and not fresh.get('cached')
+    assert cached['cached'] and 'time' not in cached
+    timing, reliability, failures = dict(), dict(), dict()
+    tally_health(outcomes=[(-1.0, cached)], timing=timing, reliability=reliability, failures=failures, worst_assessment_seen=0)
+    assert timing == {} and reliability[cached['name']]['mean'] == 1.0
+
+
+def _failing_evaluator(contestant, xs, n_burn, lb, ub):
+    CALLS.append(1)
+    raise ValueError('not today')
+
+
+def test_failures_are_not_cached(monkeypatch):
+    import precise.skatertools.resultcache as rc
+    CALLS.clear()
+    xs = np.random.randn(20, 2)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        monkeypatch.setattr(rc, 'RESULT_CACHE_DIR', cache_dir)
+        for _ in range(2):
+            assessment, metrics = assess_contestant(contestant=buf_emp_pcov_d0_n100, evaluator=_failing_evaluator,
+                                                    xs=xs, n_burn=5, lb=-1000, ub=1000, memoize=True)
+            assert assessment is None and metrics['passing'] == 0
+        assert len(CALLS) == 2 and cache_size(cache_dir=cache_dir)[0] == 0
@@ -0,0 +1,58 @@
+import os
+import shutil
+import numpy as np
+import precise.skatertools.data.localstore as localstore
+from precise.skatertools.data.localstore import dense_columns
+from precise.skatertools.data.equityhistorical import random_cached_equity_dense, cached_equity_store
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+SOURCES = [os.path.join(FIXTURES, 'log_price_diff_1_part_' + str(part) + '.csv') for part in [1, 2]]
+
+
+def test_import_and_validity(tmp_path):
+    xs, meta = cached_equity_store(k=1, store_dir=str(tmp_path), sources=SOURCES)
+    assert np.shape(xs) == (120, 8)                 # Date columns are not stored
+    assert meta['first_valid'][0] == 30 and meta['last_valid'][1] == 99
+    for start, end in [(0, 50), (35, 90), (70, 110)]:
+        expected = np.flatnonzero(np.isfinite(xs[start:end]).all(axis=0))
+        assert list(dense_columns(meta=meta, start=start, end=end, xs=xs)) == list(expected)
+
+
+def test_reimport_when_source_changes(tmp_path):
+    sources = [str(tmp_path / os.path.basename(source)) for source in SOURCES]
+    for source, copied in zip(SOURCES, sources):
+        shutil.copy(source, copied)
+    store_dir = str(tmp_path / 'store')
+    xs, _ = cached_equity_store(k=1, store_dir=store_dir, sources=sources)
+    assert np.shape(xs) == (120, 8)
+    with open(sources[1], 'rt') as fh:
+        lines = fh.readlines()
+    with open(sources[1], 'wt') as fh:
+        fh.writelines(lines[:61])
+    xs, _ = cached_equity_store(k=1, store_dir=store_dir, sources=sources)
+    assert np.isfinite(xs[60:, 4:]).any()                # Already checked in this process
+    xs, _ = cached_equity_store(k=1, store_dir=store_dir, sources=sources, refresh=True)
+    assert np.isnan(xs[60:, 4:]).all()
+
+
+def test_sources_checked_once(tmp_path, monkeypatch):
+    checked = list()
+    source_version = localstore.source_version
+    monkeypatch.setattr(localstore, 'source_version', lambda sources: checked.append(sources) or source_version(sources))
+    for _ in range(3):
+        random_cached_equity_dense(k=1, n_obs=40, n_dim=3, store_dir=str(tmp_path), sources=SOURCES)
+    assert len(checked) == 1
+
+
+def test_random_dense_window(tmp_path):
+    for _ in range(5):
+        xs = random_cached_equity_dense(k=1, n_obs=40, n_dim=3, store_dir=str(tmp_path), sources=SOURCES)
+        assert np.shape(xs)[0] == 40 and np.shape(xs)[1] <= 3
+        assert np.isfinite(xs).all()
+    df = random_cached_equity_dense(k=1, n_obs=40, n_dim=3, as_frame=True, store_dir=str(tmp_path), sources=SOURCES)
+    assert all(c.startswith('S') for c in df.columns)
+
+
+if __name__=='__main__':
+    import tempfile
+    test_random_dense_window(tempfile.mkdtemp())